@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+每台设备的称重比值基线
+按时间窗口（默认每月）保存设备比值的在线统计量（RunningStats）和分位数草图（KLLSketch），
+新的测试数据可以直接与基线比较，不需要重新读取设备的历史数据文件
+"""
+
+import argparse
+import json
+import os
+import re
+import numpy as np
+
+import csv_processor
+from column_cache import file_fingerprint
+from fleet_analysis import device_id_from_path
+from incremental_ingest import processed_hash
+from online_stats import RunningStats
+from quantile_sketch import KLLSketch
+
+# 基线文件格式版本
+STORE_VERSION = 3
+
+# 支持的时间窗口：每日或每月
+BASELINE_PERIODS = {'D': 'datetime64[D]', 'M': 'datetime64[M]'}
+
+
+class Baseline:
+    """由若干时间窗口合并得到的设备比值基线"""
+
+    def __init__(self, device_id, stats, sketch, windows):
+        """
+        Args:
+            device_id (str): 设备编号
+            stats (RunningStats): 比值的计数、均值、标准差、最小值和最大值
+            sketch (KLLSketch): 比值的分位数草图
+            windows (list): 参与合并的时间窗口
+        """
+        self.device_id = device_id
+        self.stats = stats
+        self.sketch = sketch
+        self.windows = windows
+
+    def __len__(self):
+        return self.stats.count
+
+    def summary(self):
+        """返回基线的统计结果，没有数据时返回None"""
+        summary = self.stats.summary()
+        if summary is None:
+            return None
+        q1, median, q3 = self.sketch.quantiles([0.25, 0.5, 0.75]).tolist()
+        summary.update({'q1': q1, 'median': median, 'q3': q3,
+                        'windows': [self.windows[0], self.windows[-1]]})
+        return summary
+
+
+class BaselineStore:
+    """设备比值基线库
+
+    每台设备一个JSON文件，按数据来源（文件）和时间窗口保存比值的RunningStats和KLLSketch。
+    两者都可以合并，因此任意连续若干窗口（例如最近三个月）的基线都由已保存的窗口合并得到；
+    新数据只需合并到对应窗口，不需要重新读取历史数据。每个来源记录已加入的行数，
+    同一批数据重复加入不会重复计数；来源文件被改写时只需撤回该来源的窗口。
+    """
+
+    def __init__(self, store_dir=None, period='M'):
+        """
+        Args:
+            store_dir (str, optional): 基线目录，默认为本模块所在目录下的.baselines
+            period (str): 时间窗口，'M'为每月，'D'为每日；同一目录应使用相同的窗口
+
+        Raises:
+            ValueError: 不支持的时间窗口
+        """
+        if period not in BASELINE_PERIODS:
+            raise ValueError(f"不支持的时间窗口: {period}，可选: {', '.join(BASELINE_PERIODS)}")
+        if store_dir is None:
+            store_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.baselines')
+        self.store_dir = store_dir
+        self.period = period
+        self._states = {}
+
+    def path(self, device_id):
+        """设备基线文件的路径"""
+        name = re.sub(r'[^\w.-]', '_', device_id)
+        return os.path.join(self.store_dir, f'{name}.json')
+
+    def _state(self, device_id):
+        if device_id not in self._states:
+            state = None
+            if os.path.exists(self.path(device_id)):
+                with open(self.path(device_id), 'r', encoding='utf-8') as file:
+                    state = json.load(file)
+                if state.get('version') != STORE_VERSION or state.get('period') != self.period:
+                    print(f"警告: 设备 {device_id} 的基线格式或时间窗口不一致，已重新建立")
+                    state = None
+            self._states[device_id] = state or {
+                'version': STORE_VERSION,
+                'device_id': device_id,
+                'period': self.period,
+                'sources': {}
+            }
+        return self._states[device_id]
+
+    def _save(self, device_id):
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self.path(device_id)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._states[device_id], file, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def devices(self):
+        """返回已保存基线的设备编号列表"""
+        if not os.path.isdir(self.store_dir):
+            return []
+        devices = []
+        for name in sorted(os.listdir(self.store_dir)):
+            if name.endswith('.json'):
+                with open(os.path.join(self.store_dir, name), 'r', encoding='utf-8') as file:
+                    devices.append(json.load(file).get('device_id', name[:-5]))
+        return devices
+
+    def windows(self, device_id):
+        """返回设备已保存的时间窗口及每个窗口的比值个数（各来源合计）
+
+        Returns:
+            dict: 时间窗口（例如'2025-06'）到比值个数的映射，按时间排序
+        """
+        counts = {}
+        for entry in self._state(device_id)['sources'].values():
+            for key, window in entry['windows'].items():
+                counts[key] = counts.get(key, 0) + window['stats']['count']
+        return {key: counts[key] for key in sorted(counts)}
+
+    def update(self, device_id, ratios, times, source=None, row_ids=None):
+        """把新的比值按时间窗口合并到设备基线并保存
+
+        Args:
+            device_id (str): 设备编号
+            ratios (numpy.ndarray): 比值数组
+            times (numpy.ndarray): 对应的datetime64时间，NaT的比值不加入基线
+            source (str, optional): 比值的来源（例如数据文件的绝对路径），默认为不区分来源
+            row_ids (numpy.ndarray, optional): 每个比值在来源中的行号。提供时只加入行号不小于
+                该来源已加入行数的比值，中断后重新加入同一批数据不会重复计数
+
+        Returns:
+            int: 加入基线的比值个数
+        """
+        added = self._add(self._state(device_id), source or '', ratios, times, row_ids)
+        self._save(device_id)
+        return added
+
+    def _add(self, state, source, ratios, times, row_ids=None):
+        """把比值合并到某个来源的时间窗口（不保存）"""
+        entry = state['sources'].setdefault(source, {'rows': 0, 'windows': {}})
+        ratios = np.asarray(ratios, dtype=np.float64)
+        keep = ~np.isnat(times) & ~np.isnan(ratios)
+        if row_ids is not None and len(row_ids):
+            keep &= row_ids >= entry['rows']
+            entry['rows'] = max(entry['rows'], int(row_ids.max()) + 1)
+        ratios, times = ratios[keep], times[keep]
+        if len(ratios) == 0:
+            return 0
+
+        windows = entry['windows']
+        # 只分组一次：每个窗口的比值切片同时用于统计量和分位数草图
+        keys = times.astype(BASELINE_PERIODS[self.period]).astype(str)
+        order = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        groups = np.split(ratios[order], starts[1:])
+        for key, values in zip(unique_keys.tolist(), groups):
+            window = windows.setdefault(key, {'stats': RunningStats().to_dict(), 'sketch': KLLSketch().to_dict()})
+            window['stats'] = RunningStats.from_dict(window['stats']).add_array(values).to_dict()
+            window['sketch'] = KLLSketch.from_dict(window['sketch']).add_array(values).to_dict()
+        return len(ratios)
+
+    def drop_source(self, device_id, source):
+        """撤回某个来源加入的全部比值并保存，用于来源文件被截断或改写后重新加入
+
+        Args:
+            device_id (str): 设备编号
+            source (str): 比值的来源
+
+        Returns:
+            bool: 该来源是否存在
+        """
+        state = self._state(device_id)
+        if state['sources'].pop(source, None) is None:
+            return False
+        self._save(device_id)
+        return True
+
+    def update_from_dataset(self, dataset, device_id=None):
+        """把一个数据文件的比值加入设备基线
+
+        文件未变化时跳过；只在末尾追加了新行时只加入新行；已加入部分被截断或开头/末尾被改写时
+        （见incremental_ingest.processed_hash），先撤回该文件原先加入的比值再重新全部加入。
+        追加时也通过dataset.ratios()解析整个文件（文件已变化，列缓存失效），只是已加入的行按行号跳过，
+        不重复计数；只需要解析新追加的行时使用IncrementalAnalyzer(file_path, baseline_store=store)。
+
+        Args:
+            dataset (WeighingDataset): 设备的称重数据会话
+            device_id (str, optional): 设备编号，默认从文件名中提取
+
+        Returns:
+            int: 加入基线的比值个数
+        """
+        device_id = device_id or device_id_from_path(dataset.file_path)
+        state = self._state(device_id)
+        source = os.path.abspath(dataset.file_path)
+        fingerprint = file_fingerprint(dataset.file_path)
+        entry = state['sources'].get(source)
+        if entry is not None and entry.get('fingerprint') == fingerprint:
+            print(f"警告: {dataset.file_path} 已加入设备 {device_id} 的基线且没有变化，跳过")
+            return 0
+        if entry is not None and 'size' in entry and not self._appended(dataset.file_path, entry):
+            print(f"警告: {dataset.file_path} 已加入基线的部分被截断或开头/末尾被改写，撤回后重新加入")
+            del state['sources'][source]
+
+        ratios, data = dataset.ratios()
+        if not data.has('time'):
+            print(f"警告: {dataset.file_path} 缺少时间列，无法按时间窗口建立基线")
+            return 0
+        added = self._add(state, source, ratios, data.values['time'], data.row_ids)
+        entry = state['sources'][source]
+        entry['fingerprint'] = fingerprint
+        entry['size'] = fingerprint['size']
+        with open(dataset.file_path, 'rb') as file:
+            entry['processed_hash'] = processed_hash(file, entry['size'])
+        self._save(device_id)
+        return added
+
+    @staticmethod
+    def _appended(file_path, entry):
+        """判断文件是否只在上次加入时的末尾之后追加了内容"""
+        if os.path.getsize(file_path) < entry['size']:
+            return False
+        with open(file_path, 'rb') as file:
+            return processed_hash(file, entry['size']) == entry['processed_hash']
+
+    def baseline(self, device_id, start=None, end=None):
+        """合并各来源中时间窗口 start <= 窗口 < end 的统计量，得到设备基线
+
+        Args:
+            device_id (str): 设备编号
+            start (str, optional): 起始窗口（包含），例如'2025-06'或'2025-06-01'，None表示不限
+            end (str, optional): 结束窗口（不包含），None表示不限
+
+        Returns:
+            Baseline: 设备基线，范围内没有数据时返回None
+        """
+        unit = BASELINE_PERIODS[self.period]
+        start = str(np.datetime64(start).astype(unit)) if start is not None else None
+        end = str(np.datetime64(end).astype(unit)) if end is not None else None
+
+        stats = RunningStats()
+        sketch = KLLSketch()
+        selected = set()
+        for entry in self._state(device_id)['sources'].values():
+            for key, window in entry['windows'].items():
+                if (start is not None and key < start) or (end is not None and key >= end):
+                    continue
+                stats.merge(RunningStats.from_dict(window['stats']))
+                sketch.merge(KLLSketch.from_dict(window['sketch']))
+                selected.add(key)
+        if stats.count == 0:
+            return None
+        return Baseline(device_id, stats, sketch, sorted(selected))
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='建立或更新设备的称重比值基线')
+    parser.add_argument('files', nargs='+', help='设备称重CSV文件路径')
+    parser.add_argument('--period', default='M', choices=sorted(BASELINE_PERIODS), help='时间窗口')
+    args = parser.parse_args()
+
+    store = BaselineStore(period=args.period)
+    for file_path in args.files:
+        if not os.path.exists(file_path):
+            print(f"错误: 找不到数据文件 '{file_path}'")
+            continue
+        device_id = device_id_from_path(file_path)
+        added = store.update_from_dataset(csv_processor.WeighingDataset(file_path), device_id)
+        baseline = store.baseline(device_id)
+        if baseline is None:
+            continue
+        summary = baseline.summary()
+        print(f"{device_id}: 新增 {added} 个比值, 基线共 {summary['count']} 个比值, "
+              f"窗口 {summary['windows'][0]} ~ {summary['windows'][1]}, "
+              f"均值 {summary['mean']:.4f}, 标准差 {summary['std_dev']:.4f}, "
+              f"Q1 {summary['q1']:.4f}, 中位数 {summary['median']:.4f}, Q3 {summary['q3']:.4f}")
+
+
+if __name__ == '__main__':
+    main()
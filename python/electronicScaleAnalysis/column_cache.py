@@ -0,0 +1,219 @@
+import contextlib
+import hashlib
+import json
+import os
+import numpy as np
+from weighing_columns import WeighingColumns
+
+# 缓存格式版本，WeighingColumns的存储方式变化时递增，旧缓存自动失效
+CACHE_VERSION = 4
+
+# 计算文件指纹时读取的首尾字节数
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def file_fingerprint(file_path):
+    """计算文件的指纹：大小、修改时间以及首尾各64KB内容的哈希
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        dict: 包含size、mtime_ns和hash的字典
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        digest.update(file.read(FINGERPRINT_BYTES))
+        if stat.st_size > FINGERPRINT_BYTES:
+            file.seek(max(FINGERPRINT_BYTES, stat.st_size - FINGERPRINT_BYTES))
+            digest.update(file.read())
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': digest.hexdigest()
+    }
+
+
+class ColumnCache:
+    """列式称重数据的磁盘缓存
+
+    每个CSV文件解析后的列数组保存为缓存目录下的一个.npz文件，
+    以文件大小、修改时间和内容哈希判断是否失效；缓存总大小超过上限时按最近使用时间淘汰。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=512 * 1024 * 1024):
+        """
+        Args:
+            cache_dir (str, optional): 缓存目录，默认为本模块所在目录下的.column_cache
+            max_bytes (int): 缓存总大小上限（字节）
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.column_cache')
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def cache_path(self, file_path):
+        """返回CSV文件对应的缓存文件路径"""
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def load(self, file_path, column_map):
+        """读取缓存的列式数据
+
+        Args:
+            file_path (str): CSV文件路径
+            column_map (dict): 字段名到列名的映射，与缓存时不一致视为失效
+
+        Returns:
+            WeighingColumns: 缓存有效时返回列式数据，否则返回None
+        """
+        path = self.cache_path(file_path)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                meta = json.loads(str(archive['meta']))
+                if (meta['version'] != CACHE_VERSION
+                        or meta['fingerprint'] != file_fingerprint(file_path)
+                        or meta['column_map'] != column_map):
+                    self.misses += 1
+                    return None
+
+                values = {}
+                masks = {}
+                categories = {}
+                for role, source in meta['sources'].items():
+                    values[role] = archive[f'values_{source}']
+                    masks[role] = archive[f'masks_{source}']
+                    if f'categories_{source}' in archive:
+                        categories[role] = archive[f'categories_{source}']
+                row_ids = archive['row_ids']
+                raw = {column: (archive[f'raw_positions_{k}'], archive[f'raw_texts_{k}'], archive[f'raw_missing_{k}'])
+                       for k, column in enumerate(meta['raw_columns'])}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"警告: 缓存文件损坏，将重新解析: {e}")
+            self.misses += 1
+            return None
+
+        # 更新修改时间，作为LRU淘汰依据
+        os.utime(path)
+        self.hits += 1
+        return WeighingColumns(meta['fieldnames'], column_map, values, masks, row_ids, meta['time_formats'],
+                               categories, raw, file_path)
+
+    def save(self, file_path, columns):
+        """把列式数据写入缓存，并在超过大小上限时淘汰最久未使用的缓存
+
+        Args:
+            file_path (str): CSV文件路径
+            columns (WeighingColumns): 解析后的列式数据
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # 对应同一列的字段只保存一份
+        arrays = {'row_ids': columns.row_ids}
+        sources = {}
+        saved = {}
+        for role, values in columns.values.items():
+            column = columns.column_map.get(role)
+            if column not in saved:
+                saved[column] = role
+                arrays[f'values_{role}'] = values
+                arrays[f'masks_{role}'] = columns.masks[role]
+                if role in columns.categories:
+                    arrays[f'categories_{role}'] = columns.categories[role]
+            sources[role] = saved[column]
+
+        # 各列无法还原的原文按列的顺序编号保存（列名可能不适合作为数组名）
+        raw_columns = list(columns.raw)
+        for k, column in enumerate(raw_columns):
+            arrays[f'raw_positions_{k}'], arrays[f'raw_texts_{k}'], arrays[f'raw_missing_{k}'] = columns.raw[column]
+
+        meta = {
+            'version': CACHE_VERSION,
+            'fingerprint': file_fingerprint(file_path),
+            'column_map': columns.column_map,
+            'fieldnames': columns.fieldnames,
+            'time_formats': columns.time_formats,
+            'sources': sources,
+            'raw_columns': raw_columns
+        }
+        arrays['meta'] = np.array(json.dumps(meta, ensure_ascii=False))
+
+        # 先写临时文件再替换，避免中断时留下不完整的缓存
+        path = self.cache_path(file_path)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as file:
+            np.savez(file, **arrays)
+        if os.path.getsize(temp_path) > self.max_bytes:
+            os.remove(temp_path)
+            return
+        os.replace(temp_path, path)
+
+        self.evict()
+
+    def entries(self):
+        """返回缓存文件列表，按最近使用时间从旧到新排序
+
+        Returns:
+            list: (路径, 大小, 修改时间) 元组列表
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # 其它进程同时淘汰了该文件
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """淘汰最久未使用的缓存文件，直到总大小不超过上限"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+            total -= size
+
+    def clear(self):
+        """删除所有缓存文件"""
+        for path, _, _ in self.entries():
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def report(self):
+        """返回缓存命中情况
+
+        Returns:
+            dict: 包含命中次数、未命中次数、缓存文件数和总大小
+        """
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'total_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes
+        }
+
+    def print_report(self):
+        """打印缓存命中情况"""
+        report = self.report()
+        total = report['hits'] + report['misses']
+        hit_rate = report['hits'] / total * 100 if total else 0.0
+        print(f"列缓存: 命中 {report['hits']} 次, 未命中 {report['misses']} 次 (命中率 {hit_rate:.1f}%), "
+              f"共 {report['entries']} 个缓存文件 "
+              f"({report['total_bytes'] / 1024 / 1024:.1f}MB / 上限 {report['max_bytes'] / 1024 / 1024:.0f}MB)")
@@ -0,0 +1,77 @@
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+except ImportError:  # 只有读取zstd压缩文件时才需要
+    zstandard = None
+
+# 压缩格式的文件头魔数
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# 按扩展名识别的压缩格式
+COMPRESSED_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.zst': 'zstd',
+    '.zstd': 'zstd'
+}
+
+
+def detect_compression(file_path):
+    """根据扩展名或文件头魔数识别压缩格式
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        str: 'gzip'、'zstd'，未压缩时返回None
+    """
+    compression = COMPRESSED_EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+    if compression:
+        return compression
+    with open(file_path, 'rb') as file:
+        head = file.read(4)
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        return 'zstd'
+    return None
+
+
+def open_binary(file_path):
+    """以二进制方式打开文件，压缩文件边读边解压，不生成临时文件
+
+    Args:
+        file_path (str): 文件路径
+
+    Returns:
+        file: 可读的二进制文件对象
+
+    Raises:
+        ImportError: 读取zstd压缩文件但没有安装zstandard
+    """
+    compression = detect_compression(file_path)
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError(f"读取zstd压缩文件需要安装zstandard (pip install zstandard): {file_path}")
+        raw = open(file_path, 'rb')
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(file_path, 'rb')
+
+
+def open_text(file_path, encoding='utf-8-sig'):
+    """以文本方式打开CSV文件（newline=''），压缩文件边读边解压
+
+    Args:
+        file_path (str): 文件路径
+        encoding (str): 文本编码，默认utf-8-sig自动处理BOM
+
+    Returns:
+        file: 可读的文本文件对象
+    """
+    return io.TextIOWrapper(open_binary(file_path), encoding=encoding, newline='')
@@ -1,66 +1,389 @@
 import csv
+import io
 import os
 import statistics
 import matplotlib.pyplot as plt
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from scipy import stats
 import numpy as np
+from weighing_columns import WeighingColumns, detect_columns, parse_float_column, NUMERIC_ROLES, TEXT_ROLES
+from column_cache import ColumnCache
+from compressed_io import detect_compression, open_text
+from online_stats import RunningStats, group_running_stats, group_space_saving, roll_up, rolling_window_stats
+from quantile_sketch import KLLSketch
+from time_index import TimeIndex
+from group_by import aggregate, parse_aggregation
+from time_buckets import bucket_ids
 
 # 设置matplotlib支持中文显示 - 使用Windows系统常见中文字体
 plt.rcParams["font.family"] = ["SimHei", "Microsoft YaHei", "sans-serif"]
 plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
 
+# 分析函数共用的列式数据缓存，重复运行时跳过CSV和时间解析
+column_cache = ColumnCache()
+
+# 文件小于该大小时即使指定多进程也按单进程解析
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+# compute_z_scores返回的异常程度代码
+SEVERITY_NORMAL = 0
+SEVERITY_MILD = 1
+SEVERITY_SEVERE = 2
+SEVERITY_LABELS = {
+    SEVERITY_NORMAL: "正常",
+    SEVERITY_MILD: "轻度异常",
+    SEVERITY_SEVERE: "重度异常"
+}
+
+# outlier_codes返回的异常代码
+OUTLIER_NONE = 0
+OUTLIER_LOW = 1
+OUTLIER_HIGH = 2
+
+# compute_ratios返回的原因码
+RATIO_OK = 0
+RATIO_MISSING_COLUMN = 1
+RATIO_NON_NUMERIC = 2
+RATIO_ZERO_WEIGHT = 3
+RATIO_REASONS = {
+    RATIO_OK: '有效',
+    RATIO_MISSING_COLUMN: '缺少必要的列',
+    RATIO_NON_NUMERIC: 'AD值、零点AD值或重量不是数值',
+    RATIO_ZERO_WEIGHT: '重量为0，比值记为0'
+}
+
+# 修正Z-score（中位数/MAD）：MAD乘以1.4826（即除以0.6745）后与正态分布的标准差相当，
+# |修正Z| > 3.5为轻度异常（Iglewicz和Hoaglin的建议阈值），> 5为重度异常
+MAD_SCALE = 0.6745
+MAD_MILD_THRESHOLD = 3.5
+MAD_SEVERE_THRESHOLD = 5.0
+
+# 滚动基线Z-score默认的计数窗口大小，以及窗口内至少需要的数据个数
+DRIFT_WINDOW = 1000
+DRIFT_MIN_PERIODS = 30
+
+# 重量/时间异常：重量超过阈值（kg），或创建时间比订单时间晚超过阈值（分钟）或早于订单时间
+WEIGHT_ANOMALY_THRESHOLD = 20.0
+TIME_ANOMALY_MAX_MINUTES = 1440
+
+# compute_weight_and_time_flags返回的异常代码，按位组合（一行可以同时有重量异常和时间异常）
+ANOMALY_NONE = 0
+ANOMALY_OVERWEIGHT = 1
+ANOMALY_LATE_CREATE = 2
+ANOMALY_EARLY_CREATE = 4
+ANOMALY_TIME = ANOMALY_LATE_CREATE | ANOMALY_EARLY_CREATE
+
+# 每个时间分组统计商品次数时使用的SpaceSaving计数器个数，不同商品不超过该数量时次数是精确的
+PRODUCT_SKETCH_CAPACITY = 64
+
+# 按时间分组统计时每个分组输出的次数最多的商品个数（结果字段名为top3_products）
+TOP_PRODUCTS = 3
+
+
+def product_sketch_capacity(top_k=TOP_PRODUCTS):
+    """输出前top_k个商品时每个分组使用的SpaceSaving计数器个数
+
+    批量统计和增量统计使用同一容量，两者的商品次数才能一致。
 
-def calculate_z_scores(test_ratios, reference_ratios, test_data=None):
-    """计算测试数据比值相对于参考数据比值的Z-score，并判断异常程度
+    Args:
+        top_k (int): 输出的商品个数
+
+    Returns:
+        int: 计数器个数，至少为PRODUCT_SKETCH_CAPACITY
+    """
+    return max(PRODUCT_SKETCH_CAPACITY, top_k * 10)
+
+
+# 示例分析默认使用的数据文件
+# 设备L30DG0071_称重数据_20000条.csv 设备L30DG0091_称重数据_2025-05-31_2025-08-28.csv
+DEFAULT_DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '设备L30DG0071_称重数据_20000条.csv')
+
+
+def compute_z_scores(test_ratios, reference_ratios):
+    """整列计算测试数据比值相对于参考数据比值的Z-score和异常程度代码
 
     Args:
-        test_ratios (list): 测试数据的比值列表
-        reference_ratios (list): 参考数据的比值列表
-        test_data (list, optional): 测试数据的完整数据行列表
+        test_ratios (list | numpy.ndarray): 测试数据的比值
+        reference_ratios (list | numpy.ndarray | RunningStats): 参考数据的比值；
+            也可以是参考数据比值的RunningStats（例如baseline_store中保存的设备基线）
 
     Returns:
-        list: 包含Z-score值、异常程度和原始数据的字典列表
+        tuple: (Z-score数组, 异常程度代码数组, 异常数据下标数组)，异常程度代码见SEVERITY_LABELS；
+            参考数据不足或标准差为0时返回None
     """
-    if not reference_ratios or len(reference_ratios) < 2:
+    if reference_ratios is None or len(reference_ratios) < 2:
         print("警告: 参考数据不足，无法计算Z-score")
-        return []
+        return None
 
     # 计算参考数据的均值和标准差
-    ref_mean = statistics.mean(reference_ratios)
-    ref_std = statistics.stdev(reference_ratios)
+    if isinstance(reference_ratios, RunningStats):
+        ref_mean, ref_std = reference_ratios.mean, reference_ratios.std_dev
+    else:
+        reference_ratios = np.asarray(reference_ratios, dtype=np.float64)
+        ref_mean = reference_ratios.mean()
+        ref_std = reference_ratios.std(ddof=1)
 
     if ref_std == 0:
         print("警告: 参考数据的标准差为0，无法计算Z-score")
+        return None
+
+    z_scores = (np.asarray(test_ratios, dtype=np.float64) - ref_mean) / ref_std
+    severity = severity_codes(z_scores)
+    return z_scores, severity, np.flatnonzero(severity)
+
+
+def severity_codes(z_scores):
+    """由Z-score整列得到异常程度代码：|Z|>3为重度异常，|Z|>2为轻度异常，NaN视为正常"""
+    abs_z = np.abs(z_scores)
+    with np.errstate(invalid='ignore'):
+        severity = np.where(abs_z > 3, SEVERITY_SEVERE, np.where(abs_z > 2, SEVERITY_MILD, SEVERITY_NORMAL))
+    return severity.astype(np.int8)
+
+
+def select_median(values):
+    """用选择算法（np.partition，平均线性时间）求中位数，不对整列排序"""
+    middle = len(values) // 2
+    if len(values) % 2:
+        return float(np.partition(values, middle)[middle])
+    partitioned = np.partition(values, [middle - 1, middle])
+    return float((partitioned[middle - 1] + partitioned[middle]) / 2)
+
+
+def median_mad(reference_ratios):
+    """计算参考数据比值的中位数和中位数绝对偏差（MAD）
+
+    Args:
+        reference_ratios (list | numpy.ndarray | KLLSketch): 参考数据比值；
+            也可以是KLLSketch（quantile_sketch.py），用草图近似计算，适合很大的参考数据
+
+    Returns:
+        tuple: (中位数, MAD)，没有参考数据时返回None
+    """
+    if isinstance(reference_ratios, KLLSketch):
+        if len(reference_ratios) == 0:
+            return None
+        return reference_ratios.median_absolute_deviation()
+    reference_ratios = np.asarray(reference_ratios, dtype=np.float64)
+    if len(reference_ratios) == 0:
+        return None
+    median = select_median(reference_ratios)
+    return median, select_median(np.abs(reference_ratios - median))
+
+
+def compute_modified_z_scores(test_ratios, reference_ratios):
+    """整列计算测试数据比值相对于参考数据比值的修正Z-score（中位数/MAD）和异常程度代码
+
+    修正Z = 0.6745 * (比值 - 中位数) / MAD。中位数和MAD不受少量极端值影响，
+    参考数据中的异常值不会像均值和标准差那样放大正常范围。
+
+    Args:
+        test_ratios (list | numpy.ndarray): 测试数据的比值
+        reference_ratios (list | numpy.ndarray | KLLSketch): 参考数据的比值或其分位数草图
+
+    Returns:
+        tuple: (修正Z-score数组, 异常程度代码数组, 异常数据下标数组)，异常程度代码见SEVERITY_LABELS；
+            参考数据为空或MAD为0时返回None
+    """
+    robust = median_mad(reference_ratios)
+    if robust is None:
+        print("警告: 参考数据不足，无法计算修正Z-score")
+        return None
+    median, mad = robust
+    if mad == 0:
+        print("警告: 参考数据的MAD为0，无法计算修正Z-score")
+        return None
+
+    modified_z = MAD_SCALE * (np.asarray(test_ratios, dtype=np.float64) - median) / mad
+    abs_z = np.abs(modified_z)
+    severity = np.where(abs_z > MAD_SEVERE_THRESHOLD, SEVERITY_SEVERE,
+                        np.where(abs_z > MAD_MILD_THRESHOLD, SEVERITY_MILD, SEVERITY_NORMAL)).astype(np.int8)
+    return modified_z, severity, np.flatnonzero(severity)
+
+
+def compute_rolling_z_scores(ratios, times=None, window=DRIFT_WINDOW, time_window=None,
+                             min_periods=DRIFT_MIN_PERIODS):
+    """滚动基线Z-score：每个比值只与同一设备之前的一段比值（计数窗口或时间窗口）比较，用于发现缓慢的失准漂移
+
+    与compute_z_scores使用固定参考数据不同，基线随时间滑动，秤逐渐漂移时每一段都与紧邻的历史比较。
+    先按时间对整列排序一次（O(n log n)），窗口统计量再由online_stats.rolling_window_stats用前缀和向量化算出：
+    计数窗口每个O(1)，时间窗口的边界用二分查找，每个O(log n)。追加写入的文件可以用IncrementalAnalyzer
+    逐条计算同样的滚动基线，不需要重新读取历史数据。
+
+    Args:
+        ratios (numpy.ndarray): 比值数组
+        times (numpy.ndarray, optional): 对应的datetime64时间，提供时按时间先后计算窗口，否则按数组顺序
+        window (int): 计数窗口：之前的window个比值
+        time_window (numpy.timedelta64 | datetime.timedelta, optional): 时间窗口，例如np.timedelta64(7, 'D')，
+            指定时忽略window，必须同时提供times
+        min_periods (int): 窗口内至少需要的比值个数，不足时Z-score为NaN，记为正常
+
+    Returns:
+        tuple: (Z-score数组, 异常程度代码数组, 异常数据下标数组, 基线均值数组)，顺序与ratios相同
+    """
+    ratios = np.asarray(ratios, dtype=np.float64)
+    if time_window is not None:
+        if times is None:
+            raise ValueError("使用时间窗口时必须提供times")
+        time_window = np.timedelta64(time_window)
+    order = np.argsort(times, kind='stable') if times is not None else np.arange(len(ratios))
+    sorted_times = times[order] if times is not None else None
+    counts, means, stds = rolling_window_stats(ratios[order], sorted_times, window, time_window)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sorted_z = (ratios[order] - means) / stds
+    sorted_z[(counts < min_periods) | ~(stds > 0)] = np.nan
+
+    z_scores = np.empty_like(sorted_z)
+    z_scores[order] = sorted_z
+    baseline_means = np.empty_like(means)
+    baseline_means[order] = means
+    severity = severity_codes(z_scores)
+    return z_scores, severity, np.flatnonzero(severity), baseline_means
+
+
+def drift_timeline(times, ratios, z_scores, severity, baseline_means):
+    """按日期汇总滚动基线Z-score的结果，得到漂移时间线
+
+    Args:
+        times (numpy.ndarray): datetime64时间数组
+        ratios, z_scores, severity, baseline_means (numpy.ndarray): compute_rolling_z_scores的输入和结果
+
+    Returns:
+        list: 按日期排序的字典列表，每项包含date、count、ratio_mean、baseline_mean、mean_z、max_abs_z、
+            mild_anomaly_count、severe_anomaly_count、anomaly_rate；没有基线的数据不计入Z-score和基线均值
+    """
+    if len(times) == 0:
         return []
+    days, inverse = np.unique(times.astype('datetime64[D]'), return_inverse=True)
+    inverse = inverse.ravel()
+    size = len(days)
+    counts = np.bincount(inverse, minlength=size)
+    scored = ~np.isnan(z_scores)
+    scored_counts = np.bincount(inverse[scored], minlength=size)
+    ratio_means = np.bincount(inverse, weights=ratios, minlength=size) / counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baseline = np.bincount(inverse[scored], weights=baseline_means[scored], minlength=size) / scored_counts
+        mean_z = np.bincount(inverse[scored], weights=z_scores[scored], minlength=size) / scored_counts
+    max_abs_z = np.full(size, np.nan)
+    np.fmax.at(max_abs_z, inverse[scored], np.abs(z_scores[scored]))
+    mild = np.bincount(inverse[severity == SEVERITY_MILD], minlength=size)
+    severe = np.bincount(inverse[severity == SEVERITY_SEVERE], minlength=size)
+
+    def value(number):
+        return None if np.isnan(number) else number
+
+    timeline = []
+    for day, count, ratio_mean, base, z, top_z, mild_count, severe_count in zip(
+            days.astype(str).tolist(), counts.tolist(), ratio_means.tolist(), baseline.tolist(), mean_z.tolist(),
+            max_abs_z.tolist(), mild.tolist(), severe.tolist()):
+        timeline.append({
+            'date': day,
+            'count': count,
+            'ratio_mean': ratio_mean,
+            'baseline_mean': value(base),
+            'mean_z': value(z),
+            'max_abs_z': value(top_z),
+            'mild_anomaly_count': mild_count,
+            'severe_anomaly_count': severe_count,
+            'anomaly_rate': (mild_count + severe_count) / count * 100
+        })
+    return timeline
+
+
+def data_rows(test_data, indices):
+    """取出部分下标的完整数据行
+
+    Args:
+        test_data (list | WeighingColumns): 数据行列表或列式数据。列式数据只扫描一遍源文件读取这些行
+        indices (list): 行下标，超出范围的下标被忽略
+
+    Returns:
+        dict: 下标到行字典的映射
+    """
+    indices = [i for i in indices if i < len(test_data)]
+    if isinstance(test_data, WeighingColumns):
+        return dict(zip(indices, test_data.original_rows(indices)))
+    return {i: test_data[i] for i in indices}
+
+
+def calculate_z_scores(test_ratios, reference_ratios, test_data=None):
+    """计算测试数据比值相对于参考数据比值的Z-score，并判断异常程度
+
+    每个数据点都生成一个字典，数据量大时请直接使用compute_z_scores。
+
+    Args:
+        test_ratios (list | numpy.ndarray): 测试数据的比值列表
+        reference_ratios (list | numpy.ndarray): 参考数据的比值列表
+        test_data (list | WeighingColumns, optional): 测试数据的完整数据行列表
+
+    Returns:
+        list: 包含Z-score值、异常程度和原始数据的字典列表
+    """
+    scored = compute_z_scores(test_ratios, reference_ratios)
+    if scored is None:
+        return []
+    z_scores, severity, _ = scored
+    rows = data_rows(test_data, range(len(z_scores))) if test_data else {}
 
-    # 计算每个测试数据的Z-score并判断异常程度
     z_score_results = []
-    for i, ratio in enumerate(test_ratios):
-        z_score = (ratio - ref_mean) / ref_std
-        abs_z = abs(z_score)
-        if abs_z > 3:
-            anomaly = "重度异常"
-        elif abs_z > 2:
-            anomaly = "轻度异常"
-        else:
-            anomaly = "正常"
-        
+    for i, (ratio, z_score, code) in enumerate(zip(np.asarray(test_ratios, dtype=np.float64).tolist(),
+                                                   z_scores.tolist(), severity.tolist())):
         result = {
             'z_score': z_score,
-            'anomaly': anomaly,
+            'anomaly': SEVERITY_LABELS[code],
             'ratio': ratio
         }
-        
+
         # 如果提供了测试数据，添加原始数据行
-        if test_data and i < len(test_data):
-            result['original_data'] = test_data[i]
-            
+        if i in rows:
+            result['original_data'] = rows[i]
+
         z_score_results.append(result)
 
     return z_score_results
 
 
+def iqr_bounds(device_ratios):
+    """根据设备数据比值的四分位计算异常值范围
+
+    Args:
+        device_ratios (list | numpy.ndarray | KLLSketch): 设备数据的比值，或设备全部历史比值的分位数草图。
+            传入草图时不需要保存和排序全部比值，四分位为近似值（误差见KLLSketch）
+
+    Returns:
+        tuple: (Q1, Q3, IQR, 下限, 上限)，数据不足时返回None
+    """
+    if device_ratios is None or len(device_ratios) < 2:
+        print("警告: 设备数据不足，无法计算四分位")
+        return None
+
+    if isinstance(device_ratios, KLLSketch):
+        q1, q3 = device_ratios.quantiles([0.25, 0.75]).tolist()
+    else:
+        q1, q3 = np.percentile(device_ratios, [25, 75])
+    iqr = q3 - q1
+    return q1, q3, iqr, q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def outlier_codes(test_ratios, lower_bound, upper_bound):
+    """整列判断测试数据比值是否超出异常值范围
+
+    Args:
+        test_ratios (list | numpy.ndarray): 测试数据的比值
+        lower_bound (float): 异常值下限
+        upper_bound (float): 异常值上限
+
+    Returns:
+        tuple: (异常代码数组, 异常数据下标数组)，异常代码为OUTLIER_NONE、OUTLIER_LOW或OUTLIER_HIGH
+    """
+    test_ratios = np.asarray(test_ratios, dtype=np.float64)
+    codes = np.full(len(test_ratios), OUTLIER_NONE, dtype=np.int8)
+    codes[test_ratios < lower_bound] = OUTLIER_LOW
+    codes[test_ratios > upper_bound] = OUTLIER_HIGH
+    return codes, np.flatnonzero(codes)
+
+
 def check_outliers(test_ratios, lower_bound, upper_bound):
     """检查测试数据比值是否超出异常值范围
 
@@ -72,51 +395,35 @@ def check_outliers(test_ratios, lower_bound, upper_bound):
     Returns:
         list: 包含比值和是否异常的字典列表
     """
-    if not test_ratios:
+    if len(test_ratios) == 0:
         print("警告: 没有测试数据可供分析")
         return []
 
-    outlier_results = []
-    for ratio in test_ratios:
-        if ratio < lower_bound or ratio > upper_bound:
-            is_outlier = True
-            if ratio < lower_bound:
-                anomaly = f"异常 (低于下限{lower_bound:.4f})"
-            else:
-                anomaly = f"异常 (高于上限{upper_bound:.4f})"
-        else:
-            is_outlier = False
-            anomaly = "正常"
-        outlier_results.append({
-            'ratio': ratio,
-            'is_outlier': is_outlier,
-            'anomaly': anomaly
-        })
-
-    return outlier_results
+    codes, _ = outlier_codes(test_ratios, lower_bound, upper_bound)
+    labels = {
+        OUTLIER_NONE: "正常",
+        OUTLIER_LOW: f"异常 (低于下限{lower_bound:.4f})",
+        OUTLIER_HIGH: f"异常 (高于上限{upper_bound:.4f})"
+    }
+    return [{'ratio': ratio, 'is_outlier': code != OUTLIER_NONE, 'anomaly': labels[code]}
+            for ratio, code in zip(np.asarray(test_ratios, dtype=np.float64).tolist(), codes.tolist())]
 
 def detect_outliers_with_iqr(device_ratios, test_ratios, test_data=None):
     """使用四分位法检测测试数据中的异常值
 
     Args:
-        device_ratios (list): 设备数据的比值列表（用于计算四分位）
+        device_ratios (list | KLLSketch): 设备数据的比值列表或分位数草图（用于计算四分位）
         test_ratios (list): 测试数据的比值列表（需要检查是否异常）
         test_data (list, optional): 测试数据的完整数据行列表
 
     Returns:
         list: 包含比值、是否异常和原始数据的字典列表
     """
-    if not device_ratios or len(device_ratios) < 2:
-        print("警告: 设备数据不足，无法计算四分位")
+    bounds = iqr_bounds(device_ratios)
+    if bounds is None:
         return []
-    
-    # 计算四分位
-    q1 = np.percentile(device_ratios, 25)
-    q3 = np.percentile(device_ratios, 75)
-    iqr = q3 - q1
-    lower_bound = q1 - 1.5 * iqr
-    upper_bound = q3 + 1.5 * iqr
-    
+    q1, q3, iqr, lower_bound, upper_bound = bounds
+
     # 打印四分位计算结果
     print(f"Q1: {q1:.4f}, Q3: {q3:.4f}, IQR: {iqr:.4f}")
     print(f"异常值范围: [{lower_bound:.4f}, {upper_bound:.4f}]")
@@ -126,14 +433,16 @@ def detect_outliers_with_iqr(device_ratios, test_ratios, test_data=None):
     
     # 如果提供了测试数据，添加原始数据行
     if test_data:
+        rows = data_rows(test_data, range(len(outlier_results)))
         for i, result in enumerate(outlier_results):
-            if i < len(test_data):
-                result['original_data'] = test_data[i]
+            if i in rows:
+                result['original_data'] = rows[i]
                 
     return outlier_results
 
 
-def analyze_file_and_get_ratios(file_path, ad_column='称重AD值', zero_ad_column='零点AD值', weight_column='重量(kg)'):
+def analyze_file_and_get_ratios(file_path, ad_column='称重AD值', zero_ad_column='零点AD值', weight_column='重量(kg)',
+                                keep_data=True):
     """分析文件并获取比值列表和完整数据
 
     Args:
@@ -141,60 +450,393 @@ def analyze_file_and_get_ratios(file_path, ad_column='称重AD值', zero_ad_colu
         ad_column (str): 称重AD值列名
         zero_ad_column (str): 零点AD值列名
         weight_column (str): 重量值列名
+        keep_data (bool): 是否返回完整数据行。只需要比值时设为False
 
     Returns:
-        tuple: (比值列表, 完整数据行列表)
+        tuple: (比值数组, 完整数据行)，数据行为按下标生成行字典的WeighingColumns，keep_data为False时为空列表
     """
-    processor = CSVProcessor()
+    processor = CSVProcessor(cache=column_cache)
 
     try:
-        data = processor.read_csv(file_path)
-        print(f"成功读取 {file_path} 中的 {len(data)} 条记录")
+        columns = processor.read_columns(file_path, ad_column, zero_ad_column, weight_column)
     except FileNotFoundError as e:
         print(e)
-        return [], []
+        return np.array([]), []
+
+    print(f"成功读取 {file_path} 中的 {len(columns)} 条记录")
+    return get_ratios_from_columns(columns, keep_data)
+
+
+def compute_ratios(columns):
+    """整列计算K值和比值：K值 = 称重AD值 - 零点AD值，比值 = K值 / 重量 / 1000
 
-    valid_ratios = []
-    valid_data = []
+    Args:
+        columns (WeighingColumns): 列式称重数据
+
+    Returns:
+        tuple: (K值数组, 比值数组, 原因码数组)，长度都与columns相同。
+            原因码见RATIO_REASONS：RATIO_OK和RATIO_ZERO_WEIGHT的行比值有效（重量为0时比值记为0），
+            RATIO_MISSING_COLUMN和RATIO_NON_NUMERIC的行K值和比值为NaN
+    """
+    count = len(columns)
+    reasons = np.full(count, RATIO_OK, dtype=np.int8)
+    if not all(columns.has(role) for role in ('ad', 'zero_ad', 'weight')):
+        reasons[:] = RATIO_MISSING_COLUMN
+        return np.full(count, np.nan), np.full(count, np.nan), reasons
+
+    reasons[~columns.valid('ad', 'zero_ad', 'weight')] = RATIO_NON_NUMERIC
+    weights = columns.values['weight']
+    reasons[(reasons == RATIO_OK) & (weights == 0)] = RATIO_ZERO_WEIGHT
+
+    k_values = columns.values['ad'] - columns.values['zero_ad']
+    ratios = np.full(count, np.nan)
+    ratios[reasons == RATIO_ZERO_WEIGHT] = 0.0
+    ok = reasons == RATIO_OK
+    ratios[ok] = k_values[ok] / weights[ok] / 1000
+    k_values[reasons == RATIO_NON_NUMERIC] = np.nan
+    return k_values, ratios, reasons
+
+
+def get_ratios_from_columns(columns, keep_data=True):
+    """根据列式数据计算比值：(称重AD值 - 零点AD值) / 重量 / 1000，重量为0时比值记为0
+
+    Args:
+        columns (WeighingColumns): 列式称重数据
+        keep_data (bool): 是否返回有效比值对应的数据行
+
+    Returns:
+        tuple: (比值数组, 有效数据行)
+    """
+    _, ratios, reasons = compute_ratios(columns)
+    valid = (reasons == RATIO_OK) | (reasons == RATIO_ZERO_WEIGHT)
+    return ratios[valid], columns.take(valid) if keep_data else []
+
+
+def project_column_map(column_map, roles):
+    """只保留roles中的字段，roles为None时保留全部字段"""
+    if roles is None:
+        return dict(column_map)
+    return {role: column for role, column in column_map.items() if role in roles}
 
-    for row in data:
-        try:
-            ad_value = float(row[ad_column])
-            zero_ad_value = float(row[zero_ad_column])
-            weight_value = float(row[weight_column])
 
-            k_value = ad_value - zero_ad_value
-            ratio = k_value / weight_value / 1000 if weight_value != 0 else 0
+def filter_rows(rows, fieldnames, where):
+    """按过滤条件筛选一块CSV行
 
-            valid_ratios.append(ratio)
-            valid_data.append(row)  # 保存完整数据行
-        except (ValueError, KeyError) as e:
+    先判断开销小的条件，后面的条件只对仍然保留的行判断。
+
+    Args:
+        rows (list): csv.reader产生的行列表
+        fieldnames (list): CSV表头
+        where (list): Predicate列表
+
+    Returns:
+        numpy.ndarray: 保留行在rows中的下标
+    """
+    kept = np.arange(len(rows))
+    for predicate in sorted(where, key=lambda p: ('isin', 'value', 'time').index(p.kind)):
+        if len(kept) == 0:
+            break
+        index = fieldnames.index(predicate.column)
+        strings = [rows[i][index] if index < len(rows[i]) else '' for i in kept.tolist()]
+        kept = kept[predicate.mask(strings)]
+    return kept
+
+
+def columns_from_reader(reader, fieldnames, column_map, chunk_size, where=None):
+    """把csv.reader中的数据行按块解析为列式数据
+
+    Args:
+        reader: csv.reader，已跳过表头
+        fieldnames (list): CSV表头
+        column_map (dict): 要解析的字段名到列名的映射
+        chunk_size (int): 每块的行数
+        where (list, optional): Predicate列表，不满足的行在类型转换之前丢弃
+
+    Returns:
+        tuple: (列式数据, 读取的数据行总数（包括被过滤掉的行）)
+    """
+    parts = []
+    row_offset = 0
+    chunk = []
+    time_parsers = {}  # 各时间列的格式只在第一块中推断一次
+    dictionaries = {}  # 文本列的字典各块共用
+
+    def parse_chunk():
+        if not where:
+            return WeighingColumns.from_rows(chunk, fieldnames, column_map, row_offset, time_parsers,
+                                             dictionaries=dictionaries)
+        kept = filter_rows(chunk, fieldnames, where)
+        return WeighingColumns.from_rows([chunk[i] for i in kept.tolist()], fieldnames, column_map,
+                                         time_parsers=time_parsers, row_ids=kept + row_offset,
+                                         dictionaries=dictionaries)
+
+    for row in reader:
+        if not row:  # 与DictReader一致，跳过空行
             continue
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            parts.append(parse_chunk())
+            row_offset += len(chunk)
+            chunk = []
+    if chunk:
+        parts.append(parse_chunk())
+        row_offset += len(chunk)
+    return WeighingColumns.concat(parts, fieldnames, column_map), row_offset
+
 
-    return valid_ratios, valid_data
+def _parse_byte_range(file_path, start, end, fieldnames, column_map, chunk_size, where=None):
+    """解析文件中[start, end)字节区间内的数据行（在子进程中运行）
+
+    Returns:
+        tuple: (列式数据, 区间内的数据行数, 区间内是否出现引号)
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+    columns, row_count = columns_from_reader(reader, fieldnames, column_map, chunk_size, where)
+    return columns, row_count, b'"' in data
 
 
 class CSVProcessor:
-    """CSV文件处理器，提供读取、处理和写入CSV文件的功能"""
+    """CSV文件处理器，提供读取、处理和写入CSV文件的功能
+
+    读取方法都支持gzip（.gz）和zstd（.zst）压缩的CSV文件，按扩展名或文件头识别，边读边解压。
+    """
+
+    def __init__(self, cache=None):
+        """
+        Args:
+            cache (ColumnCache, optional): 列式数据缓存，read_columns优先从缓存读取
+        """
+        self.cache = cache
 
     def read_csv(self, file_path):
         """读取CSV文件并返回数据
 
+        所有行一次性生成为字典并驻留内存，大文件请使用iter_csv或iter_chunks。
+
         Args:
             file_path (str): CSV文件路径
 
         Returns:
             list: 包含CSV数据的列表，每个元素是一行数据（字典形式）
         """
+        return list(self.iter_csv(file_path))
+
+    def read_header(self, file_path):
+        """只读取CSV文件的表头
+
+        Args:
+            file_path (str): CSV文件路径
+
+        Returns:
+            list: 列名列表，文件为空时返回空列表
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
-        data = []
-        with open(file_path, 'r', encoding='utf-8-sig') as file:  # 使用utf-8-sig自动处理BOM
-            reader = csv.DictReader(file)
-            for row in reader:
-                data.append(row)
-        return data
+        with open_text(file_path) as file:
+            reader = csv.reader(file)
+            return next(reader, [])
+
+    def iter_csv(self, file_path, columns=None, where=None):
+        """逐行读取CSV文件（生成器），不会把整个文件一次性载入内存
+
+        Args:
+            file_path (str): CSV文件路径
+            columns (list, optional): 只保留这些列，默认保留全部列
+            where (list, optional): Predicate列表（见row_filters），只产生满足全部条件的行
+
+        Returns:
+            generator: 依次产生每一行数据（字典形式）
+
+        Raises:
+            FileNotFoundError: 文件不存在
+            ValueError: columns或where中的列在表头中不存在
+        """
+        # 在创建生成器之前检查文件和列名，保证异常在调用处立即抛出
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+        if columns or where:
+            self._check_columns(self.read_header(file_path), columns, where)
+        return self._iter_rows(file_path, columns, where)
+
+    def iter_chunks(self, file_path, chunk_size=10000, columns=None, where=None):
+        """按块读取CSV文件，每次产生最多chunk_size行
+
+        Args:
+            file_path (str): CSV文件路径
+            chunk_size (int): 每块的行数
+            columns (list, optional): 只保留这些列，默认保留全部列
+            where (list, optional): Predicate列表，只产生满足全部条件的行
+
+        Returns:
+            generator: 依次产生数据块，每块是行字典的列表
+        """
+        rows = self.iter_csv(file_path, columns, where)
+
+        def chunks():
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        return chunks()
+
+    def read_columns(self, file_path, ad_column='称重AD值', zero_ad_column='零点AD值', weight_column='重量(kg)',
+                     chunk_size=50000, workers=1, roles=None, where=None):
+        """按块读取称重CSV文件，并直接解析为带有效性掩码的列数组
+
+        roles和where在解析时生效：未选择的字段不做类型转换，不满足条件的行在类型转换之前丢弃，
+        保留行的row_ids仍是其在原始文件中的序号。行字典只包含已解析的列，值为原始文本；
+        完整的原始行（包括订单号等未解析的列）用返回值的original_rows按需从文件重新读取。
+
+        Args:
+            file_path (str): CSV文件路径
+            ad_column (str): 称重AD值列名
+            zero_ad_column (str): 零点AD值列名
+            weight_column (str): 重量值列名
+            chunk_size (int): 每次解析的行数，只有当前块以字符串形式驻留内存
+            workers (int): 解析进程数。大于1且文件足够大时按换行切分为多个字节区间并行解析，
+                结果（包括行顺序）与单进程解析完全一致。压缩文件总是单进程解析
+            roles (iterable, optional): 只解析这些字段（如 ('weight', 'time')），默认解析全部字段
+            where (list, optional): Predicate列表（见row_filters），只保留满足全部条件的行
+
+        Returns:
+            WeighingColumns: 列式称重数据
+
+        Raises:
+            FileNotFoundError: 文件不存在
+            ValueError: where中的列在表头中不存在
+        """
+        fieldnames = self.read_header(file_path)
+        column_map = detect_columns(fieldnames, ad_column, zero_ad_column, weight_column)
+        if where:
+            self._check_columns(fieldnames, None, where)
+
+        # 缓存中总是完整数据：有完整缓存时直接在内存中筛选，部分读取的结果不写入缓存
+        if self.cache is not None:
+            columns = self.cache.load(file_path, column_map)
+            if columns is not None:
+                if roles is None and not where:
+                    return columns
+                columns = self._select_loaded(columns, roles, where)
+                if columns is not None:
+                    return columns
+
+        parse_map = project_column_map(column_map, roles)
+        columns = None
+        # 压缩文件无法按字节区间定位，总是单进程流式解压解析
+        if (workers > 1 and os.path.getsize(file_path) >= PARALLEL_MIN_BYTES
+                and detect_compression(file_path) is None):
+            columns = self._read_columns_parallel(file_path, fieldnames, parse_map, chunk_size, workers, where)
+        if columns is None:
+            with open_text(file_path) as file:
+                reader = csv.reader(file)
+                next(reader, None)  # 跳过表头
+                columns, _ = columns_from_reader(reader, fieldnames, parse_map, chunk_size, where)
+        columns.source = file_path
+
+        if self.cache is not None and roles is None and not where:
+            self.cache.save(file_path, columns)
+        return columns
+
+    def _check_columns(self, fieldnames, columns, where):
+        missing = [column for column in (columns or []) if column not in fieldnames]
+        missing += [predicate.column for predicate in (where or []) if predicate.column not in fieldnames]
+        if missing:
+            raise ValueError(f"列不存在: {missing}，可用列: {fieldnames}")
+
+    def _select_loaded(self, columns, roles, where):
+        """在已加载的完整列式数据上应用字段选择和过滤条件
+
+        Returns:
+            WeighingColumns: 筛选后的列式数据；过滤条件涉及未解析的列时返回None
+        """
+        keep = np.ones(len(columns), dtype=bool)
+        for predicate in where or []:
+            mask = predicate.mask_columns(columns)
+            if mask is None:
+                return None
+            keep &= mask
+        if where:
+            columns = columns.take(keep)
+        if roles is not None:
+            column_map = project_column_map(columns.column_map, roles)
+            columns = WeighingColumns(columns.fieldnames, column_map,
+                                      {role: columns.values[role] for role in column_map if role in columns.values},
+                                      {role: columns.masks[role] for role in column_map if role in columns.masks},
+                                      columns.row_ids,
+                                      {role: fmt for role, fmt in columns.time_formats.items() if role in column_map},
+                                      {role: names for role, names in columns.categories.items() if role in column_map},
+                                      {column: raw for column, raw in columns.raw.items()
+                                       if column in column_map.values()},
+                                      columns.source)
+        return columns
+
+    def split_byte_ranges(self, file_path, parts):
+        """把CSV文件的数据部分在换行处切分为若干字节区间
+
+        Args:
+            file_path (str): CSV文件路径
+            parts (int): 期望的区间数
+
+        Returns:
+            tuple: (表头行, [(起始字节, 结束字节), ...])
+        """
+        size = os.path.getsize(file_path)
+        with open(file_path, 'rb') as file:
+            header_line = file.readline()
+            data_start = file.tell()
+            boundaries = [data_start]
+            for k in range(1, parts):
+                position = data_start + (size - data_start) * k // parts
+                if position <= boundaries[-1]:
+                    continue
+                file.seek(position - 1)
+                file.readline()  # 移动到下一行开头；position恰好在行首时不跳过该行
+                if boundaries[-1] < file.tell() < size:
+                    boundaries.append(file.tell())
+        boundaries.append(size)
+        return header_line, list(zip(boundaries[:-1], boundaries[1:]))
+
+    def _read_columns_parallel(self, file_path, fieldnames, column_map, chunk_size, workers, where=None):
+        """按字节区间多进程解析；文件含引号（字段内可能有换行）时返回None，由调用方改为单进程解析"""
+        header_line, ranges = self.split_byte_ranges(file_path, workers)
+        if b'"' in header_line or len(ranges) < 2:
+            return None
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_parse_byte_range, file_path, start, end, fieldnames, column_map, chunk_size,
+                                       where)
+                       for start, end in ranges]
+            results = [future.result() for future in futures]
+
+        if any(has_quote for _, _, has_quote in results):
+            return None
+
+        # 各区间的行序号从0开始，按区间顺序累加偏移（包括被过滤掉的行）
+        parts = []
+        row_offset = 0
+        for part, row_count, _ in results:
+            part.row_ids += row_offset
+            row_offset += row_count
+            parts.append(part)
+        return WeighingColumns.concat(parts, fieldnames, column_map)
+
+    def _iter_rows(self, file_path, columns=None, where=None):
+        with open_text(file_path) as file:  # 使用utf-8-sig自动处理BOM，压缩文件边读边解压
+            for row in csv.DictReader(file):
+                if where and not all(predicate.match(row.get(predicate.column)) for predicate in where):
+                    continue
+                if columns:
+                    row = {column: row.get(column) for column in columns}
+                yield row
 
     def write_csv(self, file_path, data, fieldnames=None):
         """将数据写入CSV文件
@@ -245,18 +887,32 @@ class CSVProcessor:
                 row[column_name] = process_func(row[column_name])
         return data
 
-    def aggregate_data(self, data, group_by_column, agg_column, agg_func):
+    def aggregate_data(self, data, group_by_column, agg_column=None, agg_func=None, aggregations=None):
         """根据指定列分组并聚合
 
+        传入agg_column和agg_func时为每个分组收集原始值列表再调用agg_func；
+        传入aggregations时一次分组、整列计算多个列上的多个聚合（见group_by.aggregate），
+        例如 {'次数': ('重量(kg)', 'count'), '均值': ('重量(kg)', 'mean'), 'P90': ('重量(kg)', 'quantile', 0.9)}，
+        支持count、sum、mean、std、min、max、median、q25、q75和quantile。
+
         Args:
-            data (list): 要聚合的数据
+            data (list | WeighingColumns): 要聚合的数据
             group_by_column (str): 分组列名
-            agg_column (str): 要聚合的列名
-            agg_func (function): 聚合函数
+            agg_column (str, optional): 要聚合的列名
+            agg_func (function, optional): 聚合函数
+            aggregations (dict, optional): 聚合名到聚合定义的映射
 
         Returns:
-            dict: 聚合结果
+            dict | GroupTable: 使用agg_func时为 {分组键: 聚合结果}，使用aggregations时为GroupTable
+
+        Raises:
+            ValueError: 不支持的聚合函数
         """
+        if aggregations is not None:
+            columns = {parse_aggregation(spec)[0] for spec in aggregations.values()}
+            keys, values, masks, key_names = self._aggregation_inputs(data, group_by_column, columns)
+            return aggregate(keys, values, aggregations, masks, key_names)
+
         result = {}
         for row in data:
             group_key = row[group_by_column]
@@ -271,6 +927,43 @@ class CSVProcessor:
 
         return result
 
+    def _aggregation_inputs(self, data, group_by_column, columns):
+        """取出分组键数组和各聚合列的数值数组
+
+        列式数据中已解析的字段直接使用其数组，其它情况逐行取值后整列解析一次。
+        分组键无效（时间或数值无法解析）的行不参与聚合。
+
+        Returns:
+            tuple: (分组键数组, 列名到数值数组的映射, 列名到有效性掩码的映射, 分组键为文本代码时的字典)
+        """
+        roles = {}
+        if isinstance(data, WeighingColumns):
+            roles = {column: role for role, column in data.column_map.items() if column and role in data.values}
+
+        key_role = roles.get(group_by_column)
+        key_names = data.categories.get(key_role) if key_role else None
+        if key_role:
+            keys = data.values[key_role]
+            # 空的文本值与逐行读取时一样作为一个分组
+            keep = data.masks[key_role] if key_role not in TEXT_ROLES else np.ones(len(keys), dtype=bool)
+        else:
+            keys = np.array([row.get(group_by_column, '') for row in data], dtype=str)
+            keep = np.ones(len(keys), dtype=bool)
+
+        values = {}
+        masks = {}
+        for column in columns:
+            role = roles.get(column)
+            if role in NUMERIC_ROLES:
+                values[column], masks[column] = data.values[role], data.masks[role]
+            else:
+                values[column], masks[column] = parse_float_column([row.get(column) for row in data])
+        if not keep.all():
+            keys = keys[keep]
+            values = {column: array[keep] for column, array in values.items()}
+            masks = {column: mask[keep] for column, mask in masks.items()}
+        return keys, values, masks, key_names
+
     def group_by_product(self, data, product_column):
         """根据商品名称分类数据
 
@@ -353,6 +1046,67 @@ class CSVProcessor:
 
 
 
+class WeighingDataset:
+    """称重数据会话：文件只读取并类型转换一次，多个分析共用
+
+    列数组在第一次访问时加载（优先使用列缓存），表头字段识别随之完成；
+    比值等派生结果也只计算一次。
+    """
+
+    def __init__(self, file_path, cache=column_cache, workers=1, where=None):
+        """
+        Args:
+            file_path (str): CSV文件路径
+            cache (ColumnCache, optional): 列式数据缓存，为None时不使用缓存
+            workers (int): 解析大文件时使用的进程数
+            where (list, optional): Predicate列表（见row_filters），所有分析只使用满足条件的行，
+                例如只分析最近一周或某几种商品
+        """
+        self.file_path = file_path
+        self.workers = workers
+        self.where = where
+        self.processor = CSVProcessor(cache=cache)
+        self._columns = None
+        self._ratios = None
+        self._time_index = None
+
+    @property
+    def columns(self):
+        """列式数据（WeighingColumns），第一次访问时加载
+
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        if self._columns is None:
+            self._columns = self.processor.read_columns(self.file_path, workers=self.workers, where=self.where)
+            print(f"成功读取 {self.file_path} 中的 {len(self._columns)} 条记录")
+        return self._columns
+
+    def column(self, role):
+        """返回某个字段在表头中对应的列名，找不到时返回None"""
+        return self.columns.column(role)
+
+    def ratios(self):
+        """返回比值数组和有效数据行，结果只计算一次
+
+        Returns:
+            tuple: (比值数组, 有效数据行)
+        """
+        if self._ratios is None:
+            self._ratios = get_ratios_from_columns(self.columns)
+        return self._ratios
+
+    def time_index(self):
+        """返回重量的时间索引（TimeIndex），只建立一次，可查询任意时间区间的次数、均值、标准差、最小值和最大值
+
+        Returns:
+            TimeIndex: 时间索引；缺少时间列或重量列时返回None
+        """
+        if self._time_index is None:
+            self._time_index = TimeIndex.from_columns(self.columns)
+        return self._time_index
+
+
 def analyze_weight_data(file_path, ad_column='称重AD值', zero_ad_column='零点AD值', weight_column='重量(kg)'):
     """分析称重数据CSV文件，计算K值和比值
 
@@ -362,51 +1116,36 @@ def analyze_weight_data(file_path, ad_column='称重AD值', zero_ad_column='零
         zero_ad_column (str): 零点AD值列名
         weight_column (str): 重量值列名
     """
-    processor = CSVProcessor()
+    processor = CSVProcessor(cache=column_cache)
 
-    # 读取数据
     try:
-        data = processor.read_csv(file_path)
-        print(f"成功读取 {len(data)} 条记录")
+        columns = processor.read_columns(file_path, ad_column, zero_ad_column, weight_column)
     except FileNotFoundError as e:
         print(e)
         return
 
-    # 计算每行数据的K值和比值
-    results = []
-    valid_ratios = []  # 存储有效的比值用于统计分析
+    # 整列计算K值和比值
+    k_values, ratios, reasons = compute_ratios(columns)
+    valid = (reasons == RATIO_OK) | (reasons == RATIO_ZERO_WEIGHT)
+    valid_ratios = ratios[valid].tolist()  # 有效的比值用于统计分析
 
     print("\n计算K值和比值:")
     print("=" * 60)
 
-    for i, row in enumerate(data):
-        try:
-            # 获取必要的值
-            ad_value = float(row[ad_column])
-            zero_ad_value = float(row[zero_ad_column])
-            weight_value = float(row[weight_column])
-
-            # 计算K值
-            k_value = ad_value - zero_ad_value
-
-            # 计算比值
-            ratio = k_value / weight_value / 1000 if weight_value != 0 else 0
-
-            # 保存计算结果
-            row['K值'] = k_value
-            row['比值'] = ratio
-            results.append(row)
-
-            # 收集有效比值用于统计分析
-            valid_ratios.append(ratio)
-
-            # 显示前10行的计算结果
-            if i < 10000:
+    if len(columns) and reasons[0] == RATIO_MISSING_COLUMN:
+        missing = [column for column in (ad_column, zero_ad_column, weight_column) if column not in columns.fieldnames]
+        print(f"警告: 缺少列 {missing}，无法计算比值")
+    else:
+        # 显示前10000行的计算结果以及所有有误的行
+        shown = (columns.row_ids < 10000) | ~valid
+        for i, k_value, ratio, reason in zip(columns.row_ids[shown].tolist(), k_values[shown].tolist(),
+                                             ratios[shown].tolist(), reasons[shown].tolist()):
+            if reason == RATIO_NON_NUMERIC:
+                print(f"警告: 第{i + 1}行数据有误，跳过计算: {RATIO_REASONS[reason]}")
+            else:
                 print(f"行 {i + 1}: K值={k_value:.2f}, 比值={ratio:.4f}")
 
-        except (ValueError, KeyError) as e:
-            print(f"警告: 第{i + 1}行数据有误，跳过计算: {e}")
-            continue
+    print(f"成功读取 {len(columns)} 条记录")
 
     # 对比值进行描述性分析
     if valid_ratios:
@@ -443,37 +1182,88 @@ def analyze_weight_data(file_path, ad_column='称重AD值', zero_ad_column='零
         plt.show()
 
 
+def week_label(code):
+    """ISO周编码转为 2025-W08 形式的周次"""
+    return f"{code // 100}-W{code % 100:02d}"
+
+
+def month_label(month):
+    """月份（datetime.date）转为 2025-08 形式"""
+    return f"{month.year}-{month.month:02d}"
+
+
+def day_week_label(day):
+    """日期（datetime.date）所在的ISO周，形式与week_label相同"""
+    iso_year, iso_week, _ = day.isocalendar()
+    return week_label(iso_year * 100 + iso_week)
+
+
+def day_type(day):
+    """日期是周内（'weekday'）还是周末（'weekend'）"""
+    return 'weekend' if day.weekday() >= 5 else 'weekday'
+
+
+# 由日期得到各汇总级别分组键的函数，键与time_based_weight_statistics的返回结果一致。
+# 各级别都由每日部分统计量经roll_up合并得到，不重新扫描记录：每个级别对每天调用一次分组函数，
+# 并合并一次RunningStats和一次SpaceSaving（后者与计数器容量成正比），天数多、商品多时开销不可忽略。
+# 新增的级别（只能是日期的函数，例如季度）会出现在两者的返回结果中，
+# 但time_based_weight_statistics的打印输出需要另加一段
+ROLLUP_LEVELS = {
+    'weekly': day_week_label,
+    'weekly_weekday_weekend': lambda day: f"{day_week_label(day)}_{day_type(day)}",
+    'monthly': month_label
+}
+
+
 """
 单台秤的称重失准异常分析
 """
-def single_scale_example_usage():
-    """示例用法，返回异常分析结果"""
-    # 获取当前目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # 定义文件路径
-    # 设备L30DG0071_称重数据_20000条.csv 设备L30DG0091_称重数据_2025-05-31_2025-08-28.csv
-    test_file = os.path.join(current_dir, '设备L30DG0071_称重数据_20000条.csv')
-    device_file = os.path.join(current_dir, '设备L30DG0071_称重数据_20000条.csv')
-    
-    # 检查文件是否存在
-    if not os.path.exists(test_file):
-        print(f"错误: 找不到测试数据文件 '{test_file}'")
-        return None
-    
-    if not os.path.exists(device_file):
-        print(f"错误: 找不到设备数据文件 '{device_file}'")
-        return None
+def single_scale_example_usage(test_dataset=None, device_dataset=None, baseline=None):
+    """示例用法，返回异常分析结果
 
-    # 分析文件并获取比值和完整数据
-    print("正在分析测试数据文件...")
-    test_ratios, test_data = analyze_file_and_get_ratios(test_file)
-    
-    print("正在分析设备数据文件...")
-    device_ratios, _ = analyze_file_and_get_ratios(device_file)  # 设备数据只需要比值
+    Args:
+        test_dataset (WeighingDataset, optional): 测试数据，默认读取示例数据文件
+        device_dataset (WeighingDataset, optional): 设备参考数据，默认与测试数据相同
+        baseline (Baseline, optional): 已保存的设备基线（见baseline_store），提供时不读取设备参考数据
+    """
+    if test_dataset is None:
+        # 定义文件路径
+        test_file = DEFAULT_DATA_FILE
+        device_file = DEFAULT_DATA_FILE
+        
+        # 检查文件是否存在
+        if not os.path.exists(test_file):
+            print(f"错误: 找不到测试数据文件 '{test_file}'")
+            return None
+        
+        if not os.path.exists(device_file):
+            print(f"错误: 找不到设备数据文件 '{device_file}'")
+            return None
+        
+        test_dataset = WeighingDataset(test_file)
+        device_dataset = test_dataset if device_file == test_file else WeighingDataset(device_file)
+    elif device_dataset is None and baseline is None:
+        device_dataset = test_dataset
+
+    # 分析文件并获取比值和完整数据（同一会话的比值只计算一次）
+    try:
+        print("正在分析测试数据文件...")
+        test_ratios, test_data = test_dataset.ratios()
+        
+        if baseline is not None:
+            # Z-score使用基线的均值和标准差，MAD使用基线的分位数草图
+            print(f"使用设备 {baseline.device_id} 的基线（{len(baseline)} 个比值）")
+            device_ratios, robust_reference = baseline.stats, baseline.sketch
+        else:
+            print("正在分析设备数据文件...")
+            device_ratios, _ = device_dataset.ratios()  # 设备数据只需要比值
+            robust_reference = device_ratios
+    except FileNotFoundError as e:
+        print(e)
+        return None
     
     # 检查是否有足够的有效比值
-    if not test_ratios:
+    if len(test_ratios) == 0:
         print("错误: 测试数据中没有有效比值")
         return None
     
@@ -481,13 +1271,14 @@ def single_scale_example_usage():
         print("错误: 设备数据中有效比值不足")
         return None
 
-    # 计算Z-score并传递原始测试数据
-    z_score_results = calculate_z_scores(test_ratios, device_ratios, test_data)
+    # 整列计算Z-score，只为异常数据点生成原始数据行
+    scored = compute_z_scores(test_ratios, device_ratios)
     
     # 准备返回的异常分析结果
     anomaly_result = {
         'total_records': len(test_ratios),
         'z_score_anomalies': [],
+        'mad_anomalies': [],
         'summary': {
             'total_records': len(test_ratios),
             'z_score_stats': {
@@ -495,57 +1286,63 @@ def single_scale_example_usage():
                 'mild_anomaly_count': 0,
                 'severe_anomaly_count': 0,
                 'anomaly_rate': 0.0
+            },
+            'mad_stats': {
+                'normal_count': 0,
+                'mild_anomaly_count': 0,
+                'severe_anomaly_count': 0,
+                'anomaly_rate': 0.0
             }
         }
     }
     
-    if z_score_results:
+    if scored is not None:
+        z_scores, severity, anomaly_indices = scored
         print("\nZ-score计算结果:")
         print("=" * 80)
         print(f"{'数据点':<10}{'Z-score值':<15}{'异常程度':<15}")
         print("=" * 80)
         
-        # 收集Z-score异常数据
+        # 统计异常情况
+        counts = np.bincount(severity, minlength=3)
+        z_score_stats = anomaly_result['summary']['z_score_stats']
+        z_score_stats['normal_count'] = int(counts[SEVERITY_NORMAL])
+        z_score_stats['mild_anomaly_count'] = int(counts[SEVERITY_MILD])
+        z_score_stats['severe_anomaly_count'] = int(counts[SEVERITY_SEVERE])
+
+        # 收集Z-score异常数据，只从文件读取异常行的完整数据
+        rows = data_rows(test_data, anomaly_indices.tolist()) if test_data else {}
         z_anomalies = []
-        for i, result in enumerate(z_score_results):
-            z = result['z_score']
-            anomaly = result['anomaly']
+        for i, z, code, ratio in zip(anomaly_indices.tolist(), z_scores[anomaly_indices].tolist(),
+                                     severity[anomaly_indices].tolist(), test_ratios[anomaly_indices].tolist()):
+            result = {'z_score': z, 'anomaly': SEVERITY_LABELS[code], 'ratio': ratio}
+            if i in rows:
+                result['original_data'] = rows[i]
+            z_anomalies.append((i+1, result))
             
-            # 统计异常情况
-            if anomaly == "正常":
-                anomaly_result['summary']['z_score_stats']['normal_count'] += 1
-            elif anomaly == "轻度异常":
-                anomaly_result['summary']['z_score_stats']['mild_anomaly_count'] += 1
-            elif anomaly == "重度异常":
-                anomaly_result['summary']['z_score_stats']['severe_anomaly_count'] += 1
+            # 准备用于网页显示的异常数据
+            anomaly_data = {
+                'index': i+1,
+                'z_score': round(z, 2),
+                'anomaly': result['anomaly'],
+                'ratio': round(ratio, 2)
+            }
             
-            # 收集异常数据
-            if anomaly != "正常":
-                z_anomalies.append((i+1, result))
-                
-                # 准备用于网页显示的异常数据
-                anomaly_data = {
-                    'index': i+1,
-                    'z_score': round(z, 2),
-                    'anomaly': anomaly,
-                    'ratio': round(result['ratio'], 2)
-                }
-                
-                # 添加原始数据
-                if 'original_data' in result:
-                    original_data = result['original_data']
-                    anomaly_data.update({
-                        'ad_value': original_data.get('称重AD值', '-'),
-                        'zero_ad_value': original_data.get('零点AD值', '-'),
-                        'weight': original_data.get('重量(kg)', '-'),
-                        'product_name': original_data.get('商品名称', '-')
-                    })
-                
-                anomaly_result['z_score_anomalies'].append(anomaly_data)
+            # 添加原始数据
+            if 'original_data' in result:
+                original_data = result['original_data']
+                anomaly_data.update({
+                    'ad_value': original_data.get('称重AD值', '-'),
+                    'zero_ad_value': original_data.get('零点AD值', '-'),
+                    'weight': original_data.get('重量(kg)', '-'),
+                    'product_name': original_data.get('商品名称', '-')
+                })
+            
+            anomaly_result['z_score_anomalies'].append(anomaly_data)
         
         # 计算异常率
-        total_anomalies = anomaly_result['summary']['z_score_stats']['mild_anomaly_count'] + anomaly_result['summary']['z_score_stats']['severe_anomaly_count']
-        anomaly_result['summary']['z_score_stats']['anomaly_rate'] = (total_anomalies / len(test_ratios)) * 100 if len(test_ratios) > 0 else 0
+        total_anomalies = z_score_stats['mild_anomaly_count'] + z_score_stats['severe_anomaly_count']
+        z_score_stats['anomaly_rate'] = (total_anomalies / len(test_ratios)) * 100 if len(test_ratios) > 0 else 0
         
         # 输出Z-score异常数据行
         if z_anomalies:
@@ -573,80 +1370,265 @@ def single_scale_example_usage():
                     row_values = [idx] + [row_data.get(col, "-") for col in columns]
                     print("\t".join(map(str, row_values)))
 
+    # 中位数/MAD（修正Z-score）检测：参考数据中的极端值不会放大正常范围
+    robust_scored = compute_modified_z_scores(test_ratios, robust_reference)
+    if robust_scored is not None:
+        modified_z, mad_severity, mad_indices = robust_scored
+        counts = np.bincount(mad_severity, minlength=3)
+        mad_stats = anomaly_result['summary']['mad_stats']
+        mad_stats['normal_count'] = int(counts[SEVERITY_NORMAL])
+        mad_stats['mild_anomaly_count'] = int(counts[SEVERITY_MILD])
+        mad_stats['severe_anomaly_count'] = int(counts[SEVERITY_SEVERE])
+        mad_stats['anomaly_rate'] = len(mad_indices) / len(test_ratios) * 100
+        rows = data_rows(test_data, mad_indices.tolist()) if test_data else {}
+
+        for i, z, code, ratio in zip(mad_indices.tolist(), modified_z[mad_indices].tolist(),
+                                     mad_severity[mad_indices].tolist(), test_ratios[mad_indices].tolist()):
+            anomaly_data = {
+                'index': i+1,
+                'modified_z': round(z, 2),
+                'anomaly': SEVERITY_LABELS[code],
+                'ratio': round(ratio, 2)
+            }
+            if i in rows:
+                original_data = rows[i]
+                anomaly_data.update({
+                    'ad_value': original_data.get('称重AD值', '-'),
+                    'zero_ad_value': original_data.get('零点AD值', '-'),
+                    'weight': original_data.get('重量(kg)', '-'),
+                    'product_name': original_data.get('商品名称', '-')
+                })
+            anomaly_result['mad_anomalies'].append(anomaly_data)
+
+        print("\n修正Z-score（中位数/MAD）检测结果:")
+        print("=" * 80)
+        print(f"轻度异常: {mad_stats['mild_anomaly_count']}, 重度异常: {mad_stats['severe_anomaly_count']}, "
+              f"异常率: {mad_stats['anomaly_rate']:.2f}%")
+        if scored is not None:
+            z_set = set(anomaly_indices.tolist())
+            mad_set = set(mad_indices.tolist())
+            print(f"仅Z-score检测到: {len(z_set - mad_set)}, 仅MAD检测到: {len(mad_set - z_set)}, "
+                  f"两种方法共检测到: {len(z_set & mad_set)}")
+
     return anomaly_result
 
 
+def detect_calibration_drift(dataset=None, window=DRIFT_WINDOW, time_window=None, min_periods=DRIFT_MIN_PERIODS):
+    """用滚动基线Z-score检测单台秤的缓慢失准漂移，输出漂移时间线
+
+    Args:
+        dataset (WeighingDataset, optional): 称重数据会话，默认读取示例数据文件
+        window (int): 计数窗口大小，见compute_rolling_z_scores
+        time_window (numpy.timedelta64 | datetime.timedelta, optional): 时间窗口，指定时忽略window
+        min_periods (int): 窗口内至少需要的比值个数
+
+    Returns:
+        dict: 包含逐行异常、漂移时间线和汇总的字典
+    """
+    if dataset is None:
+        if not os.path.exists(DEFAULT_DATA_FILE):
+            print(f"错误: 找不到数据文件 '{DEFAULT_DATA_FILE}'")
+            return None
+        dataset = WeighingDataset(DEFAULT_DATA_FILE)
+
+    try:
+        ratios, data = dataset.ratios()
+    except FileNotFoundError as e:
+        print(e)
+        return None
+
+    if len(ratios) == 0:
+        print("错误: 数据中没有有效比值")
+        return None
+
+    # 漂移需要按时间先后计算，时间无法解析的记录不参与
+    if not data.has('time'):
+        if time_window is not None:
+            print("错误: 缺少时间列，无法使用时间窗口")
+            return None
+        print("警告: 缺少时间列，按文件顺序计算滚动基线，不输出漂移时间线")
+        times = None
+    else:
+        time_valid = data.masks['time']
+        if not time_valid.all():
+            print(f"警告: {int((~time_valid).sum())} 条记录无法解析时间格式，已跳过")
+            ratios, data = ratios[time_valid], data.take(time_valid)
+        times = data.values['time']
+
+    z_scores, severity, anomaly_indices, baseline_means = compute_rolling_z_scores(
+        ratios, times, window, time_window, min_periods)
+    counts = np.bincount(severity, minlength=3)
+    scored_count = int((~np.isnan(z_scores)).sum())
+    window_text = f"前 {np.timedelta64(time_window)} 内的比值" if time_window is not None else f"前 {window} 个比值"
+    print(f"\n滚动基线Z-score（基线为{window_text}，至少 {min_periods} 个）")
+    print(f"有效比值 {len(ratios)} 个，其中 {scored_count} 个有足够的基线，"
+          f"轻度异常 {int(counts[SEVERITY_MILD])} 个，重度异常 {int(counts[SEVERITY_SEVERE])} 个")
+
+    timeline = drift_timeline(times, ratios, z_scores, severity, baseline_means) if times is not None else []
+    if timeline:
+        print("\n" + "=" * 100)
+        print("漂移时间线")
+        print("=" * 100)
+        print(f"{'日期':<12}{'次数':<8}{'比值均值':<12}{'基线均值':<12}{'平均Z':<10}{'最大|Z|':<10}{'轻度':<8}{'重度':<8}{'异常率(%)':<10}")
+        print("-" * 100)
+        for day in timeline:
+            base = '-' if day['baseline_mean'] is None else f"{day['baseline_mean']:.2f}"
+            mean_z = '-' if day['mean_z'] is None else f"{day['mean_z']:.2f}"
+            max_z = '-' if day['max_abs_z'] is None else f"{day['max_abs_z']:.2f}"
+            print(f"{day['date']:<12}{day['count']:<8}{day['ratio_mean']:<12.2f}{base:<12}{mean_z:<10}{max_z:<10}"
+                  f"{day['mild_anomaly_count']:<8}{day['severe_anomaly_count']:<8}{day['anomaly_rate']:<10.2f}")
+
+    anomalies = []
+    for i, z, code, ratio, base in zip(anomaly_indices.tolist(), z_scores[anomaly_indices].tolist(),
+                                       severity[anomaly_indices].tolist(), ratios[anomaly_indices].tolist(),
+                                       baseline_means[anomaly_indices].tolist()):
+        anomalies.append({
+            'index': int(data.row_ids[i]) + 1,
+            'time': str(times[i]) if times is not None else '-',
+            'ratio': ratio,
+            'baseline_mean': base,
+            'z_score': z,
+            'anomaly': SEVERITY_LABELS[code]
+        })
+
+    return {
+        'total_records': len(ratios),
+        'anomalies': anomalies,
+        'timeline': timeline,
+        'summary': {
+            'total_records': len(ratios),
+            'scored_count': scored_count,
+            'mild_anomaly_count': int(counts[SEVERITY_MILD]),
+            'severe_anomaly_count': int(counts[SEVERITY_SEVERE]),
+            'anomaly_rate': (len(anomalies) / len(ratios)) * 100
+        }
+    }
+
+
+def compute_weight_and_time_flags(columns, weight_threshold=WEIGHT_ANOMALY_THRESHOLD,
+                                  max_delay_minutes=TIME_ANOMALY_MAX_MINUTES):
+    """整列检测重量异常和时间异常，不生成逐行字典
+
+    Args:
+        columns (WeighingColumns): 列式称重数据，必须包含重量列
+        weight_threshold (float): 重量异常阈值（kg），大于该值为重量异常
+        max_delay_minutes (float): 创建时间比订单时间晚超过该分钟数为时间异常，早于订单时间同样为时间异常
+
+    Returns:
+        tuple: (异常代码数组, 创建时间与订单时间之差（分钟）数组, 异常数据下标数组)。
+            异常代码为ANOMALY_OVERWEIGHT、ANOMALY_LATE_CREATE、ANOMALY_EARLY_CREATE的按位组合；
+            重量无法解析的行不参与任何检测，时间差无法计算的行为NaN
+    """
+    weights = columns.values['weight']
+    weight_valid = columns.masks['weight']
+    flags = np.where(weight_valid & (weights > weight_threshold), ANOMALY_OVERWEIGHT, ANOMALY_NONE).astype(np.int8)
+
+    time_diffs = np.full(len(columns), np.nan)
+    if columns.has('order_time') and columns.has('create_time'):
+        time_valid = weight_valid & columns.valid('order_time', 'create_time')
+        time_diffs[time_valid] = (columns.values['create_time'][time_valid]
+                                  - columns.values['order_time'][time_valid]).astype(np.float64) / 60
+        with np.errstate(invalid='ignore'):
+            flags[time_diffs > max_delay_minutes] |= ANOMALY_LATE_CREATE
+            flags[time_diffs < 0] |= ANOMALY_EARLY_CREATE
+    return flags, time_diffs, np.flatnonzero(flags)
+
+
+def find_weight_and_time_anomalies(columns):
+    """在列式数据中查找重量异常（>20kg）和时间异常（创建时间比订单时间晚超过1天或早于订单时间）
+
+    由compute_weight_and_time_flags整列检测，只为异常行取出商品名称和时间的原始文本。
+
+    Args:
+        columns (WeighingColumns): 列式称重数据，必须包含重量列
+
+    Returns:
+        tuple: (重量异常列表, 时间异常列表)，序号为原始文件中的行号
+    """
+    flags, time_diffs, anomaly_indices = compute_weight_and_time_flags(columns)
+    flags = flags[anomaly_indices]
+    weights = columns.values['weight'][anomaly_indices].tolist()
+    row_numbers = (columns.row_ids[anomaly_indices] + 1).tolist()
+    time_diffs = time_diffs[anomaly_indices].tolist()
+    missing = ['-'] * len(anomaly_indices)
+    products = columns.strings('product', anomaly_indices) if columns.column('product') else missing
+    order_times = columns.strings('order_time', anomaly_indices) if columns.column('order_time') else missing
+    create_times = columns.strings('create_time', anomaly_indices) if columns.column('create_time') else missing
+
+    weight_anomalies = []
+    for j in np.flatnonzero(flags & ANOMALY_OVERWEIGHT).tolist():
+        weight_anomalies.append({
+            'index': row_numbers[j],
+            'weight': weights[j],
+            'product_name': products[j],
+            'order_time': order_times[j],
+            'create_time': create_times[j],
+            'anomaly_type': '重量异常',
+            'anomaly_description': f'重量 {weights[j]:.2f}kg 超过{WEIGHT_ANOMALY_THRESHOLD:g}kg阈值'
+        })
+
+    time_anomalies = []
+    for j in np.flatnonzero(flags & ANOMALY_TIME).tolist():
+        time_diff_minutes = time_diffs[j]
+        if flags[j] & ANOMALY_LATE_CREATE:
+            anomaly_description = f"创建时间比订单时间晚 {time_diff_minutes:.1f} 分钟（超过1天阈值）"
+        else:
+            anomaly_description = f"创建时间比订单时间早 {abs(time_diff_minutes):.1f} 分钟"
+        time_anomalies.append({
+            'index': row_numbers[j],
+            'weight': weights[j],
+            'product_name': products[j],
+            'order_time': order_times[j],
+            'create_time': create_times[j],
+            'time_diff_minutes': time_diff_minutes,
+            'anomaly_type': '时间异常',
+            'anomaly_description': anomaly_description
+        })
+
+    return weight_anomalies, time_anomalies
+
+
 """
 检测称重数据中的异常情况
 """
-def detect_weight_and_time_anomalies():
+def detect_weight_and_time_anomalies(dataset=None):
     """检测称重数据中的异常情况：
     1. 称重重量大于20kg的数据
-    2. 订单时间与创建时间差距过大（超过10分钟）或订单时间晚于创建时间
+    2. 订单时间与创建时间差距过大（超过1天）或订单时间晚于创建时间
+    
+    Args:
+        dataset (WeighingDataset, optional): 称重数据会话，默认读取示例数据文件
     
     Returns:
         dict: 包含异常分析结果的字典
     """
-    # 获取当前目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # 定义文件路径
-    data_file = os.path.join(current_dir, '设备L30DG0071_称重数据_20000条.csv')
-    
-    # 检查文件是否存在
-    if not os.path.exists(data_file):
-        print(f"错误: 找不到数据文件 '{data_file}'")
-        return None
-    
-    # 创建CSV处理器
-    processor = CSVProcessor()
+    if dataset is None:
+        # 检查文件是否存在
+        if not os.path.exists(DEFAULT_DATA_FILE):
+            print(f"错误: 找不到数据文件 '{DEFAULT_DATA_FILE}'")
+            return None
+        dataset = WeighingDataset(DEFAULT_DATA_FILE)
     
     try:
-        # 读取数据
-        data = processor.read_csv(data_file)
-        print(f"成功读取 {len(data)} 条记录")
+        columns = dataset.columns
     except FileNotFoundError as e:
         print(e)
         return None
     
     # 检查数据是否包含必要的列
-    if not data:
+    if len(columns) == 0:
         print("错误: 数据文件为空")
         return None
     
-    # 查找必要的列
-    weight_column = None
-    order_time_column = None
-    create_time_column = None
-    product_column = None
-    
-    # 查找重量列
-    for col in data[0].keys():
-        if '重量' in col:
-            weight_column = col
-            break
-    
-    # 查找订单时间列
-    for col in data[0].keys():
-        if '订单时间' in col or '称重时间' in col:
-            order_time_column = col
-            break
-    
-    # 查找创建时间列
-    for col in data[0].keys():
-        if '创建时间' in col:
-            create_time_column = col
-            break
-    
-    # 查找商品名称列
-    for col in data[0].keys():
-        if ('商品' in col) or ('品名' in col) or ('产品' in col) or ('菜品' in col):
-            product_column = col
-            break
+    # 各列已在读取时根据表头识别
+    weight_column = columns.column('weight')
+    order_time_column = columns.column('order_time')
+    create_time_column = columns.column('create_time')
+    product_column = columns.column('product')
     
     if not weight_column:
         print(f"错误: 缺少重量列")
-        print(f"可用列: {list(data[0].keys())}")
+        print(f"可用列: {columns.fieldnames}")
         return None
     
     print(f"使用重量列: {weight_column}")
@@ -659,11 +1641,11 @@ def detect_weight_and_time_anomalies():
     
     # 异常检测结果
     anomaly_result = {
-        'total_records': len(data),
+        'total_records': len(columns),
         'weight_anomalies': [],  # 重量异常
         'time_anomalies': [],    # 时间异常
         'summary': {
-            'total_records': len(data),
+            'total_records': len(columns),
             'weight_anomaly_count': 0,
             'time_anomaly_count': 0,
             'weight_anomaly_rate': 0.0,
@@ -671,94 +1653,11 @@ def detect_weight_and_time_anomalies():
         }
     }
     
-    # 数据预处理和异常检测
-    import datetime
-    
-    for i, row in enumerate(data):
-        try:
-            # 检测重量异常（>20kg）
-            weight = float(row[weight_column])
-            if weight > 20.0:
-                weight_anomaly = {
-                    'index': i + 1,
-                    'weight': weight,
-                    'product_name': row.get(product_column, '-') if product_column else '-',
-                    'order_time': row.get(order_time_column, '-') if order_time_column else '-',
-                    'create_time': row.get(create_time_column, '-') if create_time_column else '-',
-                    'anomaly_type': '重量异常',
-                    'anomaly_description': f'重量 {weight:.2f}kg 超过20kg阈值'
-                }
-                anomaly_result['weight_anomalies'].append(weight_anomaly)
-                anomaly_result['summary']['weight_anomaly_count'] += 1
-            
-            # 检测时间异常（如果有订单时间和创建时间列）
-            if order_time_column and create_time_column:
-                order_time_str = row.get(order_time_column, '')
-                create_time_str = row.get(create_time_column, '')
-                
-                if order_time_str and create_time_str:
-                    # 尝试解析时间
-                    order_time = None
-                    create_time = None
-                    
-                    # 常见时间格式
-                    time_formats = [
-                        '%Y-%m-%dT%H:%M:%S',  # ISO 8601格式
-                        '%Y-%m-%d %H:%M:%S',
-                        '%Y/%m/%d %H:%M:%S',
-                        '%Y-%m-%d %H:%M',
-                        '%Y/%m/%d %H:%M',
-                        '%Y-%m-%d',
-                        '%Y/%m/%d'
-                    ]
-                    
-                    # 解析订单时间
-                    for fmt in time_formats:
-                        try:
-                            order_time = datetime.datetime.strptime(order_time_str, fmt)
-                            break
-                        except ValueError:
-                            continue
-                    
-                    # 解析创建时间
-                    for fmt in time_formats:
-                        try:
-                            create_time = datetime.datetime.strptime(create_time_str, fmt)
-                            break
-                        except ValueError:
-                            continue
-                    
-                    if order_time and create_time:
-                        # 计算时间差（分钟）
-                        time_diff_minutes = (create_time - order_time).total_seconds() / 60
-                        
-                        # 检测时间异常
-                        is_time_anomaly = False
-                        anomaly_description = ""
-                        
-                        if time_diff_minutes > 1440:
-                            is_time_anomaly = True
-                            anomaly_description = f"创建时间比订单时间晚 {time_diff_minutes:.1f} 分钟（超过1天阈值）"
-                        elif time_diff_minutes < 0:
-                            is_time_anomaly = True
-                            anomaly_description = f"创建时间比订单时间早 {abs(time_diff_minutes):.1f} 分钟"
-                        
-                        if is_time_anomaly:
-                            time_anomaly = {
-                                'index': i + 1,
-                                'weight': weight,
-                                'product_name': row.get(product_column, '-') if product_column else '-',
-                                'order_time': order_time_str,
-                                'create_time': create_time_str,
-                                'time_diff_minutes': time_diff_minutes,
-                                'anomaly_type': '时间异常',
-                                'anomaly_description': anomaly_description
-                            }
-                            anomaly_result['time_anomalies'].append(time_anomaly)
-                            anomaly_result['summary']['time_anomaly_count'] += 1
-        
-        except (ValueError, KeyError) as e:
-            continue
+    weight_anomalies, time_anomalies = find_weight_and_time_anomalies(columns)
+    anomaly_result['weight_anomalies'] = weight_anomalies
+    anomaly_result['time_anomalies'] = time_anomalies
+    anomaly_result['summary']['weight_anomaly_count'] = len(weight_anomalies)
+    anomaly_result['summary']['time_anomaly_count'] = len(time_anomalies)
     
     # 计算异常率
     total_records = anomaly_result['summary']['total_records']
@@ -802,62 +1701,40 @@ def detect_weight_and_time_anomalies():
 """
 按时间分组统计称重数据
 """
-def time_based_weight_statistics():
-    """按每日、每周、每月时间计算称重的次数，重量的均值、标准差"""
-    # 获取当前目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # 定义文件路径
-    # 设备L30DG0091_称重数据_2025-05-31_2025-08-28.csv 
-    data_file = os.path.join(current_dir, '设备L30DG0071_称重数据_20000条.csv')
-    
-    # 检查文件是否存在
-    if not os.path.exists(data_file):
-        print(f"错误: 找不到数据文件 '{data_file}'")
-        return
-    
-    # 创建CSV处理器
-    processor = CSVProcessor()
+def time_based_weight_statistics(dataset=None, top_k=TOP_PRODUCTS):
+    """按每日、每周、每月时间计算称重的次数，重量的均值、标准差
+
+    Args:
+        dataset (WeighingDataset, optional): 称重数据会话，默认读取示例数据文件
+        top_k (int): 每个分组输出次数最多的商品个数，结果保存在top3_products字段中
+    """
+    if dataset is None:
+        # 检查文件是否存在
+        if not os.path.exists(DEFAULT_DATA_FILE):
+            print(f"错误: 找不到数据文件 '{DEFAULT_DATA_FILE}'")
+            return
+        dataset = WeighingDataset(DEFAULT_DATA_FILE)
     
     try:
-        # 读取数据
-        data = processor.read_csv(data_file)
-        print(f"成功读取 {len(data)} 条记录")
+        # 列数组在会话中只加载一次（优先使用缓存）
+        columns = dataset.columns
     except FileNotFoundError as e:
         print(e)
         return
     
     # 检查数据是否包含必要的列
-    if not data:
+    if len(columns) == 0:
         print("错误: 数据文件为空")
         return
     
-    # 检查必要的列是否存在（支持多种可能的列名）
-    time_column = None
-    weight_column = None
-    product_column = None
-    
-    # 查找时间列（支持多种可能的名称）
-    for col in data[0].keys():
-        if '时间' in col or '订单时间' in col or '创建时间' in col:
-            time_column = col
-            break
-    
-    # 查找重量列
-    for col in data[0].keys():
-        if '重量' in col:
-            weight_column = col
-            break
-    
-    # 查找商品名称列（尽量匹配更明确的列名）
-    for col in data[0].keys():
-        if ('商品' in col) or ('品名' in col) or ('产品' in col) or ('菜品' in col):
-            product_column = col
-            break
+    # 时间列、重量列和商品名称列已在读取时根据表头识别
+    time_column = columns.column('time')
+    weight_column = columns.column('weight')
+    product_column = columns.column('product')
     
     if not time_column or not weight_column:
         print(f"错误: 缺少必要的列")
-        print(f"可用列: {list(data[0].keys())}")
+        print(f"可用列: {columns.fieldnames}")
         print(f"需要找到时间列和重量列")
         return
     
@@ -866,272 +1743,110 @@ def time_based_weight_statistics():
     if product_column:
         print(f"使用商品列: {product_column}")
     
-    # 数据预处理：解析时间并过滤有效数据
-    processed_data = []
-    for row in data:
-        try:
-            # 解析称重时间
-            time_str = row[time_column]
-            weight = float(row[weight_column])
-            
-            # 尝试多种时间格式
-            import datetime
-            parsed_time = None
-            
-            # 尝试常见的时间格式
-            time_formats = [
-                '%Y-%m-%dT%H:%M:%S',  # ISO 8601格式: 2025-08-21T07:31:40
-                '%Y-%m-%d %H:%M:%S',
-                '%Y/%m/%d %H:%M:%S',
-                '%Y-%m-%d %H:%M',
-                '%Y/%m/%d %H:%M',
-                '%Y-%m-%d',
-                '%Y/%m/%d'
-            ]
-            
-            for fmt in time_formats:
-                try:
-                    parsed_time = datetime.datetime.strptime(time_str, fmt)
-                    break
-                except ValueError:
-                    continue
-            
-            if parsed_time is None:
-                print(f"警告: 无法解析时间格式: {time_str}")
-                continue
-            
-            # 添加解析后的时间信息
-            row['parsed_time'] = parsed_time
-            row['date'] = parsed_time.date()
-            iso_year, iso_week, _ = parsed_time.isocalendar()
-            row['iso_year'] = iso_year
-            row['week'] = iso_week  # ISO周数
-            row['month'] = parsed_time.month
-            row['year'] = parsed_time.year
-            row['weight'] = weight
-            if product_column:
-                row['product_name'] = (row.get(product_column) or '').strip()
-            
-            processed_data.append(row)
-            
-        except (ValueError, KeyError) as e:
-            continue
+    # 数据预处理：只保留时间和重量都有效的记录
+    unparsed_count = int((columns.masks['weight'] & ~columns.masks['time']).sum())
+    if unparsed_count:
+        print(f"警告: {unparsed_count} 条记录无法解析时间格式，已跳过")
     
-    if not processed_data:
+    valid = columns.valid('time', 'weight')
+    if not valid.any():
         print("错误: 没有有效的数据可处理")
         return
     
-    print(f"成功处理 {len(processed_data)} 条有效记录")
-    
-    # 按时间分组统计
-    daily_stats = defaultdict(list)
-    weekly_stats = defaultdict(list)
-    monthly_stats = defaultdict(list)
-    
-    # 商品名称收集（仅记录重量>0且有商品名的记录）
-    from collections import Counter
-    daily_product_names = defaultdict(list)
-    weekly_product_names = defaultdict(list)
-    monthly_product_names = defaultdict(list)
-    
-    for row in processed_data:
-        # 按日期分组
-        date_key = row['date']
-        daily_stats[date_key].append(row['weight'])
-        if product_column and row.get('product_name') and row['weight'] > 0:
-            daily_product_names[date_key].append(row['product_name'])
-        
-        # 按周分组
-        week_key = f"{row['iso_year']}-W{row['week']:02d}"
-        weekly_stats[week_key].append(row['weight'])
-        if product_column and row.get('product_name') and row['weight'] > 0:
-            weekly_product_names[week_key].append(row['product_name'])
-        
-        # 按月分组
-        month_key = f"{row['year']}-{row['month']:02d}"
-        monthly_stats[month_key].append(row['weight'])
-        if product_column and row.get('product_name') and row['weight'] > 0:
-            monthly_product_names[month_key].append(row['product_name'])
+    print(f"成功处理 {int(valid.sum())} 条有效记录")
     
-    # 计算统计信息
-    def calculate_statistics(weight_list):
-        """计算重量列表的统计信息"""
-        if not weight_list:
-            return None
-        
-        weights = [w for w in weight_list if w > 0]  # 过滤掉零重量或负重量
-        if not weights:
-            return None
-        
-        return {
-            'count': len(weights),
-            'mean': statistics.mean(weights),
-            'std_dev': statistics.stdev(weights) if len(weights) > 1 else 0.0,
-            'min': min(weights),
-            'max': max(weights)
-        }
+    times = columns.values['time'][valid]
+    weights = columns.values['weight'][valid]
     
-    # 计算每日统计
-    print("\n" + "="*80)
-    print("每日称重统计")
-    print("="*80)
-    header_daily = f"{'日期':<12}{'称重次数':<10}{'重量均值(kg)':<15}{'重量标准差':<15}{'最小重量':<12}{'最大重量':<12}"
+    # 只按日期计算一次部分统计量（计数、均值、M2、最小值、最大值）和商品计数，
+    # ROLLUP_LEVELS中的各级别（周、月、每周周内/周末）以及周内/周末总体的结果都由每日部分统计量合并得到。
+    # 与原来一致，只统计重量大于0的记录，没有这类记录的分组不出现在结果中
+    days = times.astype('datetime64[D]')
+    positive = weights > 0
+    daily_stats = group_running_stats(days[positive], weights[positive])
+
+    # 每日商品次数用固定容量的SpaceSaving统计（仅记录重量>0且有商品名的记录），
+    # 各汇总级别同样由每日结果合并，不为每次称重保存商品名
+    # 商品按字典代码计数，只在输出前K个商品时解码为名称
+    daily_product_counts = {}
+    product_names = []
     if product_column:
-        header_daily += f"{'Top3商品(次数)':<40}"
-    print(header_daily)
-    print("-"*80)
-    
-    daily_results = {}
-    for date in sorted(daily_stats.keys()):
-        stats = calculate_statistics(daily_stats[date])
-        if stats:
-            # 将日期转换为字符串格式作为键
-            date_key = date.strftime('%Y-%m-%d')
-            # 计算Top3商品
-            top3_str = ''
-            counts = {}
-            top3 = []
+        product_codes, product_names = columns.category_codes('product')
+        product_codes = product_codes[valid]
+        has_product = (product_codes >= 0) & positive
+        daily_product_counts = group_space_saving(days[has_product], product_codes[has_product],
+                                                  product_sketch_capacity(top_k))
+
+    level_stats = {'daily': daily_stats}
+    level_products = {'daily': daily_product_counts}
+    for level, key_func in ROLLUP_LEVELS.items():
+        level_stats[level] = roll_up(daily_stats, key_func)
+        level_products[level] = roll_up(daily_product_counts, key_func)
+    day_type_stats = roll_up(daily_stats, day_type)
+    day_type_products = roll_up(daily_product_counts, day_type)
+
+    def top_products(counts):
+        return [(product_names[code], count) for code, count in counts.top(top_k)]
+
+    # 各级别的结果格式相同：统计量加上前K个商品
+    results = {}
+    for level, stats_by_key in level_stats.items():
+        level_results = {}
+        for key in sorted(stats_by_key):
+            stats = stats_by_key[key].summary()
+            if not stats:
+                continue
             if product_column:
-                names = daily_product_names.get(date, [])
-                if names:
-                    counts = Counter(names)
-                    top3 = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:3]
-                    top3_str = ", ".join([f"{name}({cnt})" for name, cnt in top3])
-            # 保存与输出
-            daily_results[date_key] = {**stats, **({ 'top3_products': top3 } if product_column else {})}
-            line = f"{date_key:<12}{stats['count']:<10}{stats['mean']:<15.2f}{stats['std_dev']:<15.2f}{stats['min']:<12.2f}{stats['max']:<12.2f}"
+                counts = level_products[level].get(key)
+                stats['top3_products'] = top_products(counts) if counts else []
+            level_results[key.strftime('%Y-%m-%d') if level == 'daily' else key] = stats
+        results[level] = level_results
+
+    def print_results(level_results, label, key_label=None):
+        header = f"{label:<12}"
+        if key_label:
+            header += f"{'类型':<8}"
+        header += f"{'称重次数':<10}{'重量均值(kg)':<15}{'重量标准差':<15}{'最小重量':<12}{'最大重量':<12}"
+        if product_column:
+            header += f"{f'Top{top_k}商品(次数)':<40}"
+        print(header)
+        print("-"*80)
+        for key, stats in level_results.items():
+            line = f"{key:<12}"
+            if key_label:
+                key, kind = key.rsplit('_', 1)
+                line = f"{key:<12}{key_label[kind]:<8}"
+            line += (f"{stats['count']:<10}{stats['mean']:<15.2f}{stats['std_dev']:<15.2f}"
+                     f"{stats['min']:<12.2f}{stats['max']:<12.2f}")
             if product_column:
+                top3_str = ", ".join([f"{name}({cnt})" for name, cnt in stats['top3_products']])
                 line += f"{top3_str:<40}"
             print(line)
-    
-    # 计算每周统计
+
+    # 输出每日、每周、每周周内和周末对比统计
+    print("\n" + "="*80)
+    print("每日称重统计")
+    print("="*80)
+    print_results(results['daily'], '日期')
+
     print("\n" + "="*80)
     print("每周称重统计")
     print("="*80)
-    header_weekly = f"{'周次':<12}{'称重次数':<10}{'重量均值(kg)':<15}{'重量标准差':<15}{'最小重量':<12}{'最大重量':<12}"
-    if product_column:
-        header_weekly += f"{'Top3商品(次数)':<40}"
-    print(header_weekly)
-    print("-"*80)
-    
-    weekly_results = {}
-    for week in sorted(weekly_stats.keys()):
-        stats = calculate_statistics(weekly_stats[week])
-        if stats:
-            # 计算Top3商品
-            top3_str = ''
-            counts = {}
-            top3 = []
-            if product_column:
-                names = weekly_product_names.get(week, [])
-                if names:
-                    counts = Counter(names)
-                    top3 = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:3]
-                    top3_str = ", ".join([f"{name}({cnt})" for name, cnt in top3])
-            weekly_results[week] = {**stats, **({ 'top3_products': top3 } if product_column else {})}
-            line = f"{week:<12}{stats['count']:<10}{stats['mean']:<15.2f}{stats['std_dev']:<15.2f}{stats['min']:<12.2f}{stats['max']:<12.2f}"
-            if product_column:
-                line += f"{top3_str:<40}"
-            print(line)
-    
-    # 计算每周周内和周末对比统计
+    print_results(results['weekly'], '周次')
+
     print("\n" + "="*80)
     print("每周周内(工作日)和周末称重对比统计")
     print("="*80)
-    
-    # 按周分组周内和周末数据
-    weekly_weekday_stats = defaultdict(list)
-    weekly_weekend_stats = defaultdict(list)
-    weekly_weekday_products = defaultdict(list)
-    weekly_weekend_products = defaultdict(list)
-    
-    for row in processed_data:
-        week_key = f"{row['iso_year']}-W{row['week']:02d}"
-        # 判断是否为周末 (5=周六, 6=周日)
-        is_weekend = row['parsed_time'].weekday() >= 5
-        
-        if is_weekend:
-            weekly_weekend_stats[week_key].append(row['weight'])
-            if product_column and row.get('product_name') and row['weight'] > 0:
-                weekly_weekend_products[week_key].append(row['product_name'])
-        else:
-            weekly_weekday_stats[week_key].append(row['weight'])
-            if product_column and row.get('product_name') and row['weight'] > 0:
-                weekly_weekday_products[week_key].append(row['product_name'])
-    
-    # 输出周内和周末对比统计
-    header_weekday_weekend = f"{'周次':<12}{'类型':<8}{'称重次数':<10}{'重量均值(kg)':<15}{'重量标准差':<15}{'最小重量':<12}{'最大重量':<12}"
-    if product_column:
-        header_weekday_weekend += f"{'Top3商品(次数)':<40}"
-    print(header_weekday_weekend)
-    print("-"*80)
-    
-    weekly_weekday_weekend_results = {}
-    for week in sorted(set(list(weekly_weekday_stats.keys()) + list(weekly_weekend_stats.keys()))):
-        # 周内统计
-        if week in weekly_weekday_stats:
-            weekday_stats = calculate_statistics(weekly_weekday_stats[week])
-            if weekday_stats:
-                # 计算Top3商品
-                top3_str = ''
-                top3 = []
-                if product_column:
-                    names = weekly_weekday_products.get(week, [])
-                    if names:
-                        counts = Counter(names)
-                        top3 = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:3]
-                        top3_str = ", ".join([f"{name}({cnt})" for name, cnt in top3])
-                
-                weekly_weekday_weekend_results[f"{week}_weekday"] = {**weekday_stats, **({ 'top3_products': top3 } if product_column else {})}
-                line = f"{week:<12}{'周内':<8}{weekday_stats['count']:<10}{weekday_stats['mean']:<15.2f}{weekday_stats['std_dev']:<15.2f}{weekday_stats['min']:<12.2f}{weekday_stats['max']:<12.2f}"
-                if product_column:
-                    line += f"{top3_str:<40}"
-                print(line)
-        
-        # 周末统计
-        if week in weekly_weekend_stats:
-            weekend_stats = calculate_statistics(weekly_weekend_stats[week])
-            if weekend_stats:
-                # 计算Top3商品
-                top3_str = ''
-                top3 = []
-                if product_column:
-                    names = weekly_weekend_products.get(week, [])
-                    if names:
-                        counts = Counter(names)
-                        top3 = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:3]
-                        top3_str = ", ".join([f"{name}({cnt})" for name, cnt in top3])
-                
-                weekly_weekday_weekend_results[f"{week}_weekend"] = {**weekend_stats, **({ 'top3_products': top3 } if product_column else {})}
-                line = f"{week:<12}{'周末':<8}{weekend_stats['count']:<10}{weekend_stats['mean']:<15.2f}{weekend_stats['std_dev']:<15.2f}{weekend_stats['min']:<12.2f}{weekend_stats['max']:<12.2f}"
-                if product_column:
-                    line += f"{top3_str:<40}"
-                print(line)
-    
+    print_results(results['weekly_weekday_weekend'], '周次', {'weekday': '周内', 'weekend': '周末'})
+
     # 计算周内和周末的总体对比统计
     print("\n" + "-"*80)
     print("周内(工作日) vs 周末 总体对比统计")
     print("-"*80)
     
-    # 合并所有周内数据
-    all_weekday_weights = []
-    all_weekday_products = []
-    for weights in weekly_weekday_stats.values():
-        all_weekday_weights.extend(weights)
-    for products in weekly_weekday_products.values():
-        all_weekday_products.extend(products)
-    
-    # 合并所有周末数据
-    all_weekend_weights = []
-    all_weekend_products = []
-    for weights in weekly_weekend_stats.values():
-        all_weekend_weights.extend(weights)
-    for products in weekly_weekend_products.values():
-        all_weekend_products.extend(products)
-    
-    # 计算总体统计
-    weekday_total_stats = calculate_statistics(all_weekday_weights)
-    weekend_total_stats = calculate_statistics(all_weekend_weights)
+    # 周内和周末的总体统计同样由每日部分统计量合并得到
+    weekday_total_stats = day_type_stats.get('weekday', RunningStats()).summary()
+    weekend_total_stats = day_type_stats.get('weekend', RunningStats()).summary()
     
     if weekday_total_stats and weekend_total_stats:
         print(f"{'类型':<8}{'称重次数':<10}{'重量均值(kg)':<15}{'重量标准差':<15}{'最小重量':<12}{'最大重量':<12}")
@@ -1155,47 +1870,21 @@ def time_based_weight_statistics():
         
         # Top3商品对比
         if product_column:
-            print(f"\nTop3商品对比:")
-            if all_weekday_products:
-                weekday_counts = Counter(all_weekday_products)
-                weekday_top3 = sorted(weekday_counts.items(), key=lambda x: (-x[1], x[0]))[:3]
-                print(f"周内Top3: {', '.join([f'{name}({cnt})' for name, cnt in weekday_top3])}")
+            print(f"\nTop{top_k}商品对比:")
+            if day_type_products.get('weekday'):
+                weekday_top3 = top_products(day_type_products['weekday'])
+                print(f"周内Top{top_k}: {', '.join([f'{name}({cnt})' for name, cnt in weekday_top3])}")
             
-            if all_weekend_products:
-                weekend_counts = Counter(all_weekend_products)
-                weekend_top3 = sorted(weekend_counts.items(), key=lambda x: (-x[1], x[0]))[:3]
-                print(f"周末Top3: {', '.join([f'{name}({cnt})' for name, cnt in weekend_top3])}")
+            if day_type_products.get('weekend'):
+                weekend_top3 = top_products(day_type_products['weekend'])
+                print(f"周末Top{top_k}: {', '.join([f'{name}({cnt})' for name, cnt in weekend_top3])}")
     
-    # 计算每月统计
+    # 输出每月统计
     print("\n" + "="*80)
     print("每月称重统计")
     print("="*80)
-    header_monthly = f"{'月份':<12}{'称重次数':<10}{'重量均值(kg)':<15}{'重量标准差':<15}{'最小重量':<12}{'最大重量':<12}"
-    if product_column:
-        header_monthly += f"{'Top3商品(次数)':<40}"
-    print(header_monthly)
-    print("-"*80)
-    
-    monthly_results = {}
-    for month in sorted(monthly_stats.keys()):
-        stats = calculate_statistics(monthly_stats[month])
-        if stats:
-            # 计算Top3商品
-            top3_str = ''
-            counts = {}
-            top3 = []
-            if product_column:
-                names = monthly_product_names.get(month, [])
-                if names:
-                    counts = Counter(names)
-                    top3 = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:3]
-                    top3_str = ", ".join([f"{name}({cnt})" for name, cnt in top3])
-            monthly_results[month] = {**stats, **({ 'top3_products': top3 } if product_column else {})}
-            line = f"{month:<12}{stats['count']:<10}{stats['mean']:<15.2f}{stats['std_dev']:<15.2f}{stats['min']:<12.2f}{stats['max']:<12.2f}"
-            if product_column:
-                line += f"{top3_str:<40}"
-            print(line)
-    
+    print_results(results['monthly'], '月份')
+
     # # 生成可视化图表
     # try:
     #     # 创建图表
@@ -1307,12 +1996,71 @@ def time_based_weight_statistics():
         
     # except Exception as e:
     #     print(f"保存CSV文件时出错: {e}")
-    return {
-        'daily': daily_results,
-        'weekly': weekly_results,
-        'weekly_weekday_weekend': weekly_weekday_weekend_results,
-        'monthly': monthly_results
-    }
+    return results
+
+
+def bucketed_weight_statistics(dataset=None, freq='1h', top_k=TOP_PRODUCTS):
+    """按任意时间粒度计算称重的次数，重量的均值、标准差、最小值和最大值
+
+    时间整列取整并编码为整数分组编号（time_buckets.bucket_ids），再由group_by.aggregate单次分组计算，
+    不为每行生成字符串键。与time_based_weight_statistics一致，只统计时间和重量有效且重量大于0的记录。
+
+    Args:
+        dataset (WeighingDataset, optional): 称重数据会话，默认读取示例数据文件
+        freq (str): 时间粒度，例如'15min'、'1h'、'D'、'W'、'M'、'shift:06:00,14:00,22:00'、'fiscal_month:26'，
+            见time_buckets.parse_frequency
+        top_k (int): 每个分组输出次数最多的商品个数，结果保存在top3_products字段中
+
+    Returns:
+        dict: 分组标签到统计结果（count, mean, std_dev, min, max[, top3_products]）的映射，按时间先后排列；
+            缺少时间列或重量列时返回None
+
+    Raises:
+        ValueError: 无法识别的时间粒度
+    """
+    if dataset is None:
+        if not os.path.exists(DEFAULT_DATA_FILE):
+            print(f"错误: 找不到数据文件 '{DEFAULT_DATA_FILE}'")
+            return None
+        dataset = WeighingDataset(DEFAULT_DATA_FILE)
+
+    try:
+        columns = dataset.columns
+    except FileNotFoundError as e:
+        print(e)
+        return None
+
+    if not columns.has('time') or not columns.has('weight'):
+        print(f"错误: 缺少必要的列，可用列: {columns.fieldnames}")
+        return None
+
+    valid = columns.valid('time', 'weight')
+    valid[valid] = columns.values['weight'][valid] > 0
+    ids, _, labels = bucket_ids(columns.values['time'][valid], freq)
+    table = aggregate(ids, {'weight': columns.values['weight'][valid]}, {
+        'count': ('weight', 'count'),
+        'mean': ('weight', 'mean'),
+        'std_dev': ('weight', 'std'),
+        'min': ('weight', 'min'),
+        'max': ('weight', 'max')
+    })
+
+    product_counts = {}
+    product_names = []
+    if columns.has('product'):
+        product_codes, product_names = columns.category_codes('product')
+        product_codes = product_codes[valid]
+        has_product = product_codes >= 0
+        product_counts = group_space_saving(ids[has_product], product_codes[has_product],
+                                            product_sketch_capacity(top_k))
+
+    results = {}
+    for bucket, stats in table.rows():
+        if columns.has('product'):
+            counts = product_counts.get(bucket)
+            stats['top3_products'] = [(product_names[code], count) for code, count in counts.top(top_k)] if counts else []
+        results[str(labels[bucket])] = stats
+    return results
 
 
 if __name__ == '__main__':
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多台秤（设备）批量分析
+对一个目录或通配符匹配到的每个设备CSV文件，并行执行比值Z-score分析、重量/时间异常检测和按时间分组统计，
+并把各设备的比值分布与全部设备比较，给出设备间的校准偏差排名
+"""
+
+import argparse
+import contextlib
+import glob
+import os
+import re
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import csv_processor
+from group_by import GroupTable
+from online_stats import RunningStats
+from quantile_sketch import KLLSketch
+
+# 目录中识别为设备数据文件的文件名，包括gzip和zstd压缩的CSV
+DEVICE_FILE_PATTERNS = ('*.csv', '*.csv.gz', '*.csv.zst')
+
+# 校准排名表的列，可作为sort_by的参数
+RANKING_COLUMNS = ('count', 'mean', 'median', 'std_dev', 'peer_z', 'peer_severity', 'peer_outlier',
+                   'deviation', 'fleet_z', 'fleet_outlier_rate')
+
+# 比值分位数草图的随机数种子：相同的数据总是得到相同的草图和超出IQR比例
+SKETCH_SEED = 0
+
+
+def find_device_files(source):
+    """查找设备数据文件
+
+    Args:
+        source (str | list): 目录、通配符（如 data/设备*_称重数据_*.csv）或文件路径列表
+
+    Returns:
+        list: 排序后的CSV文件路径列表，目录中的.csv.gz和.csv.zst压缩文件也包括在内
+    """
+    if isinstance(source, (list, tuple)):
+        return sorted(source)
+    if os.path.isdir(source):
+        files = []
+        for pattern in DEVICE_FILE_PATTERNS:
+            files.extend(glob.glob(os.path.join(source, pattern)))
+        return sorted(files)
+    return sorted(glob.glob(source))
+
+
+def device_id_from_path(file_path):
+    """从文件名中提取设备编号，例如 设备L30DG0071_称重数据_20000条.csv -> L30DG0071"""
+    name = os.path.basename(file_path)
+    match = re.match(r'设备(.+?)_称重数据', name)
+    return match.group(1) if match else os.path.splitext(name)[0]
+
+
+def analyze_device(file_path, quiet=True):
+    """分析单台设备的数据文件（在子进程中运行）
+
+    三项分析共用一个WeighingDataset，文件只解析一次。任何异常都被捕获并记录在结果中，
+    不会影响其它设备。
+
+    Args:
+        file_path (str): 设备CSV文件路径
+        quiet (bool): 是否屏蔽各分析函数的控制台输出
+
+    Returns:
+        dict: 单台设备的分析结果，失败时error字段为错误信息
+    """
+    result = {
+        'device_id': device_id_from_path(file_path),
+        'file': file_path,
+        'error': None
+    }
+    try:
+        with contextlib.ExitStack() as stack:
+            if quiet:
+                devnull = stack.enter_context(open(os.devnull, 'w', encoding='utf-8'))
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            dataset = csv_processor.WeighingDataset(file_path)
+            result['total_records'] = len(dataset.columns)
+            # 比值统计量和分位数草图体积很小，在主进程中合并为全部设备的比值分布
+            ratios = dataset.ratios()[0]
+            result['ratio_stats'] = RunningStats().add_array(ratios).to_dict()
+            result['ratio_sketch'] = KLLSketch(seed=SKETCH_SEED).add_array(ratios).to_dict()
+            result['ratio_median'] = csv_processor.select_median(ratios) if len(ratios) else None
+            result['statistics'] = csv_processor.time_based_weight_statistics(dataset)
+            result['ratio_anomalies'] = csv_processor.single_scale_example_usage(dataset)
+            result['weight_time_anomalies'] = csv_processor.detect_weight_and_time_anomalies(dataset)
+        # 分析函数遇到空文件或缺少必要列时返回None而不抛出异常
+        if result['total_records'] == 0:
+            result['error'] = "数据文件为空"
+        elif not any(result[key] for key in ('statistics', 'ratio_anomalies', 'weight_time_anomalies')):
+            result['error'] = f"缺少必要的列，可用列: {dataset.columns.fieldnames}"
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    return result
+
+
+def summarize_device(result):
+    """提取单台设备结果中的关键数字"""
+    ratio_stats = ((result.get('ratio_anomalies') or {}).get('summary') or {}).get('z_score_stats') or {}
+    wt_summary = (result.get('weight_time_anomalies') or {}).get('summary') or {}
+    return {
+        'device_id': result['device_id'],
+        'total_records': result.get('total_records', 0),
+        'z_score_anomaly_count': ratio_stats.get('mild_anomaly_count', 0) + ratio_stats.get('severe_anomaly_count', 0),
+        'z_score_anomaly_rate': ratio_stats.get('anomaly_rate', 0.0),
+        'weight_anomaly_count': wt_summary.get('weight_anomaly_count', 0),
+        'time_anomaly_count': wt_summary.get('time_anomaly_count', 0),
+        'days': len((result.get('statistics') or {}).get('daily', {}))
+    }
+
+
+def leave_one_out_peer_scores(values):
+    """把每个值与除它以外的其它值比较：留一法的Z-score和IQR异常值范围
+
+    其它值的均值和样本标准差由全部值的总和与离差平方和减去该值的贡献得到；四分位按np.percentile的
+    线性插值在排序后去掉该值的序列上取值。整体只排序一次，不为每个值复制数组。
+
+    Args:
+        values (numpy.ndarray): 每台设备的值（例如比值中位数）
+
+    Returns:
+        tuple: (Z-score数组, IQR下限数组, IQR上限数组)；值不足3个时全部为NaN。
+            其它值完全相同（标准差为0）时，与它们相同的值Z-score为0，不同的值为±inf
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    nan = np.full(n, np.nan)
+    if n < 3:
+        return nan, nan, nan.copy()
+
+    # 其它n-1个值的均值和离差平方和（以全部值的均值为中心，减少相消误差）
+    centered = values - values.mean()
+    total_m2 = (centered ** 2).sum()
+    others_m2 = total_m2 - centered ** 2 * n / (n - 1)
+    # 其它值全部相同时相减只剩舍入误差，按0处理
+    others_m2[others_m2 <= total_m2 * 1e-12] = 0.0
+    others_std = np.sqrt(others_m2 / (n - 2))
+    deviations = centered * n / (n - 1)  # 该值与其它值均值之差
+    # 其它值完全相同时，只要偏离就是无穷大的Z-score，不能当作NaN（正常）排到最后
+    scale = np.abs(values).max()
+    constant = np.where(np.abs(deviations) > scale * 1e-12, np.copysign(np.inf, deviations), 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = np.where(others_std > 0, deviations / others_std, constant)
+
+    # 去掉第i个值后，其余值中排第k位的值为sorted[k]（k小于该值的位置）或sorted[k + 1]
+    order = np.argsort(values, kind='stable')
+    sorted_values = values[order]
+    positions = np.empty(n, dtype=np.int64)
+    positions[order] = np.arange(n)
+
+    def others_percentile(q):
+        rank = q / 100 * (n - 2)
+        low = int(np.floor(rank))
+        high = min(low + 1, n - 2)
+        at_low = sorted_values[low + (positions <= low)]
+        at_high = sorted_values[high + (positions <= high)]
+        return at_low + (at_high - at_low) * (rank - low)
+
+    q1, q3 = others_percentile(25), others_percentile(75)
+    iqr = q3 - q1
+    return z_scores, q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def rank_fleet_calibration(devices):
+    """按比值分布与其它设备的偏差对设备排名
+
+    每台设备只用子进程返回的比值中位数、RunningStats和KLLSketch（大小与记录数无关），主进程的计算量只与设备数有关：
+
+    - peer_z / peer_severity: 设备比值中位数相对其它设备（不含自身）中位数的Z-score和异常程度
+      （阈值与compute_z_scores相同）。其它设备的中位数完全相同时，偏离它们的设备为±inf（重度异常）
+    - peer_outlier: 设备比值中位数是否超出其它设备中位数的IQR范围（OUTLIER_NONE / OUTLIER_LOW / OUTLIER_HIGH）
+    - deviation: |peer_z|，默认按此降序排列，NaN排在最后
+    - fleet_z: 设备比值均值相对合并后全部比值的Z-score，即该设备每个比值Z-score的平均值
+    - fleet_outlier_rate: 设备比值中超出全部比值IQR范围的百分比（由草图估计，草图使用固定种子，结果可重复）
+
+    留一法需要至少2台其它设备作为参照，有比值的设备少于3台时不排名。
+
+    Args:
+        devices (dict): 设备编号到analyze_device结果的映射
+
+    Returns:
+        GroupTable: 每台设备一行的排名表，可用sort_by按其它列重新排序；设备不足3台时返回None
+    """
+    device_ids = [device_id for device_id, result in devices.items() if result['ratio_stats']['count']]
+    if len(device_ids) < 3:
+        print(f"警告: 有比值的设备只有{len(device_ids)}台，至少需要3台才能与其它设备比较，不进行校准排名")
+        return None
+
+    stats = [RunningStats.from_dict(devices[device_id]['ratio_stats']) for device_id in device_ids]
+    sketches = [KLLSketch.from_dict(devices[device_id]['ratio_sketch']) for device_id in device_ids]
+    fleet_stats = RunningStats()
+    fleet_sketch = KLLSketch(seed=SKETCH_SEED)
+    for device_stats, sketch in zip(stats, sketches):
+        fleet_stats.merge(device_stats)
+        fleet_sketch.merge(sketch)
+
+    columns = {
+        'count': np.array([item.count for item in stats], dtype=np.int64),
+        'mean': np.array([item.mean for item in stats]),
+        'median': np.array([devices[device_id]['ratio_median'] for device_id in device_ids]),
+        'std_dev': np.array([item.std_dev for item in stats])
+    }
+
+    # 设备之间比较：每台设备的中位数与其它设备的中位数比较，偏离的设备不会拉大自身的参照范围
+    columns['peer_z'], lower_bounds, upper_bounds = leave_one_out_peer_scores(columns['median'])
+    columns['peer_severity'] = csv_processor.severity_codes(columns['peer_z'])
+    columns['peer_outlier'] = csv_processor.outlier_codes(columns['median'], lower_bounds, upper_bounds)[0]
+    columns['deviation'] = np.abs(columns['peer_z'])
+
+    # 与合并后的全部比值比较
+    fleet_scored = csv_processor.compute_z_scores(columns['mean'], fleet_stats)
+    columns['fleet_z'] = fleet_scored[0] if fleet_scored else np.full(len(device_ids), np.nan)
+    _, _, _, lower_bound, upper_bound = csv_processor.iqr_bounds(fleet_sketch)
+    columns['fleet_outlier_rate'] = np.array([
+        (sketch.rank(np.nextafter(lower_bound, -np.inf)) + 1 - sketch.rank(upper_bound)) * 100
+        for sketch in sketches
+    ])
+
+    return GroupTable(np.array(device_ids), columns).sort_by('deviation')
+
+
+def run_fleet_analysis(source, max_workers=None, quiet=True):
+    """并行分析多台设备的数据文件
+
+    Args:
+        source (str | list): 目录、通配符或文件路径列表
+        max_workers (int, optional): 进程数，默认为CPU核数
+        quiet (bool): 是否屏蔽各设备分析的控制台输出
+
+    Returns:
+        dict: 合并后的结果，包含devices（设备编号到分析结果）、failed（设备编号到错误信息）、summary，
+            以及ranking（rank_fleet_calibration的设备校准排名表，设备不足3台时为None）。
+            summary中的ratio_iqr_bounds为由各设备比值草图合并得到的全部设备比值的 (Q1, Q3, IQR, 下限, 上限)
+    """
+    files = find_device_files(source)
+    if not files:
+        print(f"错误: 没有找到设备数据文件 '{source}'")
+        return None
+
+    print(f"共找到 {len(files)} 个设备数据文件，开始并行分析...")
+
+    devices = {}
+    failed = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(file_path, executor.submit(analyze_device, file_path, quiet)) for file_path in files]
+        for file_path, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:  # 子进程崩溃等无法在analyze_device内捕获的错误
+                result = {'device_id': device_id_from_path(file_path), 'file': file_path,
+                          'error': f"{type(e).__name__}: {e}"}
+
+            device_id = result['device_id']
+            if device_id in devices or device_id in failed:
+                device_id = f"{device_id}({os.path.basename(file_path)})"
+            if result['error']:
+                failed[device_id] = result['error']
+                print(f"  ✗ {device_id}: {result['error']}")
+            else:
+                devices[device_id] = result
+                print(f"  ✓ {device_id}: {result['total_records']} 条记录")
+
+    device_summaries = [summarize_device(result) for result in devices.values()]
+    fleet_sketch = KLLSketch(seed=SKETCH_SEED)
+    for result in devices.values():
+        fleet_sketch.merge(KLLSketch.from_dict(result['ratio_sketch']))
+    summary = {
+        'device_count': len(files),
+        'success_count': len(devices),
+        'failed_count': len(failed),
+        'total_records': sum(item['total_records'] for item in device_summaries),
+        'z_score_anomaly_count': sum(item['z_score_anomaly_count'] for item in device_summaries),
+        'weight_anomaly_count': sum(item['weight_anomaly_count'] for item in device_summaries),
+        'time_anomaly_count': sum(item['time_anomaly_count'] for item in device_summaries),
+        'ratio_iqr_bounds': csv_processor.iqr_bounds(fleet_sketch),
+        'devices': device_summaries
+    }
+    ranking = rank_fleet_calibration(devices) if len(devices) >= 2 else None
+    return {'devices': devices, 'failed': failed, 'summary': summary, 'ranking': ranking}
+
+
+def print_fleet_summary(fleet_result):
+    """打印多设备分析汇总表"""
+    summary = fleet_result['summary']
+    print("\n" + "=" * 100)
+    print("多设备分析汇总")
+    print("=" * 100)
+    print(f"设备数: {summary['device_count']}  成功: {summary['success_count']}  失败: {summary['failed_count']}  "
+          f"总记录数: {summary['total_records']}")
+    if summary.get('ratio_iqr_bounds'):
+        q1, q3, iqr, lower_bound, upper_bound = summary['ratio_iqr_bounds']
+        print(f"全部设备比值: Q1: {q1:.4f}, Q3: {q3:.4f}, IQR: {iqr:.4f}, "
+              f"异常值范围: [{lower_bound:.4f}, {upper_bound:.4f}]")
+    print("-" * 100)
+    print(f"{'设备编号':<20}{'记录数':<10}{'天数':<8}{'Z-score异常':<14}{'异常率(%)':<12}{'重量异常':<10}{'时间异常':<10}")
+    print("-" * 100)
+    for item in summary['devices']:
+        print(f"{item['device_id']:<20}{item['total_records']:<10}{item['days']:<8}{item['z_score_anomaly_count']:<14}"
+              f"{item['z_score_anomaly_rate']:<12.2f}{item['weight_anomaly_count']:<10}{item['time_anomaly_count']:<10}")
+    for device_id, error in fleet_result['failed'].items():
+        print(f"{device_id:<20}失败: {error}")
+
+
+def print_fleet_ranking(ranking, sort_by='deviation', limit=None):
+    """打印设备校准排名表
+
+    Args:
+        ranking (GroupTable): rank_fleet_calibration的结果
+        sort_by (str): 排序列，见RANKING_COLUMNS，按降序排列
+        limit (int, optional): 只打印前limit台设备
+    """
+    print("\n" + "=" * 100)
+    print(f"设备校准排名（按 {sort_by} 降序）")
+    print("=" * 100)
+    print(f"{'设备编号':<20}{'比值个数':<10}{'均值':<10}{'中位数':<10}{'标准差':<10}{'设备间Z':<10}"
+          f"{'异常程度':<10}{'IQR':<8}{'全部比值Z':<12}{'超出IQR(%)':<10}")
+    print("-" * 100)
+    outlier_labels = {csv_processor.OUTLIER_NONE: '正常', csv_processor.OUTLIER_LOW: '偏低',
+                      csv_processor.OUTLIER_HIGH: '偏高'}
+    for rank, (device_id, row) in enumerate(ranking.sort_by(sort_by).rows()):
+        if limit is not None and rank >= limit:
+            break
+        print(f"{device_id:<20}{row['count']:<10}{row['mean']:<10.4f}{row['median']:<10.4f}{row['std_dev']:<10.4f}"
+              f"{row['peer_z']:<10.2f}{csv_processor.SEVERITY_LABELS[row['peer_severity']]:<10}"
+              f"{outlier_labels[row['peer_outlier']]:<8}{row['fleet_z']:<12.2f}{row['fleet_outlier_rate']:<10.2f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='多台秤称重数据批量分析')
+    parser.add_argument('source', nargs='?', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='设备CSV所在目录或通配符，默认为当前目录')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数，默认为CPU核数')
+    parser.add_argument('--sort', default='deviation', choices=RANKING_COLUMNS, help='校准排名表的排序列（降序）')
+    parser.add_argument('--top', type=int, default=None, help='校准排名表只显示前N台设备')
+    args = parser.parse_args()
+
+    fleet_result = run_fleet_analysis(args.source, max_workers=args.workers)
+    if fleet_result:
+        print_fleet_summary(fleet_result)
+        if fleet_result['ranking'] is not None:
+            print_fleet_ranking(fleet_result['ranking'], args.sort, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+追加写入的称重数据增量分析
+秤会不断向CSV导出文件末尾追加记录，这里记录每个文件上次处理到的字节位置和行数，
+每次只读取新追加的行，并就地更新按时间分组的统计和滚动基线，新发现的重量/时间异常和失准漂移异常追加写入异常日志
+"""
+
+import argparse
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import numpy as np
+
+import csv_processor
+from compressed_io import detect_compression, open_binary
+from fleet_analysis import device_id_from_path
+from online_stats import RollingWindow, RunningStats, SpaceSaving, group_running_stats, group_space_saving, roll_up
+from quantile_sketch import KLLSketch
+from weighing_columns import detect_columns
+
+# 状态文件格式版本
+STATE_VERSION = 7
+
+# 校验已处理部分是否被改写时，开头和末尾各使用的字节数
+HASH_CHECK_BYTES = 4096
+
+
+def processed_hash(file, offset):
+    """计算已打开的二进制文件中offset之前开头4KB和最后4KB内容的哈希
+
+    与column_cache.file_fingerprint一样只读取首尾，不随文件增大而变慢；只改写中间部分时哈希不变。
+    """
+    digest = hashlib.sha1()
+    file.seek(0)
+    digest.update(file.read(min(offset, HASH_CHECK_BYTES)))
+    start = max(0, offset - HASH_CHECK_BYTES)
+    file.seek(start)
+    digest.update(file.read(offset - start))
+    return digest.hexdigest()
+
+
+class IncrementalAnalyzer:
+    """称重CSV文件的增量分析器
+
+    状态保存在状态目录下的JSON文件中：已处理的字节位置和行数、每日的在线统计量
+    （RunningStats）和商品次数（SpaceSaving）、全部比值的分位数草图（KLLSketch）、
+    漂移检测的滚动窗口（RollingWindow，计数窗口最多保存window个比值），以及异常条数。
+    异常本身按JSON Lines追加写入同名的.anomalies.jsonl日志，状态中记录日志已提交的字节位置，
+    每次refresh只追加新发现的异常，不重写已有内容；状态保存之前中断而多写的日志内容在下次refresh时截掉。
+    周、月等统计在查询时由每日统计合并得到。文件被截断，或已处理部分的开头或末尾（各4KB）被改写时
+    自动重新全量分析；只改写中间的行检测不到，需要用reset重新分析。
+    """
+
+    def __init__(self, file_path, state_dir=None, chunk_size=50000, baseline_store=None, device_id=None,
+                 drift_window=csv_processor.DRIFT_WINDOW, drift_time_window=None,
+                 drift_min_periods=csv_processor.DRIFT_MIN_PERIODS):
+        """
+        Args:
+            file_path (str): 称重CSV文件路径
+            state_dir (str, optional): 状态目录，默认为本模块所在目录下的.incremental_state
+            chunk_size (int): 解析新数据时每块的行数
+            baseline_store (BaselineStore, optional): 提供时把新追加行的比值同时加入该设备的基线。
+                基线以文件路径为来源记录已加入的行数，状态保存前中断后重新处理同一批行不会重复计数；
+                文件被截断或改写而重新全量分析时，先撤回该文件原先加入基线的比值
+            device_id (str, optional): 基线使用的设备编号，默认从文件名中提取
+            drift_window (int): 漂移检测的计数窗口，见csv_processor.compute_rolling_z_scores
+            drift_time_window (numpy.timedelta64, optional): 漂移检测的时间窗口，指定时忽略drift_window
+            drift_min_periods (int): 窗口内至少需要的比值个数。以上三项与已保存的状态不同时重新全量分析
+        """
+        if state_dir is None:
+            state_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.incremental_state')
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        self.file_path = file_path
+        self.state_path = os.path.join(state_dir, f'{key}.json')
+        self.anomaly_log_path = os.path.join(state_dir, f'{key}.anomalies.jsonl')
+        self.chunk_size = chunk_size
+        self.baseline_store = baseline_store
+        self.device_id = device_id or device_id_from_path(file_path)
+        if drift_time_window is not None:
+            drift_time_window = np.timedelta64(drift_time_window, 's')
+        self.drift_window = drift_window
+        self.drift_time_window = drift_time_window
+        self.drift_min_periods = drift_min_periods
+        self.state = self._load_state()
+
+    def _new_state(self):
+        return {
+            'version': STATE_VERSION,
+            'file': os.path.abspath(self.file_path),
+            'offset': 0,
+            'row_count': 0,
+            'processed_hash': None,
+            'fieldnames': [],
+            'column_map': {},
+            'days': {},
+            'ratio_sketch': KLLSketch().to_dict(),
+            'anomaly_log_offset': 0,
+            'weight_anomaly_count': 0,
+            'time_anomaly_count': 0,
+            'drift': {
+                'window': RollingWindow(self.drift_window, self.drift_time_window).to_dict(),
+                'min_periods': self.drift_min_periods,
+                'ratio_count': 0,
+                'scored_count': 0,
+                'mild_anomaly_count': 0,
+                'severe_anomaly_count': 0
+            }
+        }
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+            if state.get('version') == STATE_VERSION:
+                settings = self._new_state()['drift']
+                if (state['drift']['window']['window'], state['drift']['window']['time_window'],
+                        state['drift']['min_periods']) == (settings['window']['window'],
+                                                           settings['window']['time_window'],
+                                                           settings['min_periods']):
+                    return state
+                print(f"警告: {self.file_path} 的漂移检测窗口设置已改变，重新全量分析")
+                self._drop_baseline()
+        return self._new_state()
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        temp_path = f'{self.state_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def reset(self):
+        """清空状态，下次refresh时重新全量分析"""
+        self.state = self._new_state()
+        self._drop_baseline()
+        for path in (self.state_path, self.anomaly_log_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def refresh(self):
+        """读取上次处理位置之后追加的完整行，并更新统计和异常结果
+
+        Returns:
+            int: 本次新处理的行数
+
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        if not os.path.exists(self.file_path):
+            raise FileNotFoundError(f"文件不存在: {self.file_path}")
+
+        state = self.state
+        with self._open() as file:
+            size = file.seek(0, os.SEEK_END)
+            if state['offset'] and (size < state['offset']
+                                    or processed_hash(file, state['offset']) != state['processed_hash']):
+                print(f"警告: {self.file_path} 已处理部分被截断或开头/末尾被改写，重新全量分析")
+                state = self.state = self._new_state()
+                self._drop_baseline()
+
+            file.seek(0)
+            if state['offset'] == 0:
+                header_line = file.readline()
+                if not header_line.endswith(b'\n'):
+                    return 0  # 表头还没有写完整
+                state['fieldnames'] = next(csv.reader([header_line.decode('utf-8-sig')]), [])
+                state['column_map'] = detect_columns(state['fieldnames'])
+                state['offset'] = file.tell()
+            file.seek(state['offset'])
+            data = file.read()
+
+            # 只处理完整的行，末尾尚未写完的行留到下次
+            data = data[:data.rfind(b'\n') + 1]
+            new_rows = 0
+            if data:
+                reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+                columns, new_rows = csv_processor.columns_from_reader(reader, state['fieldnames'],
+                                                                     state['column_map'], self.chunk_size)
+                columns.row_ids += state['row_count']
+                self._update_buckets(columns)
+                ratios, ratio_rows = csv_processor.get_ratios_from_columns(columns)
+                self._update_ratio_sketch(ratios, ratio_rows)
+                self._update_anomalies(columns, self._update_drift(ratios, ratio_rows))
+                state['offset'] += len(data)
+                state['row_count'] += new_rows
+
+            state['processed_hash'] = processed_hash(file, state['offset'])
+        self._save_state()
+        return new_rows
+
+    def _open(self):
+        """打开数据文件；字节位置和哈希都按解压后的内容计算
+
+        压缩文件（例如按gzip多段追加的归档）无法直接定位到解压后的位置，整体解压到内存，
+        但仍然只解析新追加的行。
+        """
+        if detect_compression(self.file_path) is None:
+            return open(self.file_path, 'rb')
+        with open_binary(self.file_path) as file:
+            return io.BytesIO(file.read())
+
+    def _update_buckets(self, columns):
+        """把新数据合并到每日的统计量和商品计数中"""
+        if not columns.has('time') or not columns.has('weight'):
+            return
+        valid = columns.valid('time', 'weight')
+        weights = columns.values['weight'][valid]
+        days = columns.values['time'][valid].astype('datetime64[D]').astype(str)
+
+        # 与time_based_weight_statistics一致，只统计重量大于0的记录
+        positive = weights > 0
+        buckets = self.state['days']
+        for key, stats in group_running_stats(days[positive], weights[positive]).items():
+            bucket = buckets.setdefault(key, {'stats': RunningStats().to_dict(), 'products': None})
+            bucket['stats'] = RunningStats.from_dict(bucket['stats']).merge(stats).to_dict()
+
+        if columns.has('product'):
+            # 新数据块按字典代码计数，保存状态前解码为名称（各块的代码不通用）
+            product_codes, product_names = columns.category_codes('product')
+            product_codes = product_codes[valid]
+            has_product = (product_codes >= 0) & positive
+            for key, products in group_space_saving(days[has_product], product_codes[has_product],
+                                                    csv_processor.product_sketch_capacity()).items():
+                products = products.decode(product_names)
+                if buckets[key]['products']:
+                    products = SpaceSaving.from_dict(buckets[key]['products']).merge(products)
+                buckets[key]['products'] = products.to_dict()
+
+    def _update_ratio_sketch(self, ratios, data):
+        """把新数据的有效比值加入分位数草图（以及设备基线）"""
+        sketch = KLLSketch.from_dict(self.state['ratio_sketch']).add_array(ratios)
+        self.state['ratio_sketch'] = sketch.to_dict()
+        if self.baseline_store is not None and data.has('time'):
+            # 基线先于状态保存，传入文件行号，重新处理已加入基线的行时由基线跳过
+            self.baseline_store.update(self.device_id, ratios, data.values['time'],
+                                       source=os.path.abspath(self.file_path), row_ids=data.row_ids)
+
+    def _drop_baseline(self):
+        """重新全量分析前撤回该文件加入设备基线的比值"""
+        if self.baseline_store is not None:
+            self.baseline_store.drop_source(self.device_id, os.path.abspath(self.file_path))
+
+    def ratio_sketch(self):
+        """返回文件全部历史比值的分位数草图，可传给csv_processor.iqr_bounds计算IQR异常值范围
+
+        Returns:
+            KLLSketch: 比值分位数草图
+        """
+        return KLLSketch.from_dict(self.state['ratio_sketch'])
+
+    def _update_drift(self, ratios, data):
+        """把新数据的有效比值按到达顺序逐条与之前窗口内的比值比较（滚动基线Z-score）
+
+        窗口跨越多次refresh，保存在状态中，结果与对整个文件调用csv_processor.detect_calibration_drift相同
+        （文件按时间先后追加时）。时间无法解析的记录不参与，与批量计算一致。
+
+        Returns:
+            list: 新发现的漂移异常，格式与detect_calibration_drift的anomalies相同
+        """
+        drift = self.state['drift']
+        rolling = RollingWindow.from_dict(drift['window'])
+        if data.has('time'):
+            valid = data.masks['time']
+            ratios, times = ratios[valid], data.values['time'][valid]
+            row_ids = data.row_ids[valid]
+        elif rolling.time_window is None:
+            times, row_ids = [None] * len(ratios), data.row_ids
+        else:
+            return []
+
+        scored = []
+        for row_id, ratio, time in zip(row_ids.tolist(), ratios.tolist(), times):
+            count, mean, std = rolling.push(ratio, time)
+            if count >= drift['min_periods'] and std > 0:
+                scored.append((row_id, time, ratio, mean, (ratio - mean) / std))
+        drift['window'] = rolling.to_dict()
+        drift['ratio_count'] += len(ratios)
+        drift['scored_count'] += len(scored)
+
+        severity = csv_processor.severity_codes(np.array([item[4] for item in scored]))
+        anomalies = []
+        for (row_id, time, ratio, mean, z), code in zip(scored, severity.tolist()):
+            if code == csv_processor.SEVERITY_NORMAL:
+                continue
+            drift['mild_anomaly_count' if code == csv_processor.SEVERITY_MILD else 'severe_anomaly_count'] += 1
+            anomalies.append({
+                'index': row_id + 1,
+                'time': str(time) if time is not None else '-',
+                'ratio': ratio,
+                'baseline_mean': mean,
+                'z_score': z,
+                'anomaly': csv_processor.SEVERITY_LABELS[code]
+            })
+        return anomalies
+
+    def _update_anomalies(self, columns, drift_anomalies):
+        """检测新数据中的重量和时间异常，连同漂移异常追加写入异常日志并记录新的日志位置"""
+        weight_anomalies, time_anomalies = [], []
+        if columns.has('weight'):
+            weight_anomalies, time_anomalies = csv_processor.find_weight_and_time_anomalies(columns)
+        if not weight_anomalies and not time_anomalies and not drift_anomalies:
+            return
+        os.makedirs(os.path.dirname(self.anomaly_log_path), exist_ok=True)
+        with open(self.anomaly_log_path, 'ab') as file:
+            # 截掉上次中断时写入但未随状态提交的内容（重新全量分析时截为空）
+            file.truncate(self.state['anomaly_log_offset'])
+            for kind, anomalies in (('weight', weight_anomalies), ('time', time_anomalies),
+                                    ('drift', drift_anomalies)):
+                for anomaly in anomalies:
+                    line = json.dumps({'kind': kind, **anomaly}, ensure_ascii=False)
+                    file.write(line.encode('utf-8') + b'\n')
+            self.state['anomaly_log_offset'] = file.tell()
+        self.state['weight_anomaly_count'] += len(weight_anomalies)
+        self.state['time_anomaly_count'] += len(time_anomalies)
+
+    def _read_anomalies(self):
+        """读取异常日志中已提交的部分
+
+        Returns:
+            dict: 异常类型（'weight'、'time'、'drift'）到异常列表的映射
+        """
+        anomalies = {'weight': [], 'time': [], 'drift': []}
+        offset = self.state['anomaly_log_offset']
+        if not offset:
+            return anomalies
+        with open(self.anomaly_log_path, 'rb') as file:
+            data = file.read(offset)
+        for line in data.splitlines():
+            anomaly = json.loads(line)
+            anomalies[anomaly.pop('kind')].append(anomaly)
+        return anomalies
+
+    def statistics(self):
+        """返回与time_based_weight_statistics相同格式的按时间分组统计结果"""
+        has_product = bool(self.state['column_map'].get('product'))
+        daily_stats = {}
+        daily_products = {}
+        for key, bucket in self.state['days'].items():
+            day = datetime.date.fromisoformat(key)
+            daily_stats[day] = RunningStats.from_dict(bucket['stats'])
+            if bucket['products']:
+                daily_products[day] = SpaceSaving.from_dict(bucket['products'])
+
+        level_stats = {'daily': (daily_stats, daily_products)}
+        for level, key_func in csv_processor.ROLLUP_LEVELS.items():
+            level_stats[level] = (roll_up(daily_stats, key_func), roll_up(daily_products, key_func))
+
+        results = {}
+        for level, (stats, products) in level_stats.items():
+            level_results = {}
+            for key in sorted(stats):
+                summary = stats[key].summary()
+                if summary is None:
+                    continue
+                if has_product:
+                    summary['top3_products'] = products[key].top(csv_processor.TOP_PRODUCTS) if key in products else []
+                level_results[key.isoformat() if level == 'daily' else key] = summary
+            results[level] = level_results
+        return results
+
+    def drift(self):
+        """返回与detect_calibration_drift相同格式的漂移检测结果（不含按日期的时间线），异常列表从异常日志中读取"""
+        drift = self.state['drift']
+        total_records = drift['ratio_count']
+        anomalies = self._read_anomalies()['drift']
+        return {
+            'total_records': total_records,
+            'anomalies': anomalies,
+            'summary': {
+                'total_records': total_records,
+                'scored_count': drift['scored_count'],
+                'mild_anomaly_count': drift['mild_anomaly_count'],
+                'severe_anomaly_count': drift['severe_anomaly_count'],
+                'anomaly_rate': len(anomalies) / total_records * 100 if total_records else 0.0
+            }
+        }
+
+    def anomalies(self):
+        """返回与detect_weight_and_time_anomalies相同格式的异常检测结果，异常列表从异常日志中读取"""
+        total_records = self.state['row_count']
+        weight_count = self.state['weight_anomaly_count']
+        time_count = self.state['time_anomaly_count']
+        anomalies = self._read_anomalies()
+        weight_anomalies, time_anomalies = anomalies['weight'], anomalies['time']
+        return {
+            'total_records': total_records,
+            'weight_anomalies': weight_anomalies,
+            'time_anomalies': time_anomalies,
+            'summary': {
+                'total_records': total_records,
+                'weight_anomaly_count': weight_count,
+                'time_anomaly_count': time_count,
+                'weight_anomaly_rate': weight_count / total_records * 100 if total_records else 0.0,
+                'time_anomaly_rate': time_count / total_records * 100 if total_records else 0.0
+            }
+        }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='增量分析追加写入的称重CSV文件')
+    parser.add_argument('files', nargs='+', help='称重CSV文件路径')
+    parser.add_argument('--reset', action='store_true', help='清空已保存的状态并重新全量分析')
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        analyzer = IncrementalAnalyzer(file_path)
+        if args.reset:
+            analyzer.reset()
+        try:
+            new_rows = analyzer.refresh()
+        except FileNotFoundError as e:
+            print(e)
+            continue
+        summary = analyzer.anomalies()['summary']
+        drift_summary = analyzer.drift()['summary']
+        print(f"{file_path}: 新增 {new_rows} 条记录, 累计 {summary['total_records']} 条, "
+              f"重量异常 {summary['weight_anomaly_count']} 条, 时间异常 {summary['time_anomaly_count']} 条, "
+              f"漂移异常 {drift_summary['mild_anomaly_count'] + drift_summary['severe_anomaly_count']} 条, "
+              f"统计天数 {len(analyzer.statistics()['daily'])}")
+
+
+if __name__ == '__main__':
+    main()
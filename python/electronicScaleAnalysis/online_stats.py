@@ -0,0 +1,462 @@
+import math
+from collections import deque
+import numpy as np
+
+
+class RunningStats:
+    """在线统计量（Welford算法）：计数、均值、离差平方和M2、最小值、最大值
+
+    可以逐个或整批加入数据，也可以与另一个RunningStats合并（Chan等人的并行合并公式），
+    内存占用与数据量无关。
+    """
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, min=None, max=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    def add(self, value):
+        """加入一个数据"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def add_array(self, values):
+        """整批加入数据：先用NumPy计算这批数据的统计量，再合并"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        mean = float(values.mean())
+        batch = RunningStats(len(values), mean, float(((values - mean) ** 2).sum()),
+                             float(values.min()), float(values.max()))
+        return self.merge(batch)
+
+    def merge(self, other):
+        """把另一个RunningStats合并到当前对象
+
+        Args:
+            other (RunningStats): 另一组数据的统计量
+
+        Returns:
+            RunningStats: 当前对象
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.min, self.max = other.count, other.mean, other.m2, other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __len__(self):
+        return self.count
+
+    def copy(self):
+        return RunningStats(self.count, self.mean, self.m2, self.min, self.max)
+
+    @property
+    def variance(self):
+        """样本方差，数据少于2个时为0"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std_dev(self):
+        """样本标准差，与statistics.stdev一致"""
+        return math.sqrt(max(self.variance, 0.0))
+
+    def summary(self):
+        """返回与calculate_statistics相同格式的统计结果，没有数据时返回None"""
+        if self.count == 0:
+            return None
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'std_dev': self.std_dev,
+            'min': self.min,
+            'max': self.max
+        }
+
+    def to_dict(self):
+        """转为可JSON序列化的字典"""
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['count'], state['mean'], state['m2'], state['min'], state['max'])
+
+
+def group_running_stats(keys, values, label=None):
+    """按键数组分组，整列计算每组的RunningStats
+
+    每组的计数、总和、离差平方和用bincount一次算出，最小值和最大值用reduceat，
+    不为每组生成值列表，结果大小只与分组数有关。
+
+    Args:
+        keys (numpy.ndarray): 每个值所属分组的键
+        values (numpy.ndarray): 要统计的值
+        label (function, optional): 把键转换为结果字典键的函数，默认使用键本身
+
+    Returns:
+        dict: 分组键到RunningStats的映射
+    """
+    if len(keys) == 0:
+        return {}
+    values = np.asarray(values, dtype=np.float64)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+    size = len(unique_keys)
+    counts = np.bincount(inverse, minlength=size)
+    means = np.bincount(inverse, weights=values, minlength=size) / counts
+    m2 = np.bincount(inverse, weights=(values - means[inverse]) ** 2, minlength=size)
+
+    sorted_values = values[np.argsort(inverse, kind='stable')]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    mins = np.minimum.reduceat(sorted_values, starts)
+    maxs = np.maximum.reduceat(sorted_values, starts)
+
+    result = {}
+    for key, count, mean, sq, low, high in zip(unique_keys.tolist(), counts.tolist(), means.tolist(),
+                                               m2.tolist(), mins.tolist(), maxs.tolist()):
+        result[label(key) if label else key] = RunningStats(count, mean, sq, low, high)
+    return result
+
+
+def rolling_window_stats(values, times=None, window=1000, time_window=None):
+    """计算每个数据之前的滑动窗口（不包含该数据本身）的计数、均值和样本标准差
+
+    这是整列数据已知时的批量计算：用前缀和与前缀平方和（减去整体均值后再累加）向量化算出所有窗口。
+    计数窗口的边界直接由下标得到，每个窗口O(1)；时间窗口的边界用二分查找（np.searchsorted），每个窗口O(log n)。
+    需要整列数据在内存中。数据逐条到达时使用RollingWindow（例如IncrementalAnalyzer的漂移检测），
+    每次push均摊O(1)，结果与本函数对应的行相同。
+
+    Args:
+        values (numpy.ndarray): 按时间先后排列的数据
+        times (numpy.ndarray, optional): 与values对应的已排序datetime64数组，使用time_window时必须提供
+        window (int): 计数窗口：之前的window个数据
+        time_window (numpy.timedelta64, optional): 时间窗口：时间在 [t - time_window, t) 内的数据，
+            指定时忽略window
+
+    Returns:
+        tuple: (窗口计数数组, 窗口均值数组, 窗口标准差数组)；窗口为空时均值为NaN，少于2个数据时标准差为NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    shift = float(values.mean()) if count else 0.0
+    centered = values - shift
+    sums = np.concatenate(([0.0], np.cumsum(centered)))
+    squares = np.concatenate(([0.0], np.cumsum(centered * centered)))
+
+    if time_window is not None:
+        # 同一时间的数据互不计入对方的窗口
+        ends = np.searchsorted(times, times, side='left')
+        starts = np.searchsorted(times, times - time_window, side='left')
+    else:
+        ends = np.arange(count)
+        starts = np.maximum(ends - window, 0)
+
+    counts = ends - starts
+    total = sums[ends] - sums[starts]
+    square_total = squares[ends] - squares[starts]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = shift + total / counts
+        m2 = np.maximum(square_total - total * total / counts, 0.0)
+        stds = np.sqrt(m2 / (counts - 1))
+    means[counts == 0] = np.nan
+    stds[counts < 2] = np.nan
+    return counts, means, stds
+
+
+class RollingWindow:
+    """流式滑动窗口统计：逐条加入数据，自动移出窗口外的数据，维护窗口内的计数、均值和样本标准差
+
+    窗口中的数据保存在队列中，同时维护减去第一个数据后的和与平方和，加入和移出一个数据都只需更新这两个值，
+    每次push均摊O(1)。窗口定义与rolling_window_stats相同：计数窗口为之前的window个数据；
+    时间窗口为时间在 [t - time_window, t) 内的数据，同一时间的数据互不计入对方的窗口。
+    """
+
+    __slots__ = ('window', 'time_window', '_items', '_pending', '_pending_time', '_shift', '_sum', '_squares')
+
+    def __init__(self, window=1000, time_window=None):
+        """
+        Args:
+            window (int): 计数窗口：之前的window个数据
+            time_window (numpy.timedelta64, optional): 时间窗口，指定时忽略window，push时必须提供时间
+        """
+        self.window = window
+        self.time_window = time_window
+        self._items = deque()    # (时间, 数据)
+        self._pending = []       # 与当前时间相同、尚未计入窗口的数据
+        self._pending_time = None
+        self._shift = None
+        self._sum = 0.0
+        self._squares = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _add(self, time, value):
+        if self._shift is None:
+            self._shift = value
+        centered = value - self._shift
+        self._items.append((time, value))
+        self._sum += centered
+        self._squares += centered * centered
+
+    def _evict(self):
+        _, value = self._items.popleft()
+        centered = value - self._shift
+        self._sum -= centered
+        self._squares -= centered * centered
+        if not self._items:
+            self._sum = self._squares = 0.0
+
+    def push(self, value, time=None):
+        """返回该数据之前的窗口统计量，然后把该数据加入窗口
+
+        Args:
+            value (float): 新数据
+            time (numpy.datetime64, optional): 数据的时间，使用时间窗口时必须提供且不早于之前的数据
+
+        Returns:
+            tuple: (窗口计数, 窗口均值, 窗口标准差)，窗口为空时均值为NaN，少于2个数据时标准差为NaN
+        """
+        value = float(value)
+        if self.time_window is None:
+            result = self.stats()
+            self._add(None, value)
+            if len(self._items) > self.window:
+                self._evict()
+            return result
+
+        if time is None:
+            raise ValueError("使用时间窗口时必须提供time")
+        if time != self._pending_time:
+            for pending in self._pending:
+                self._add(self._pending_time, pending)
+            self._pending = []
+            self._pending_time = time
+        start = time - self.time_window
+        while self._items and self._items[0][0] < start:
+            self._evict()
+        result = self.stats()
+        self._pending.append(value)
+        return result
+
+    def stats(self):
+        """当前窗口的 (计数, 均值, 样本标准差)，不包含与最近一个数据同一时间的数据"""
+        count = len(self._items)
+        if count == 0:
+            return 0, math.nan, math.nan
+        mean = self._sum / count
+        if count < 2:
+            return count, self._shift + mean, math.nan
+        m2 = max(self._squares - self._sum * mean, 0.0)
+        return count, self._shift + mean, math.sqrt(m2 / (count - 1))
+
+    def to_dict(self):
+        """转为可JSON序列化的字典，保存窗口中的数据和累加值，恢复后继续push的结果与不中断时完全相同"""
+        def time_text(time):
+            return None if time is None else str(time)
+
+        return {
+            'window': self.window,
+            'time_window': None if self.time_window is None else int(self.time_window / np.timedelta64(1, 's')),
+            'times': [time_text(time) for time, _ in self._items],
+            'values': [value for _, value in self._items],
+            'pending': self._pending,
+            'pending_time': time_text(self._pending_time),
+            'shift': self._shift,
+            'sum': self._sum,
+            'squares': self._squares
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        def parse_time(text):
+            return None if text is None else np.datetime64(text)
+
+        time_window = state['time_window']
+        rolling = cls(state['window'], None if time_window is None else np.timedelta64(time_window, 's'))
+        rolling._items = deque(zip((parse_time(text) for text in state['times']), state['values']))
+        rolling._pending = list(state['pending'])
+        rolling._pending_time = parse_time(state['pending_time'])
+        rolling._shift = state['shift']
+        rolling._sum = state['sum']
+        rolling._squares = state['squares']
+        return rolling
+
+
+def roll_up(partials, key_func):
+    """把细粒度分组的部分统计量合并为粗粒度分组，例如由每日统计得到每周、每月统计
+
+    Args:
+        partials (dict): 细粒度分组键到可合并统计量（RunningStats、SpaceSaving等）的映射
+        key_func (function): 把细粒度分组键映射为粗粒度分组键，返回None的分组不参与汇总
+
+    Returns:
+        dict: 粗粒度分组键到合并后统计量的映射，不修改partials中的对象
+    """
+    result = {}
+    for key in sorted(partials):  # 固定合并顺序，保证结果可重复
+        coarse = key_func(key)
+        if coarse is None:
+            continue
+        if coarse in result:
+            result[coarse].merge(partials[key])
+        else:
+            result[coarse] = partials[key].copy()
+    return result
+
+
+class SpaceSaving:
+    """Space-Saving高频项统计（Metwally等人2005），用固定数量的计数器近似统计出现次数最多的K项
+
+    不同取值不超过capacity个时计数是精确的；超过后新出现的项替换计数最小的项，计数可能偏大，
+    但偏大量不超过记录的误差（errors），且真实次数大于 总次数/capacity 的项一定被保留。
+    可以与另一个SpaceSaving合并（Agarwal等人2012的可合并摘要），用roll_up逐级汇总。
+    """
+
+    __slots__ = ('capacity', 'counts', 'errors', 'overflowed')
+
+    def __init__(self, capacity=64):
+        """
+        Args:
+            capacity (int): 计数器个数，应明显大于需要的K
+        """
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.overflowed = False  # 是否发生过替换，未发生时计数是精确的
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, item, count=1):
+        """加入一项（出现count次）"""
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            victim = min(self.counts, key=lambda key: (self.counts[key], key))
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+            self.overflowed = True
+
+    def add_array(self, items):
+        """整批加入：先用np.unique统计这批数据中每项的次数，再按次数加入
+
+        Returns:
+            SpaceSaving: 当前对象
+        """
+        if len(items) == 0:
+            return self
+        values, counts = np.unique(np.asarray(items), return_counts=True)
+        for item, count in zip(values.tolist(), counts.tolist()):
+            self.add(item, count)
+        return self
+
+    def _floor(self):
+        """未被记录的项可能的最大次数"""
+        return min(self.counts.values()) if self.overflowed and self.counts else 0
+
+    def merge(self, other):
+        """把另一个SpaceSaving合并到当前对象，只保留计数最大的capacity项
+
+        Returns:
+            SpaceSaving: 当前对象
+        """
+        floor, other_floor = self._floor(), other._floor()
+        counts = {}
+        errors = {}
+        for item in set(self.counts) | set(other.counts):
+            counts[item] = self.counts.get(item, floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, floor) + other.errors.get(item, other_floor)
+        overflowed = self.overflowed or other.overflowed or len(counts) > self.capacity
+        kept = sorted(counts, key=lambda item: (-counts[item], item))[:self.capacity]
+        self.counts = {item: counts[item] for item in kept}
+        self.errors = {item: errors[item] for item in kept}
+        self.overflowed = overflowed
+        return self
+
+    def copy(self):
+        return SpaceSaving.from_dict(self.to_dict())
+
+    def top(self, k):
+        """按次数降序、项升序取前k项
+
+        Returns:
+            list: (项, 次数) 元组列表
+        """
+        return sorted(self.counts.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+    def decode(self, names):
+        """项为字典代码时，返回把代码换成名称后的新SpaceSaving
+
+        Args:
+            names (list): 代码对应的名称
+        """
+        summary = SpaceSaving(self.capacity)
+        summary.counts = {names[item]: count for item, count in self.counts.items()}
+        summary.errors = {names[item]: error for item, error in self.errors.items()}
+        summary.overflowed = self.overflowed
+        return summary
+
+    def to_dict(self):
+        """转为可JSON序列化的字典（项需为字符串）"""
+        return {'capacity': self.capacity, 'counts': self.counts, 'errors': self.errors, 'overflowed': self.overflowed}
+
+    @classmethod
+    def from_dict(cls, state):
+        summary = cls(state['capacity'])
+        summary.counts = dict(state['counts'])
+        summary.errors = dict(state['errors'])
+        summary.overflowed = state['overflowed']
+        return summary
+
+
+def group_space_saving(keys, items, capacity=64, label=None):
+    """按键数组分组，为每组建立SpaceSaving
+
+    先对（分组，项）组合整列计数，不为每组生成项列表。
+
+    Args:
+        keys (numpy.ndarray): 每项所属分组的键
+        items (numpy.ndarray): 要统计的项
+        capacity (int): 每组的计数器个数
+        label (function, optional): 把键转换为结果字典键的函数，默认使用键本身
+
+    Returns:
+        dict: 分组键到SpaceSaving的映射
+    """
+    if len(keys) == 0:
+        return {}
+    unique_keys, key_codes = np.unique(keys, return_inverse=True)
+    unique_items, item_codes = np.unique(items, return_inverse=True)
+    pairs, counts = np.unique(key_codes.ravel() * len(unique_items) + item_codes.ravel(), return_counts=True)
+    unique_keys = unique_keys.tolist()
+    unique_items = unique_items.tolist()
+    result = {}
+    for pair, count in zip(pairs.tolist(), counts.tolist()):
+        key = unique_keys[pair // len(unique_items)]
+        key = label(key) if label else key
+        if key not in result:
+            result[key] = SpaceSaving(capacity)
+        result[key].add(unique_items[pair % len(unique_items)], count)
+    return result
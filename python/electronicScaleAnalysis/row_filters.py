@@ -0,0 +1,143 @@
+import datetime
+import numpy as np
+from time_parsing import TimestampParser, parse_with_formats
+from weighing_columns import parse_float_column, NUMERIC_ROLES, TIME_ROLES, TEXT_ROLES
+
+
+def to_datetime64(value):
+    """把字符串、datetime或datetime64转为datetime64[s]，None保持为None"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        parsed, _ = parse_with_formats(value)
+        if parsed is None:
+            raise ValueError(f"无法解析时间: {value}")
+        value = parsed
+    return np.datetime64(value, 's')
+
+
+class Predicate:
+    """读取CSV时下推的简单过滤条件
+
+    在解析阶段就丢弃不满足条件的行，被丢弃的行不会做类型转换，也不会进入结果。
+    请使用time_between、value_between和isin创建。
+    """
+
+    def __init__(self, column, kind, low=None, high=None, values=None):
+        """
+        Args:
+            column (str): CSV列名
+            kind (str): 'time'（时间范围）、'value'（数值范围）或'isin'（取值集合）
+            low: 下限（包含），None表示不限
+            high: 上限，时间范围不包含上限，数值范围包含上限，None表示不限
+            values (set): isin的取值集合
+        """
+        self.column = column
+        self.kind = kind
+        self.low = low
+        self.high = high
+        self.values = values
+        self._parser = TimestampParser() if kind == 'time' else None
+
+    def __repr__(self):
+        if self.kind == 'isin':
+            return f"isin({self.column!r}, {sorted(self.values)!r})"
+        return f"{self.kind}_between({self.column!r}, {self.low!r}, {self.high!r})"
+
+    def _in_range(self, values):
+        ok = np.ones(len(values), dtype=bool)
+        if self.low is not None:
+            ok &= values >= self.low
+        if self.high is not None:
+            ok &= values < self.high if self.kind == 'time' else values <= self.high
+        return ok
+
+    def match(self, text):
+        """判断单个字符串值是否满足条件"""
+        if text is None:
+            return False
+        if self.kind == 'isin':
+            return text.strip() in self.values
+        if self.kind == 'value':
+            try:
+                value = float(text)
+            except ValueError:
+                return False
+            return bool(self._in_range(np.array([value]))[0])
+        parsed, _ = parse_with_formats(text) if text else (None, None)
+        return parsed is not None and bool(self._in_range(np.array([np.datetime64(parsed, 's')]))[0])
+
+    def mask(self, strings):
+        """对一列字符串整列判断，无法解析的值视为不满足
+
+        Args:
+            strings (list): 字符串列表
+
+        Returns:
+            numpy.ndarray: 布尔掩码
+        """
+        if self.kind == 'isin':
+            return np.array([text.strip() in self.values for text in strings], dtype=bool)
+        if self.kind == 'value':
+            values, valid = parse_float_column(strings)
+        else:
+            values, valid = self._parser.parse(strings)
+        return valid & self._in_range(values)
+
+    def mask_columns(self, columns):
+        """在已解析的列式数据上整列判断
+
+        Args:
+            columns (WeighingColumns): 列式数据
+
+        Returns:
+            numpy.ndarray: 布尔掩码；条件所在列不是已加载的字段时返回None
+        """
+        kinds = {'value': NUMERIC_ROLES, 'time': TIME_ROLES, 'isin': TEXT_ROLES}[self.kind]
+        for role in kinds:
+            if columns.column(role) != self.column:
+                continue
+            if self.kind == 'isin':
+                # 只在字典上判断一次，再按代码取出每行的结果
+                allowed = np.isin(np.char.strip(columns.categories[role]), list(self.values))
+                return allowed[columns.values[role]]
+            return columns.masks[role] & self._in_range(columns.values[role])
+        return None
+
+
+def time_between(column, start=None, end=None):
+    """时间范围条件：start <= 时间 < end
+
+    Args:
+        column (str): 时间列名，例如'订单时间'
+        start (str | datetime, optional): 起始时间（包含）
+        end (str | datetime, optional): 结束时间（不包含）
+    """
+    return Predicate(column, 'time', to_datetime64(start), to_datetime64(end))
+
+
+def value_between(column, low=None, high=None):
+    """数值范围条件：low <= 值 <= high
+
+    Args:
+        column (str): 数值列名，例如'重量(kg)'
+        low (float, optional): 下限
+        high (float, optional): 上限
+    """
+    return Predicate(column, 'value', low, high)
+
+
+def isin(column, values):
+    """取值集合条件：去除首尾空白后的值在values中
+
+    Args:
+        column (str): 列名，例如'商品名称'
+        values (iterable): 允许的取值
+    """
+    return Predicate(column, 'isin', values={str(value).strip() for value in values})
+
+
+def last_days(column, days, now=None):
+    """最近若干天的时间范围条件，例如last_days('订单时间', 7)表示最近一周"""
+    now = now or datetime.datetime.now()
+    return time_between(column, now - datetime.timedelta(days=days), None)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# 各模块按平铺方式互相导入，测试时把模块目录加入导入路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WEIGHING_HEADER = '订单号,商品名称,重量(kg),称重AD值,零点AD值,订单时间,创建时间'
+PRODUCTS = ('苹果', '梨', '香蕉', '土豆', '牛肉')
+
+
+@pytest.fixture
+def weighing_lines():
+    """生成模拟称重数据的CSV行（第一行为表头），包含超重、创建时间过晚和早于订单时间的记录"""
+    def make(count, seed=0, scale=1.0):
+        rng = np.random.default_rng(seed)
+        start = np.datetime64('2025-03-01T00:00:00')
+        lines = [WEIGHING_HEADER]
+        for i in range(count):
+            weight = 25.0 if i % 97 == 5 else round(float(rng.uniform(0.1, 8.0)), 3)
+            ad = int(8000 + weight * 25000 * scale * (1 + rng.normal(0, 0.01)))
+            order_time = start + np.timedelta64(i * 631, 's')
+            delay = 2 * 86400 if i % 53 == 7 else -600 if i % 89 == 3 else 30
+            create_time = order_time + np.timedelta64(delay, 's')
+            lines.append(f'O{i:06d},{PRODUCTS[int(rng.integers(len(PRODUCTS)))]},{weight},{ad},8000,'
+                         f'{str(order_time).replace("T", " ")},{str(create_time).replace("T", " ")}')
+        return lines
+    return make
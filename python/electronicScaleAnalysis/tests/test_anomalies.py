@@ -0,0 +1,74 @@
+import csv
+
+import pytest
+
+from column_cache import ColumnCache
+from csv_processor import CSVProcessor, find_weight_and_time_anomalies
+
+# 同一列混用多种写法：科学计数法的重量、斜杠和不补零的时间、带空白的商品名称、无法解析的行和缺列的短行
+MIXED_CSV = """订单号,商品名称,重量(kg),称重AD值,零点AD值,订单时间,创建时间,设备ID
+A1,苹果,2.5e1,130000,8000,2024/12/31 07:40,2024/12/31 07:41,D1
+A2, 梨 ,2.50,20500,8000,2025-2-3 4:05:06,2025-2-5 4:05:06,D1
+A3,香蕉,25.0,130000,8000,2025-02-03 04:05:06,2025-02-02 04:05:06,D1
+A4,,abc,1,2,bad,,D2
+A5,苹果,30,23000,8000,2025-02-03 05:00:00
+A6,苹果,1e1,58000,8000,2025-02-03T05:00:00,2025-02-03T05:01:00,D2
+"""
+
+
+@pytest.fixture
+def mixed_csv(tmp_path):
+    path = tmp_path / 'mixed.csv'
+    path.write_text(MIXED_CSV, encoding='utf-8')
+    return str(path)
+
+
+def read_dict_rows(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+@pytest.mark.parametrize('chunk_size, cached', [(50000, False), (2, False), (2, True)])
+def test_rows_keep_original_text(mixed_csv, tmp_path, chunk_size, cached):
+    processor = CSVProcessor(ColumnCache(str(tmp_path / 'cache')) if cached else None)
+    if cached:
+        processor.read_columns(mixed_csv, chunk_size=chunk_size)
+    columns = processor.read_columns(mixed_csv, chunk_size=chunk_size)
+
+    rows = read_dict_rows(mixed_csv)
+    parsed = set(columns.column_map.values())
+    assert [columns[i] for i in range(len(columns))] == [
+        {column: text for column, text in row.items() if column in parsed} for row in rows]
+    assert columns.original_rows(range(len(columns))) == rows
+    assert columns.original_rows([4, 1]) == [rows[4], rows[1]]
+
+
+def test_take_keeps_only_selected_raw_text(mixed_csv):
+    columns = CSVProcessor().read_columns(mixed_csv, chunk_size=2)
+    rows = read_dict_rows(mixed_csv)
+
+    taken = columns.take([5, 1])
+
+    assert [taken[i]['重量(kg)'] for i in range(2)] == ['1e1', '2.50']
+    assert taken[1]['订单时间'] == '2025-2-3 4:05:06'
+    assert taken.original_rows([0, 1]) == [rows[5], rows[1]]
+    assert all(len(positions) <= 2 for positions, _, _ in taken.raw.values())
+
+
+def test_anomalies_report_original_text(mixed_csv):
+    columns = CSVProcessor().read_columns(mixed_csv, chunk_size=2)
+    rows = read_dict_rows(mixed_csv)
+
+    weight_anomalies, time_anomalies = find_weight_and_time_anomalies(columns)
+
+    assert [anomaly['index'] for anomaly in weight_anomalies] == [1, 3, 5]
+    assert [anomaly['index'] for anomaly in time_anomalies] == [2, 3]
+    for anomaly in weight_anomalies + time_anomalies:
+        row = rows[anomaly['index'] - 1]
+        assert anomaly['product_name'] == row['商品名称']
+        assert anomaly['order_time'] == row['订单时间']
+        assert anomaly['create_time'] == row['创建时间']
+    assert weight_anomalies[0]['order_time'] == '2024/12/31 07:40'
+    assert weight_anomalies[2]['create_time'] is None
+    assert time_anomalies[0]['product_name'] == ' 梨 '
+    assert time_anomalies[0]['create_time'] == '2025-2-5 4:05:06'
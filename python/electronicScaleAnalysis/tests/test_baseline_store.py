@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+import csv_processor
+from baseline_store import BaselineStore
+
+
+def write(path, lines, mode='w'):
+    with open(path, mode, encoding='utf-8', newline='') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def file_ratios(path):
+    ratios, data = csv_processor.WeighingDataset(str(path), cache=None).ratios()
+    return ratios, data.values['time']
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BaselineStore(str(tmp_path / 'baselines'))
+
+
+def test_update_with_same_row_ids_does_not_double_count(store):
+    rng = np.random.default_rng(0)
+    ratios = rng.normal(3000, 20, 100)
+    times = np.datetime64('2025-03-01T00:00:00') + np.arange(100).astype('timedelta64[h]')
+    row_ids = np.arange(100)
+
+    assert store.update('D1', ratios, times, source='a.csv', row_ids=row_ids) == 100
+    assert store.update('D1', ratios, times, source='a.csv', row_ids=row_ids) == 0
+    # 部分重叠：只加入行号不小于已加入行数的比值
+    assert store.update('D1', ratios[50:], times[50:], source='a.csv', row_ids=row_ids[50:] + 30) == 30
+
+    baseline = store.baseline('D1')
+    assert len(baseline) == 130
+    assert baseline.stats.mean == pytest.approx(np.concatenate([ratios, ratios[70:]]).mean())
+    # 另一来源的行号单独计数
+    assert store.update('D1', ratios, times, source='b.csv', row_ids=row_ids) == 100
+
+
+def test_update_from_dataset_skips_unchanged_and_adds_appended_rows(tmp_path, store, weighing_lines, capsys):
+    lines = weighing_lines(600)
+    path = tmp_path / '设备D1_称重数据.csv'
+    write(path, lines[:401])
+    first = store.update_from_dataset(csv_processor.WeighingDataset(str(path), cache=None))
+    assert first == len(file_ratios(path)[0])
+
+    assert store.update_from_dataset(csv_processor.WeighingDataset(str(path), cache=None)) == 0
+    assert '没有变化' in capsys.readouterr().out
+
+    write(path, lines[401:], mode='a')
+    ratios, _ = file_ratios(path)
+    added = store.update_from_dataset(csv_processor.WeighingDataset(str(path), cache=None))
+    assert added == len(ratios) - first
+
+    baseline = store.baseline('D1')
+    assert len(baseline) == len(ratios)
+    assert baseline.stats.mean == pytest.approx(ratios.mean(), rel=1e-12)
+
+
+def test_rewritten_file_drops_its_previous_ratios(tmp_path, store, weighing_lines, capsys):
+    lines = weighing_lines(300)
+    path = tmp_path / '设备D1_称重数据.csv'
+    write(path, lines)
+    store.update_from_dataset(csv_processor.WeighingDataset(str(path), cache=None))
+    other = store.update('D1', np.array([1.0]), np.array(['2025-03-02T00:00:00'], dtype='datetime64[s]'),
+                         source='other')
+
+    fields = lines[1].split(',')
+    fields[3] = '9' * len(fields[3])  # 长度不变地改写第一行的AD值
+    lines[1] = ','.join(fields)
+    write(path, lines)
+    store.update_from_dataset(csv_processor.WeighingDataset(str(path), cache=None))
+    assert '撤回后重新加入' in capsys.readouterr().out
+
+    ratios, _ = file_ratios(path)
+    baseline = store.baseline('D1')
+    assert len(baseline) == len(ratios) + other
+    assert baseline.stats.max == pytest.approx(ratios.max())
+
+    assert store.drop_source('D1', 'other')
+    assert not store.drop_source('D1', 'other')
+    assert len(store.baseline('D1')) == len(ratios)
+
+
+@pytest.mark.parametrize('period, start, end', [('M', '2025-04', None), ('M', None, '2025-04'),
+                                                ('D', '2025-03-10', '2025-03-20')])
+def test_baseline_selects_windows(tmp_path, weighing_lines, period, start, end):
+    path = tmp_path / '设备D1_称重数据.csv'
+    write(path, weighing_lines(5000))
+    store = BaselineStore(str(tmp_path / 'baselines'), period=period)
+    store.update_from_dataset(csv_processor.WeighingDataset(str(path), cache=None))
+
+    ratios, times = file_ratios(path)
+    unit = 'datetime64[M]' if period == 'M' else 'datetime64[D]'
+    windows = times.astype(unit)
+    selected = np.ones(len(ratios), dtype=bool)
+    if start is not None:
+        selected &= windows >= np.datetime64(start).astype(unit)
+    if end is not None:
+        selected &= windows < np.datetime64(end).astype(unit)
+
+    baseline = store.baseline('D1', start, end)
+    assert 0 < len(baseline) < len(ratios)
+    assert len(baseline) == selected.sum()
+    assert baseline.stats.mean == pytest.approx(ratios[selected].mean(), rel=1e-12)
+    assert baseline.windows == sorted(set(windows[selected].astype(str).tolist()))
+    assert sum(store.windows('D1').values()) == len(ratios)
+    assert store.baseline('D1', '2030-01', None) is None
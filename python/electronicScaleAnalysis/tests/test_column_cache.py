@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+
+from column_cache import ColumnCache
+from csv_processor import CSVProcessor
+
+
+def write(path, lines):
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ColumnCache(str(tmp_path / 'cache'))
+
+
+def test_second_read_hits_cache(tmp_path, weighing_lines, cache):
+    path = write(tmp_path / 'data.csv', weighing_lines(500))
+    processor = CSVProcessor(cache)
+
+    parsed = processor.read_columns(path)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cached = processor.read_columns(path)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    assert np.array_equal(parsed.values['weight'], cached.values['weight'])
+    assert [parsed[i] for i in range(len(parsed))] == [cached[i] for i in range(len(cached))]
+    report = cache.report()
+    assert (report['hits'], report['misses'], report['entries']) == (1, 1, 1)
+
+
+def test_rewrite_with_same_size_invalidates(tmp_path, weighing_lines, cache):
+    lines = weighing_lines(500)
+    path = write(tmp_path / 'data.csv', lines)
+    processor = CSVProcessor(cache)
+    processor.read_columns(path)
+    stat = os.stat(path)
+
+    # 长度不变地改写第一行的重量，并恢复原来的修改时间，只能由内容哈希发现
+    fields = lines[1].split(',')
+    fields[2] = '9' * len(fields[2])
+    lines[1] = ','.join(fields)
+    write(tmp_path / 'data.csv', lines)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.path.getsize(path) == stat.st_size
+
+    columns = processor.read_columns(path)
+    assert cache.misses == 2 and cache.hits == 0
+    assert columns[0]['重量(kg)'] == fields[2]
+
+
+def test_mtime_change_invalidates(tmp_path, weighing_lines, cache):
+    path = write(tmp_path / 'data.csv', weighing_lines(200))
+    processor = CSVProcessor(cache)
+    processor.read_columns(path)
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    processor.read_columns(path)
+    assert (cache.hits, cache.misses) == (0, 2)
+    # 重新解析后写入了新的缓存
+    processor.read_columns(path)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, weighing_lines, cache):
+    lines = weighing_lines(300)
+    paths = [write(tmp_path / f'{name}.csv', lines) for name in 'abc']
+    processor = CSVProcessor(cache)
+    column_map = processor.read_columns(paths[0]).column_map
+    processor.read_columns(paths[1])
+    size = max(entry_size for _, entry_size, _ in cache.entries())
+    # 先让a成为较早使用的缓存，再读取a：命中时更新使用时间，b变为最久未使用
+    os.utime(cache.cache_path(paths[0]), ns=(1, 10 ** 9))
+    os.utime(cache.cache_path(paths[1]), ns=(1, 2 * 10 ** 9))
+    processor.read_columns(paths[0])
+    assert cache.hits == 1
+
+    cache.max_bytes = int(size * 2.5)
+    processor.read_columns(paths[2])
+
+    remaining = {path for path, _, _ in cache.entries()}
+    assert remaining == {cache.cache_path(paths[0]), cache.cache_path(paths[2])}
+    assert cache.report()['total_bytes'] <= cache.max_bytes
+    assert cache.load(paths[1], column_map) is None
+
+
+def test_entry_larger_than_limit_is_not_saved(tmp_path, weighing_lines):
+    cache = ColumnCache(str(tmp_path / 'cache'), max_bytes=1024)
+    path = write(tmp_path / 'data.csv', weighing_lines(300))
+    processor = CSVProcessor(cache)
+    processor.read_columns(path)
+    processor.read_columns(path)
+
+    assert cache.entries() == []
+    assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,84 @@
+import numpy as np
+
+import csv_processor
+from fleet_analysis import SKETCH_SEED, analyze_device, leave_one_out_peer_scores, rank_fleet_calibration
+from online_stats import RunningStats
+from quantile_sketch import KLLSketch
+
+
+def device_result(ratios):
+    ratios = np.asarray(ratios, dtype=np.float64)
+    return {
+        'ratio_stats': RunningStats().add_array(ratios).to_dict(),
+        'ratio_sketch': KLLSketch(seed=SKETCH_SEED).add_array(ratios).to_dict(),
+        'ratio_median': csv_processor.select_median(ratios)
+    }
+
+
+def write_device_csv(path, rng, count=3000, scale=1.0):
+    weights = rng.uniform(0.2, 5.0, count)
+    lines = ['订单号,商品名称,重量(kg),称重AD值,零点AD值,订单时间']
+    for i, weight in enumerate(weights.tolist()):
+        ad = 8000 + weight * 25000 * scale * (1 + rng.normal(0, 0.01))
+        lines.append(f'O{i},苹果,{weight:.3f},{ad:.0f},8000,2025-01-{1 + i // 200:02d} {i % 24:02d}:00:00')
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_drifted_device_among_identical_peers_is_ranked_first():
+    ratios = np.random.default_rng(1).normal(10000, 50, 2000)
+    devices = {f'D{k}': device_result(ratios) for k in range(3)}
+    devices['drift'] = device_result(ratios * 1.05)
+
+    ranking = rank_fleet_calibration(devices)
+
+    assert ranking.keys[0] == 'drift'
+    row = ranking.to_dict()['drift']
+    assert row['peer_z'] == np.inf
+    assert row['peer_severity'] == csv_processor.SEVERITY_SEVERE
+    assert row['peer_outlier'] == csv_processor.OUTLIER_HIGH
+    for device_id in ('D0', 'D1', 'D2'):
+        assert np.isfinite(ranking.to_dict()[device_id]['peer_z'])
+
+
+def test_drifted_device_among_near_identical_peers():
+    medians = np.array([10000.0, 10000.001, 9999.999, 10500.0])
+
+    z_scores, lower, upper = leave_one_out_peer_scores(medians)
+
+    assert z_scores[3] > 1e5
+    assert np.all(np.abs(z_scores[:3]) < 3)
+    assert medians[3] > upper[3]
+
+
+def test_identical_values_score_zero():
+    z_scores, _, _ = leave_one_out_peer_scores(np.full(4, 7.5))
+
+    assert np.array_equal(z_scores, np.zeros(4))
+
+
+def test_two_devices_are_not_ranked(capsys):
+    rng = np.random.default_rng(2)
+    devices = {'A': device_result(rng.normal(1, 0.1, 100)), 'B': device_result(rng.normal(2, 0.1, 100))}
+
+    assert rank_fleet_calibration(devices) is None
+    assert '至少需要3台' in capsys.readouterr().out
+    assert np.isnan(leave_one_out_peer_scores([1.0, 2.0])[0]).all()
+
+
+def test_identical_files_give_identical_outlier_rates(tmp_path):
+    rng = np.random.default_rng(3)
+    source = write_device_csv(tmp_path / 'source.csv', rng)
+    content = open(source, encoding='utf-8').read()
+    devices = {}
+    for k in range(3):
+        path = tmp_path / f'设备D{k}_称重数据.csv'
+        path.write_text(content, encoding='utf-8')
+        devices[f'D{k}'] = analyze_device(str(path))
+    devices['D3'] = analyze_device(write_device_csv(tmp_path / '设备D3_称重数据.csv', rng, scale=1.05))
+
+    ranking = rank_fleet_calibration(devices).to_dict()
+
+    rates = [ranking[f'D{k}']['fleet_outlier_rate'] for k in range(3)]
+    assert rates[0] == rates[1] == rates[2]
+    assert ranking['D3']['peer_z'] == np.inf
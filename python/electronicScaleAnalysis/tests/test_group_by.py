@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from group_by import aggregate
+
+AGGREGATIONS = {
+    '次数': ('w', 'count'),
+    '合计': ('w', 'sum'),
+    '均值': ('w', 'mean'),
+    '标准差': ('w', 'std'),
+    '最小': ('w', 'min'),
+    '最大': ('w', 'max'),
+    '中位数': ('w', 'median'),
+    'Q25': ('w', 'q25'),
+    'Q75': ('w', 'q75'),
+    'P90': ('w', 'quantile', 0.9),
+    'AD均值': ('ad', 'mean'),
+    'AD最大': ('ad', 'max'),
+}
+
+
+def reference(data):
+    """用NumPy逐组计算的参考结果"""
+    if len(data) == 0:
+        return {'count': 0, 'sum': 0.0, 'mean': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan,
+                'median': np.nan, 'q25': np.nan, 'q75': np.nan, 'quantile': np.nan}
+    return {
+        'count': len(data),
+        'sum': data.sum(),
+        'mean': data.mean(),
+        'std': data.std(ddof=1) if len(data) > 1 else 0.0,
+        'min': data.min(),
+        'max': data.max(),
+        'median': np.median(data),
+        'q25': np.percentile(data, 25),
+        'q75': np.percentile(data, 75),
+        'quantile': np.percentile(data, 90),
+    }
+
+
+@pytest.fixture
+def groups():
+    rng = np.random.default_rng(0)
+    count = 5000
+    keys = rng.choice(np.array(['苹果', '梨', '香蕉', '土豆', '牛肉']), count)
+    values = {'w': rng.gamma(2.0, 1.5, count), 'ad': rng.normal(30000, 500, count)}
+    values['w'][rng.random(count) < 0.05] = np.nan
+    masks = {'w': rng.random(count) > 0.1, 'ad': np.ones(count, dtype=bool)}
+    # 一个分组没有有效值，一个分组只有一个有效值
+    masks['w'][keys == '牛肉'] = False
+    single = np.flatnonzero(keys == '土豆')
+    masks['w'][single[1:]] = False
+    values['w'][single[0]] = 2.5
+    return keys, values, masks
+
+
+def test_matches_numpy_reference(groups):
+    keys, values, masks = groups
+
+    table = aggregate(keys, values, AGGREGATIONS, masks)
+
+    assert table.keys.tolist() == sorted(set(keys.tolist()))
+    result = table.to_dict()
+    for key in table.keys.tolist():
+        w = values['w'][(keys == key) & masks['w'] & ~np.isnan(values['w'])]
+        expected = reference(w)
+        for name, spec in AGGREGATIONS.items():
+            if spec[0] != 'w':
+                continue
+            func = spec[1]
+            np.testing.assert_allclose(result[key][name], expected[func], rtol=1e-12, equal_nan=True,
+                                       err_msg=f'{key} {name}')
+        ad = reference(values['ad'][keys == key])
+        np.testing.assert_allclose(result[key]['AD均值'], ad['mean'], rtol=1e-12)
+        assert result[key]['AD最大'] == ad['max']
+
+    assert result['牛肉']['次数'] == 0 and np.isnan(result['牛肉']['均值'])
+    assert result['土豆']['次数'] == 1 and result['土豆']['标准差'] == 0.0 and result['土豆']['P90'] == 2.5
+
+
+def test_without_masks_skips_nan(groups):
+    keys, values, _ = groups
+
+    result = aggregate(keys, values, {'次数': ('w', 'count'), '中位数': ('w', 'median')}).to_dict()
+
+    for key, row in result.items():
+        w = values['w'][keys == key]
+        assert row['次数'] == np.count_nonzero(~np.isnan(w))
+        assert row['中位数'] == pytest.approx(np.nanmedian(w), rel=1e-12)
+
+
+def test_dictionary_codes_match_string_keys(groups):
+    keys, values, masks = groups
+    names, codes = np.unique(keys, return_inverse=True)
+    # 名称顺序与代码顺序不同，检查结果按名称排序
+    shuffle = np.random.default_rng(1).permutation(len(names))
+    inverse = np.argsort(shuffle)
+
+    by_code = aggregate(inverse[codes.ravel()], values, AGGREGATIONS, masks, key_names=names[shuffle])
+    by_name = aggregate(keys, values, AGGREGATIONS, masks)
+
+    assert by_code.keys.tolist() == by_name.keys.tolist()
+    for name in AGGREGATIONS:
+        np.testing.assert_allclose(by_code[name], by_name[name], rtol=1e-12, equal_nan=True)
+
+
+def test_sort_by_puts_nan_last(groups):
+    keys, values, masks = groups
+    table = aggregate(keys, values, AGGREGATIONS, masks)
+
+    for descending in (True, False):
+        means = table.sort_by('均值', descending)['均值']
+        assert np.isnan(means[-1]) and not np.isnan(means[:-1]).any()
+        assert np.all(np.diff(means[:-1]) <= 0 if descending else np.diff(means[:-1]) >= 0)
+
+
+def test_unknown_aggregation_raises():
+    with pytest.raises(ValueError):
+        aggregate(np.array(['a']), {'w': np.array([1.0])}, {'x': ('w', 'mode')})
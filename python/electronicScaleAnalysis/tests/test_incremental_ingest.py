@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+import csv_processor
+from incremental_ingest import IncrementalAnalyzer
+
+
+def write(path, lines, mode='w'):
+    with open(path, mode, encoding='utf-8', newline='') as file:
+        file.write(lines)
+
+
+def batch_results(path):
+    dataset = csv_processor.WeighingDataset(str(path), cache=None)
+    return (csv_processor.time_based_weight_statistics(dataset),
+            csv_processor.detect_weight_and_time_anomalies(dataset))
+
+
+def assert_same_statistics(expected, actual):
+    assert list(expected) == list(actual)
+    for level in expected:
+        assert list(expected[level]) == list(actual[level]), level
+        for key, summary in expected[level].items():
+            for name in ('count', 'mean', 'std_dev', 'min', 'max'):
+                assert actual[level][key][name] == pytest.approx(summary[name], rel=1e-9), (level, key, name)
+            assert [tuple(item) for item in actual[level][key]['top3_products']] == \
+                [tuple(item) for item in summary['top3_products']]
+
+
+@pytest.fixture
+def analyzer_factory(tmp_path):
+    return lambda path: IncrementalAnalyzer(str(path), state_dir=str(tmp_path / 'state'))
+
+
+def test_refresh_append_refresh_matches_full_analysis(tmp_path, weighing_lines, analyzer_factory):
+    lines = weighing_lines(5000)
+    path = tmp_path / 'data.csv'
+    write(path, '\n'.join(lines[:3001]) + '\n')
+    assert analyzer_factory(path).refresh() == 3000
+
+    write(path, '\n'.join(lines[3001:]) + '\n', mode='a')
+    analyzer = analyzer_factory(path)  # 新对象从状态文件继续
+    assert analyzer.refresh() == 2000
+
+    statistics, anomalies = batch_results(path)
+    assert_same_statistics(statistics, analyzer.statistics())
+    assert analyzer.anomalies() == {key: anomalies[key] for key in analyzer.anomalies()}
+    assert anomalies['summary']['weight_anomaly_count'] > 0 and anomalies['summary']['time_anomaly_count'] > 0
+
+
+def test_partial_line_waits_for_next_refresh(tmp_path, weighing_lines, analyzer_factory):
+    lines = weighing_lines(20)
+    path = tmp_path / 'data.csv'
+    last = lines[10]
+    write(path, '\n'.join(lines[:10]) + '\n' + last[:12])
+    analyzer = analyzer_factory(path)
+    assert analyzer.refresh() == 9
+
+    write(path, last[12:] + '\n' + '\n'.join(lines[11:]) + '\n', mode='a')
+    assert analyzer.refresh() == 11
+    assert analyzer.refresh() == 0
+
+    statistics, anomalies = batch_results(path)
+    assert_same_statistics(statistics, analyzer.statistics())
+    assert analyzer.anomalies()['summary'] == anomalies['summary']
+
+
+@pytest.mark.parametrize('change', ['truncate', 'rewrite_first_row', 'rewrite_last_row'])
+def test_truncated_or_rewritten_file_is_reanalyzed(tmp_path, weighing_lines, analyzer_factory, change, capsys):
+    lines = weighing_lines(300)
+    path = tmp_path / 'data.csv'
+    write(path, '\n'.join(lines) + '\n')
+    analyzer = analyzer_factory(path)
+    analyzer.refresh()
+
+    if change == 'truncate':
+        lines = lines[:100]
+    else:
+        # 长度不变地改写一行的重量，只比较文件大小时检测不到
+        k = 1 if change == 'rewrite_first_row' else len(lines) - 1
+        fields = lines[k].split(',')
+        fields[2] = '9' * len(fields[2])
+        lines[k] = ','.join(fields)
+    write(path, '\n'.join(lines) + '\n')
+
+    analyzer.refresh()
+    assert '重新全量分析' in capsys.readouterr().out
+    statistics, anomalies = batch_results(path)
+    assert_same_statistics(statistics, analyzer.statistics())
+    assert analyzer.anomalies() == {key: anomalies[key] for key in analyzer.anomalies()}
+
+
+def test_uncommitted_anomaly_log_is_truncated(tmp_path, weighing_lines, analyzer_factory):
+    lines = weighing_lines(400)
+    path = tmp_path / 'data.csv'
+    write(path, '\n'.join(lines[:201]) + '\n')
+    analyzer = analyzer_factory(path)
+    analyzer.refresh()
+
+    # 模拟上次写入异常日志后、保存状态前中断：日志末尾多出未提交的内容
+    with open(analyzer.anomaly_log_path, 'a', encoding='utf-8') as file:
+        file.write('{"kind": "weight", "index": -1}\n')
+    write(path, '\n'.join(lines[201:]) + '\n', mode='a')
+    analyzer = analyzer_factory(path)
+    analyzer.refresh()
+
+    _, anomalies = batch_results(path)
+    result = analyzer.anomalies()
+    assert result['weight_anomalies'] == anomalies['weight_anomalies']
+    assert result['time_anomalies'] == anomalies['time_anomalies']
+    assert all(anomaly['index'] > 0 for anomaly in result['weight_anomalies'])
+    assert np.all(np.diff([anomaly['index'] for anomaly in result['weight_anomalies']]) > 0)
+
+
+@pytest.mark.parametrize('window, time_window', [(50, None), (1000, np.timedelta64(6, 'h'))])
+def test_streaming_drift_matches_batch(tmp_path, weighing_lines, window, time_window):
+    lines = weighing_lines(3000)
+    path = tmp_path / 'data.csv'
+    for part in (lines[:1001], lines[1001:1800], lines[1800:]):
+        write(path, '\n'.join(part) + '\n', mode='a')
+        analyzer = IncrementalAnalyzer(str(path), state_dir=str(tmp_path / 'state'), drift_window=window,
+                                       drift_time_window=time_window, drift_min_periods=10)
+        analyzer.refresh()
+
+    dataset = csv_processor.WeighingDataset(str(path), cache=None)
+    expected = csv_processor.detect_calibration_drift(dataset, window, time_window, min_periods=10)
+    result = analyzer.drift()
+    assert result['summary'] == pytest.approx(expected['summary'])
+    assert [anomaly['index'] for anomaly in result['anomalies']] == \
+        [anomaly['index'] for anomaly in expected['anomalies']]
+    for anomaly, reference in zip(result['anomalies'], expected['anomalies']):
+        assert anomaly['time'] == reference['time']
+        assert anomaly['anomaly'] == reference['anomaly']
+        assert anomaly['z_score'] == pytest.approx(reference['z_score'], rel=1e-9)
+        assert anomaly['baseline_mean'] == pytest.approx(reference['baseline_mean'], rel=1e-12)
+
+
+def test_changed_drift_settings_reanalyze(tmp_path, weighing_lines, capsys):
+    path = tmp_path / 'data.csv'
+    write(path, '\n'.join(weighing_lines(100)) + '\n')
+    IncrementalAnalyzer(str(path), state_dir=str(tmp_path / 'state')).refresh()
+
+    analyzer = IncrementalAnalyzer(str(path), state_dir=str(tmp_path / 'state'), drift_window=20)
+    assert '重新全量分析' in capsys.readouterr().out
+    assert analyzer.refresh() == 100
@@ -0,0 +1,40 @@
+import json
+
+import numpy as np
+import pytest
+
+from online_stats import RollingWindow, rolling_window_stats
+
+
+@pytest.mark.parametrize('window, time_window', [(1, None), (50, None), (None, np.timedelta64(90, 's'))])
+def test_rolling_window_matches_batch(window, time_window):
+    rng = np.random.default_rng(0)
+    values = rng.normal(5.0, 0.3, 2000)
+    # 时间有重复，检查同一时间的数据互不计入对方的窗口
+    times = np.datetime64('2025-01-01T00:00:00') + np.sort(rng.integers(0, 3000, 2000)).astype('timedelta64[s]')
+
+    expected = rolling_window_stats(values, times, window or 0, time_window)
+    rolling = RollingWindow(window or 0, time_window)
+    results = [rolling.push(value, time) for value, time in zip(values, times)]
+
+    counts, means, stds = (np.array(column) for column in zip(*results))
+    np.testing.assert_array_equal(counts, expected[0])
+    np.testing.assert_allclose(means, expected[1], rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(stds, expected[2], rtol=1e-7, equal_nan=True)
+
+
+@pytest.mark.parametrize('window, time_window', [(50, None), (None, np.timedelta64(90, 's'))])
+def test_rolling_window_resumes_from_dict(window, time_window):
+    rng = np.random.default_rng(1)
+    values = rng.normal(5.0, 0.3, 1000)
+    times = np.datetime64('2025-01-01T00:00:00') + np.sort(rng.integers(0, 1500, 1000)).astype('timedelta64[s]')
+
+    rolling = RollingWindow(window or 0, time_window)
+    expected = [rolling.push(value, time) for value, time in zip(values, times)]
+
+    rolling = RollingWindow(window or 0, time_window)
+    results = [rolling.push(value, time) for value, time in zip(values[:400], times[:400])]
+    rolling = RollingWindow.from_dict(json.loads(json.dumps(rolling.to_dict())))
+    results += [rolling.push(value, time) for value, time in zip(values[400:], times[400:])]
+
+    np.testing.assert_array_equal(np.array(results), np.array(expected))
@@ -0,0 +1,81 @@
+import csv
+
+import numpy as np
+import pytest
+
+import csv_processor
+from csv_processor import CSVProcessor
+from row_filters import isin, time_between, value_between
+
+
+@pytest.fixture(autouse=True)
+def parallel_small_files(monkeypatch):
+    # 测试文件很小，去掉并行解析的文件大小下限
+    monkeypatch.setattr(csv_processor, 'PARALLEL_MIN_BYTES', 0)
+
+
+def write(path, lines, trailing_newline=True):
+    path.write_text('\n'.join(lines) + ('\n' if trailing_newline else ''), encoding='utf-8')
+    return str(path)
+
+
+def assert_same_columns(expected, actual):
+    assert np.array_equal(expected.row_ids, actual.row_ids)
+    assert expected.values.keys() == actual.values.keys()
+    for role in expected.values:
+        assert np.array_equal(expected.masks[role], actual.masks[role]), role
+        valid = expected.masks[role]
+        assert np.array_equal(expected.values[role][valid], actual.values[role][valid]), role
+    assert [expected[i] for i in range(len(expected))] == [actual[i] for i in range(len(actual))]
+
+
+@pytest.mark.parametrize('trailing_newline', [True, False])
+def test_parallel_equals_serial(tmp_path, weighing_lines, trailing_newline):
+    path = write(tmp_path / 'data.csv', weighing_lines(3000), trailing_newline)
+    processor = CSVProcessor()
+    assert len(processor.split_byte_ranges(path, 4)[1]) == 4
+
+    serial = processor.read_columns(path)
+    parallel = processor.read_columns(path, workers=4, chunk_size=200)
+
+    assert_same_columns(serial, parallel)
+    assert np.array_equal(parallel.row_ids, np.arange(3000))
+
+
+@pytest.mark.parametrize('where', [
+    [time_between('订单时间', '2025-03-05', '2025-03-20')],
+    [value_between('重量(kg)', 1, 5), isin('商品名称', ['苹果', '梨'])],
+    [value_between('重量(kg)', 100, None)]
+])
+def test_parallel_where_keeps_file_row_ids(tmp_path, weighing_lines, where):
+    path = write(tmp_path / 'data.csv', weighing_lines(3000))
+    processor = CSVProcessor()
+
+    serial = processor.read_columns(path, where=where)
+    parallel = processor.read_columns(path, workers=4, where=where)
+
+    assert_same_columns(serial, parallel)
+    # 行序号是在原始文件中的序号，与逐行过滤得到的行一致
+    with open(path, encoding='utf-8', newline='') as file:
+        expected = [k for k, row in enumerate(csv.DictReader(file))
+                    if all(predicate.match(row[predicate.column]) for predicate in where)]
+    assert parallel.row_ids.tolist() == expected
+
+
+def test_quoted_fields_fall_back_to_serial(tmp_path, weighing_lines):
+    lines = weighing_lines(2000)
+    # 字段内带换行的行在文件中间，按字节切分时区间边界可能落在字段内部
+    for k in (700, 1000, 1300):
+        fields = lines[k].split(',')
+        fields[1] = f'"{fields[1]}\n礼盒, 特价"'
+        lines[k] = ','.join(fields)
+    path = write(tmp_path / 'quoted.csv', lines)
+    processor = CSVProcessor()
+
+    serial = processor.read_columns(path)
+    parallel = processor.read_columns(path, workers=4)
+
+    assert_same_columns(serial, parallel)
+    assert len(parallel) == 2000
+    assert parallel[999]['商品名称'].endswith('\n礼盒, 特价')
+    assert parallel.original_rows([999])[0]['订单号'] == 'O000999'
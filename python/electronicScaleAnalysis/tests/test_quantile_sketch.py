@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+
+from quantile_sketch import KLLSketch
+
+QS = np.linspace(0.01, 0.99, 99)
+
+
+@pytest.fixture(scope='module')
+def normals():
+    return np.random.default_rng(0).normal(10.0, 2.0, 200000)
+
+
+def rank_error(sketch, data):
+    """各分位点估计值的真实秩与分位点之差的最大值"""
+    ranks = np.searchsorted(np.sort(data), sketch.quantiles(QS)) / len(data)
+    return np.abs(ranks - QS).max()
+
+
+def build(data, parts=50, **kwargs):
+    sketch = KLLSketch(**kwargs)
+    for part in np.array_split(data, parts):
+        sketch.add_array(part)
+    return sketch
+
+
+@pytest.mark.parametrize('k, bound', [(2000, 1e-3), (200, 5e-3)])
+def test_rank_error(normals, k, bound):
+    sketch = build(normals, k=k, seed=0)
+
+    assert rank_error(sketch, normals) < bound
+    assert len(sketch) == len(normals)
+    assert sum(len(compactor) for compactor in sketch.compactors) < 3 * k
+
+
+def test_seeded_sketch_is_reproducible(normals):
+    first = build(normals, seed=7)
+    second = build(normals, seed=7)
+
+    assert first.to_dict() == second.to_dict()
+
+
+def test_small_data_is_exact():
+    data = np.random.default_rng(1).normal(size=100)
+    sketch = KLLSketch(seed=0).add_array(np.append(data, np.nan))
+
+    np.testing.assert_allclose(sketch.quantiles(QS), np.percentile(data, QS * 100))
+    assert len(sketch) == 100
+
+
+def test_merge(normals):
+    parts = np.array_split(normals, 4)
+    merged = KLLSketch(k=2000, seed=0)
+    for k, part in enumerate(parts):
+        merged.merge(build(part, parts=5, k=2000, seed=k + 1))
+
+    assert len(merged) == len(normals)
+    assert (merged.min, merged.max) == (normals.min(), normals.max())
+    assert rank_error(merged, normals) < 1e-3
+    assert merged.merge(KLLSketch()).to_dict() == merged.to_dict()
+
+
+def test_dict_round_trip(normals, tmp_path):
+    sketch = build(normals, seed=0)
+    restored = KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+    assert restored.to_dict() == sketch.to_dict()
+    np.testing.assert_array_equal(restored.quantiles(QS), sketch.quantiles(QS))
+    assert restored.median_absolute_deviation() == sketch.median_absolute_deviation()
+
+    path = str(tmp_path / 'sketch.json')
+    sketch.save(path)
+    assert KLLSketch.load(path).to_dict() == sketch.to_dict()
+    assert len(KLLSketch.load(str(tmp_path / 'missing.json'))) == 0
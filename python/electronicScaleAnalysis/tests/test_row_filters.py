@@ -0,0 +1,54 @@
+import pytest
+
+from column_cache import ColumnCache
+from csv_processor import CSVProcessor, project_column_map
+from row_filters import isin, time_between, value_between
+from weighing_columns import detect_columns
+
+WHERE = {
+    'none': None,
+    'time': [time_between('订单时间', '2025-03-05', '2025-03-20 12:00')],
+    'value_and_isin': [value_between('重量(kg)', 1, 5), isin('商品名称', ['苹果', '梨'])],
+    'unparsed_column': [isin('订单号', ['O000010', 'O000500', 'O001999'])],
+}
+
+
+@pytest.fixture
+def data_csv(tmp_path, weighing_lines):
+    lines = weighing_lines(2000)
+    # 夹杂不同写法的单元格：科学计数法、空重量、其它格式的时间、带空白的商品名称和缺列的短行
+    lines[11] = lines[11].replace(',8000,', ',8e3,').replace(',苹果,', ', 苹果 ,')
+    lines[200] = 'O000199,梨,3e0,83000,8000,2025/3/10 1:02:03,2025-03-10 01:03:00'
+    lines[300] = 'O000299,苹果,,83000,8000,2025-03-12 00:00:00,2025-03-12 00:01:00'
+    lines[400] = 'O000399,梨,2.5,70000,8000,2025-03-15 00:00:00'
+    path = tmp_path / 'data.csv'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def expected_rows(processor, path, roles, where):
+    fieldnames = processor.read_header(path)
+    parsed = set(project_column_map(detect_columns(fieldnames), roles).values())
+    return list(processor.iter_csv(path, [column for column in fieldnames if column in parsed], where))
+
+
+@pytest.mark.parametrize('roles', [None, ('weight', 'time'), ('product',)])
+@pytest.mark.parametrize('where', list(WHERE), ids=list(WHERE))
+def test_parsed_cached_and_iter_csv_agree(tmp_path, data_csv, roles, where):
+    where = WHERE[where]
+    processor = CSVProcessor()
+    cache = ColumnCache(str(tmp_path / 'cache'))
+    cached_processor = CSVProcessor(cache)
+    cached_processor.read_columns(data_csv)  # 写入完整数据的缓存
+
+    parsed = processor.read_columns(data_csv, roles=roles, where=where)
+    cached = cached_processor.read_columns(data_csv, roles=roles, where=where)
+    assert cache.hits == 1
+
+    expected = expected_rows(processor, data_csv, roles, where)
+    assert [parsed[i] for i in range(len(parsed))] == expected
+    assert [cached[i] for i in range(len(cached))] == expected
+    assert parsed.row_ids.tolist() == cached.row_ids.tolist()
+    assert parsed.original_rows(range(len(parsed))) == list(processor.iter_csv(data_csv, where=where))
+    if where:
+        assert 0 < len(parsed) < 2000
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from time_index import BLOCK_SIZE, SparseTable, TimeIndex
+
+
+@pytest.mark.parametrize('length', [1, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 5 * BLOCK_SIZE + 3, 1000])
+def test_sparse_table_block_edges(length):
+    rng = np.random.default_rng(length)
+    values = rng.normal(size=length)
+    table = SparseTable(values)
+
+    # 每个块边界及其前后一位，加上随机位置
+    edges = {0, length}
+    for k in range(length // BLOCK_SIZE + 1):
+        edges.update(position for position in (k * BLOCK_SIZE - 1, k * BLOCK_SIZE, k * BLOCK_SIZE + 1)
+                     if 0 <= position <= length)
+    edges.update(rng.integers(0, length + 1, 20).tolist())
+    for start in sorted(edges):
+        for end in sorted(edges):
+            if start >= end:
+                assert table.min(start, end) is None and table.max(start, end) is None
+                continue
+            assert table.min(start, end) == values[start:end].min(), (start, end)
+            assert table.max(start, end) == values[start:end].max(), (start, end)
+
+
+def test_sparse_table_empty():
+    table = SparseTable(np.empty(0))
+    assert table.min(0, 0) is None and table.max(0, 0) is None
+
+
+def brute_force(times, values, start, end):
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= start
+    if end is not None:
+        mask &= times < end
+    selected = values[mask]
+    if len(selected) == 0:
+        return None
+    return {
+        'count': len(selected),
+        'mean': selected.mean(),
+        'std_dev': selected.std(ddof=1) if len(selected) > 1 else 0.0,
+        'min': selected.min(),
+        'max': selected.max()
+    }
+
+
+def test_query_matches_brute_force():
+    rng = np.random.default_rng(0)
+    count = 20000
+    # 无序且有重复的时间
+    times = np.datetime64('2025-03-01T00:00:00') + rng.integers(0, 30 * 86400, count).astype('timedelta64[s]')
+    times[:500] = times[500]
+    values = rng.uniform(0.1, 8.0, count)
+    index = TimeIndex(times, values)
+    low, high = times.min(), times.max()
+
+    bounds = list(low + rng.integers(-3600, int((high - low) / np.timedelta64(1, 's')) + 3600, 400)
+                  .astype('timedelta64[s]'))
+    bounds += list(rng.choice(times, 100)) + [None, times[500]]
+    for _ in range(600):
+        start, end = (bounds[k] for k in rng.integers(len(bounds), size=2))
+        expected = brute_force(times, values, start, end)
+        result = index.query(start, end)
+        if expected is None:
+            assert result is None, (start, end)
+            continue
+        assert result['count'] == expected['count']
+        assert result['mean'] == pytest.approx(expected['mean'], rel=1e-9)
+        assert result['std_dev'] == pytest.approx(expected['std_dev'], rel=1e-6, abs=1e-6)
+        assert (result['min'], result['max']) == (expected['min'], expected['max'])
+
+
+def test_query_accepts_strings():
+    times = np.array(['2025-03-01T10:00:00', '2025-03-01T11:00:00', '2025-03-02T09:00:00'], dtype='datetime64[s]')
+    index = TimeIndex(times, np.array([1.0, 2.0, 4.0]))
+
+    assert index.query('2025-03-01 10:00:00', '2025-03-01 11:00:00')['count'] == 1
+    assert index.query('2025-03-01', '2025-03-02')['mean'] == 1.5
+    assert index.query('2025-03-03') is None
+    assert index.query()['max'] == 4.0
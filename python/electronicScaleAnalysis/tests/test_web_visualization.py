@@ -0,0 +1,34 @@
+import json
+import re
+
+from csv_processor import WeighingDataset, bucketed_weight_statistics
+from web_visualization import WebVisualizationGenerator
+
+CSV = """订单号,商品名称,重量(kg),称重AD值,零点AD值,订单时间,创建时间,设备ID
+A1,苹果,2.5,20000,8000,2025-01-05 05:59:00,2025-01-05 05:59:30,D1
+A2,梨,3.0,23000,8000,2025-01-05 06:00:00,2025-01-05 06:00:30,D1
+A3,苹果,1.5,15000,8000,2025-01-26 21:59:59,2025-01-26 22:00:00,D1
+A4,香蕉,4.0,29000,8000,2025-03-31 23:59:59,2025-04-01 00:00:10,D1
+"""
+
+
+def embedded(html, name):
+    return json.loads(re.search(rf'let {name} = (.*);\n', html).group(1))
+
+
+def test_report_embeds_bucketed_statistics(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text(CSV, encoding='utf-8')
+    dataset = WeighingDataset(str(path), cache=None)
+    frequencies = ['15min', 'shift:06:00,14:00,22:00', 'W', 'Q', 'fiscal_month:26']
+    bucket_data = {freq: bucketed_weight_statistics(dataset, freq) for freq in frequencies}
+
+    generator = WebVisualizationGenerator.__new__(WebVisualizationGenerator)
+    generator.output_dir = str(tmp_path)
+    html_path = generator.generate_html_page({}, bucket_data=bucket_data)
+    with open(html_path, encoding='utf-8') as file:
+        html = file.read()
+
+    assert embedded(html, 'bucketStatistics') == json.loads(json.dumps(bucket_data, ensure_ascii=False))
+    for freq in frequencies:
+        assert f'<option value="{freq}">' in html
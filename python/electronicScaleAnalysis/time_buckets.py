@@ -0,0 +1,173 @@
+import re
+import numpy as np
+
+# 固定时长的粒度：后缀到秒数
+FIXED_UNITS = {'min': 60, 'h': 3600}
+
+# 日历粒度
+CALENDAR_UNITS = ('D', 'W', 'M', 'Q', 'Y')
+
+# 1970-01-01是周四，ISO周从周一开始，周一相对纪元的天数偏移
+WEEK_OFFSET_DAYS = 4
+
+
+class BucketSpec:
+    """时间分组粒度，由parse_frequency创建
+
+    kind为'fixed'（固定秒数，例如15分钟、1小时）、'calendar'（日、ISO周、月、季度、年）、
+    'shift'（每天的班次分界时刻）或'fiscal_month'（每月从start_day日开始的财务月）。
+    """
+
+    def __init__(self, spec, kind, seconds=None, unit=None, boundaries=None, start_day=None):
+        self.spec = spec
+        self.kind = kind
+        self.seconds = seconds
+        self.unit = unit
+        self.boundaries = boundaries
+        self.start_day = start_day
+
+    def __repr__(self):
+        return f"BucketSpec({self.spec!r})"
+
+
+def parse_frequency(spec):
+    """解析时间分组粒度
+
+    Args:
+        spec (str | BucketSpec): 粒度，可选：
+            - '15min'、'30min'、'1h'、'2h' 等固定时长（从整点对齐）
+            - 'D'（日）、'W'（ISO周，周一开始）、'M'（月）、'Q'（季度）、'Y'（年）
+            - 'shift:06:00,14:00,22:00' 每天的班次起始时刻，第一个时刻之前的记录属于前一天的最后一个班次
+            - 'fiscal_month:26' 每月26日开始的财务月（起始日为1-28）
+
+    Returns:
+        BucketSpec: 解析后的粒度
+
+    Raises:
+        ValueError: 无法识别的粒度
+    """
+    if isinstance(spec, BucketSpec):
+        return spec
+    text = spec.strip()
+    match = re.fullmatch(r'(\d*)(min|h)', text, flags=re.IGNORECASE)
+    if match:
+        count = int(match.group(1) or 1)
+        seconds = count * FIXED_UNITS[match.group(2).lower()]
+        if count <= 0 or 86400 % seconds:
+            raise ValueError(f"时间粒度必须能整除一天: {spec}")
+        return BucketSpec(text, 'fixed', seconds=seconds)
+    if text.upper() in CALENDAR_UNITS:
+        return BucketSpec(text, 'calendar', unit=text.upper())
+    if text.startswith('shift:'):
+        boundaries = []
+        for part in text[len('shift:'):].split(','):
+            match = re.fullmatch(r'(\d{1,2}):(\d{2})', part.strip())
+            if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+                raise ValueError(f"无法识别的班次时刻: {part}")
+            boundaries.append(int(match.group(1)) * 3600 + int(match.group(2)) * 60)
+        boundaries = np.unique(boundaries)
+        return BucketSpec(text, 'shift', boundaries=boundaries)
+    if text.startswith('fiscal_month:'):
+        start_day = text[len('fiscal_month:'):].strip()
+        if not start_day.isdigit() or not 1 <= int(start_day) <= 28:
+            raise ValueError(f"财务月起始日必须为1-28: {spec}")
+        return BucketSpec(text, 'fiscal_month', start_day=int(start_day))
+    raise ValueError(f"无法识别的时间粒度: {spec}，可选: 15min、1h、D、W、M、Q、Y、shift:06:00,18:00、fiscal_month:26")
+
+
+def floor_times(times, freq):
+    """把时间整列向下取整到所在分组的起始时间
+
+    Args:
+        times (numpy.ndarray): datetime64时间数组，NaT保持为NaT
+        freq (str | BucketSpec): 时间粒度，见parse_frequency
+
+    Returns:
+        numpy.ndarray: datetime64[s]数组，每个元素为所在分组的起始时间
+    """
+    spec = parse_frequency(freq)
+    times = np.asarray(times).astype('datetime64[s]')
+    missing = np.isnat(times)
+    days = times.astype('datetime64[D]')
+
+    if spec.kind == 'fixed':
+        seconds = times.astype(np.int64)
+        floored = (seconds // spec.seconds * spec.seconds).astype('datetime64[s]')
+    elif spec.kind == 'shift':
+        # 当天已开始的最后一个班次；第一个班次之前属于前一天的最后一个班次
+        offsets = (times - days.astype('datetime64[s]')).astype(np.int64)
+        index = np.searchsorted(spec.boundaries, offsets, side='right') - 1
+        previous_day = index < 0
+        days = days - previous_day.astype('timedelta64[D]')
+        index[previous_day] = len(spec.boundaries) - 1
+        floored = days.astype('datetime64[s]') + spec.boundaries[index].astype('timedelta64[s]')
+    elif spec.kind == 'fiscal_month':
+        # 先减去(起始日-1)天，所在自然月即为财务月，再加回得到起始日期
+        shift = np.timedelta64(spec.start_day - 1, 'D')
+        floored = ((days - shift).astype('datetime64[M]').astype('datetime64[D]') + shift).astype('datetime64[s]')
+    elif spec.unit == 'W':
+        day_numbers = days.astype(np.int64)
+        mondays = (day_numbers - WEEK_OFFSET_DAYS) // 7 * 7 + WEEK_OFFSET_DAYS
+        floored = mondays.astype('datetime64[D]').astype('datetime64[s]')
+    elif spec.unit == 'Q':
+        months = times.astype('datetime64[M]').astype(np.int64)
+        floored = (months // 3 * 3).astype('datetime64[M]').astype('datetime64[s]')
+    else:
+        floored = times.astype(f'datetime64[{spec.unit}]').astype('datetime64[s]')
+
+    floored[missing] = np.datetime64('NaT')
+    return floored
+
+
+def bucket_labels(starts, freq):
+    """把分组起始时间转为显示用的标签
+
+    日为'2025-06-01'，ISO周为'2025-W23'（与time_based_weight_statistics一致），月为'2025-06'，
+    季度为'2025-Q2'，年为'2025'，财务月为起始日期，分钟、小时和班次为'2025-06-01 08:00'。
+
+    Args:
+        starts (numpy.ndarray): floor_times得到的分组起始时间
+        freq (str | BucketSpec): 时间粒度
+
+    Returns:
+        numpy.ndarray: 标签字符串数组
+    """
+    spec = parse_frequency(freq)
+    starts = np.asarray(starts).astype('datetime64[s]')
+    if spec.kind in ('fixed', 'shift'):
+        return np.char.replace(np.datetime_as_string(starts, unit='m'), 'T', ' ')
+    if spec.kind == 'fiscal_month' or spec.unit == 'D':
+        return np.datetime_as_string(starts, unit='D')
+    if spec.unit == 'M':
+        return np.datetime_as_string(starts, unit='M')
+    years = starts.astype('datetime64[Y]').astype(np.int64) + 1970
+    if spec.unit == 'Y':
+        return years.astype(str)
+    if spec.unit == 'Q':
+        quarters = starts.astype('datetime64[M]').astype(np.int64) % 12 // 3 + 1
+        return np.array([f"{year}-Q{quarter}" for year, quarter in zip(years.tolist(), quarters.tolist())])
+    # ISO周：所在周的周四属于哪一年，周数为该周四是当年的第几个周四
+    thursdays = starts.astype('datetime64[D]') + np.timedelta64(3, 'D')
+    iso_years = thursdays.astype('datetime64[Y]')
+    weeks = (thursdays - iso_years.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+    iso_years = iso_years.astype(np.int64) + 1970
+    return np.array([f"{year}-W{week:02d}" for year, week in zip(iso_years.tolist(), weeks.tolist())])
+
+
+def bucket_ids(times, freq):
+    """为每个时间分配整数分组编号，可直接作为group_by.aggregate或group_running_stats的分组键
+
+    Args:
+        times (numpy.ndarray): datetime64时间数组
+        freq (str | BucketSpec): 时间粒度，见parse_frequency
+
+    Returns:
+        tuple: (每行的分组编号数组（int64，按时间先后从0开始，NaT为-1）, 各分组的起始时间数组, 各分组的标签数组)
+    """
+    spec = parse_frequency(freq)
+    floored = floor_times(times, spec)
+    valid = ~np.isnat(floored)
+    ids = np.full(len(floored), -1, dtype=np.int64)
+    starts, codes = np.unique(floored[valid], return_inverse=True)
+    ids[valid] = codes.ravel()
+    return ids, starts, bucket_labels(starts, spec)
@@ -0,0 +1,183 @@
+import numpy as np
+from online_stats import RunningStats
+from row_filters import to_datetime64
+
+# 稀疏表按块建立，每块的元素个数
+BLOCK_SIZE = 64
+
+
+class SparseTable:
+    """区间最小值/最大值查询
+
+    数据按BLOCK_SIZE分块，对块的最小值和最大值建立稀疏表（第j层保存从每个块开始的2^j个块的最值），
+    查询时整块部分用两个重叠的2^j区间O(1)得到，首尾不足一块的部分直接在原数组上计算。
+    内存为 O(n / BLOCK_SIZE * log n)，而不是完整稀疏表的 O(n log n)。
+    """
+
+    def __init__(self, values):
+        """
+        Args:
+            values (numpy.ndarray): 一维数组，建立后不可修改
+        """
+        self.values = np.asarray(values, dtype=np.float64)
+        block_count = -(-len(self.values) // BLOCK_SIZE)
+        padded = np.full(block_count * BLOCK_SIZE, np.nan)
+        padded[:len(self.values)] = self.values
+        blocks = padded.reshape(block_count, BLOCK_SIZE)
+        self._min_levels = [np.nanmin(blocks, axis=1)] if block_count else []
+        self._max_levels = [np.nanmax(blocks, axis=1)] if block_count else []
+        width = 1
+        while width * 2 <= block_count:
+            low, high = self._min_levels[-1], self._max_levels[-1]
+            self._min_levels.append(np.minimum(low[:-width], low[width:]))
+            self._max_levels.append(np.maximum(high[:-width], high[width:]))
+            width *= 2
+
+    def _blocks(self, levels, reduce, first, last):
+        """第first到第last-1个块的最值"""
+        level = int(last - first).bit_length() - 1
+        table = levels[level]
+        return reduce(table[first], table[last - (1 << level)])
+
+    def _query(self, start, end, levels, reduce, array_reduce):
+        if start >= end:
+            return None
+        first = -(-start // BLOCK_SIZE)  # 第一个完整块
+        last = end // BLOCK_SIZE         # 最后一个完整块之后
+        if first >= last:
+            return float(array_reduce(self.values[start:end]))
+        result = self._blocks(levels, reduce, first, last)
+        if start < first * BLOCK_SIZE:
+            result = reduce(result, array_reduce(self.values[start:first * BLOCK_SIZE]))
+        if last * BLOCK_SIZE < end:
+            result = reduce(result, array_reduce(self.values[last * BLOCK_SIZE:end]))
+        return float(result)
+
+    def min(self, start, end):
+        """下标区间[start, end)内的最小值，区间为空时返回None"""
+        return self._query(start, end, self._min_levels, min, np.min)
+
+    def max(self, start, end):
+        """下标区间[start, end)内的最大值，区间为空时返回None"""
+        return self._query(start, end, self._max_levels, max, np.max)
+
+
+class TimeIndex:
+    """按时间排序的称重记录索引，用于任意时间区间的统计查询
+
+    建立时对时间排序一次，并计算重量的前缀和与前缀平方和（减去整体均值后再累加，避免大数相减损失精度），
+    之后任意区间的次数、均值、标准差由二分查找和两次前缀和相减得到，最小值和最大值由稀疏表得到，
+    每次查询为 O(log n)，不需要重新扫描文件或重新分组。
+    """
+
+    def __init__(self, times, values):
+        """
+        Args:
+            times (numpy.ndarray): datetime64时间数组
+            values (numpy.ndarray): 与时间一一对应的数值（例如重量）
+        """
+        order = np.argsort(times, kind='stable')
+        self.times = np.asarray(times)[order].astype('datetime64[s]')
+        self.values = np.asarray(values, dtype=np.float64)[order]
+        self.shift = float(self.values.mean()) if len(self.values) else 0.0
+        centered = self.values - self.shift
+        self._sums = np.concatenate(([0.0], np.cumsum(centered)))
+        self._squares = np.concatenate(([0.0], np.cumsum(centered * centered)))
+        self._table = SparseTable(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_columns(cls, columns, value_role='weight', positive_only=True):
+        """由列式数据建立索引
+
+        Args:
+            columns (WeighingColumns): 列式数据
+            value_role (str): 要统计的数值字段，默认重量
+            positive_only (bool): 是否只保留数值大于0的记录，与time_based_weight_statistics一致
+
+        Returns:
+            TimeIndex: 时间索引；缺少时间列或数值列时返回None
+        """
+        if not columns.has('time') or not columns.has(value_role):
+            return None
+        valid = columns.valid('time', value_role)
+        times = columns.values['time'][valid]
+        values = columns.values[value_role][valid]
+        if positive_only:
+            keep = values > 0
+            times, values = times[keep], values[keep]
+        return cls(times, values)
+
+    def locate(self, start=None, end=None):
+        """返回时间区间 start <= 时间 < end 在排序数组中的下标范围
+
+        Args:
+            start (str | datetime | datetime64, optional): 起始时间（包含），None表示不限
+            end (str | datetime | datetime64, optional): 结束时间（不包含），None表示不限
+
+        Returns:
+            tuple: (起始下标, 结束下标)
+        """
+        start, end = to_datetime64(start), to_datetime64(end)
+        first = 0 if start is None else int(np.searchsorted(self.times, start, side='left'))
+        last = len(self.times) if end is None else int(np.searchsorted(self.times, end, side='left'))
+        return first, max(first, last)
+
+    def running_stats(self, start=None, end=None):
+        """返回时间区间内数据的RunningStats，可以与其它统计量继续合并"""
+        first, last = self.locate(start, end)
+        count = last - first
+        if count == 0:
+            return RunningStats()
+        total = float(self._sums[last] - self._sums[first])
+        squares = float(self._squares[last] - self._squares[first])
+        m2 = max(squares - total * total / count, 0.0)
+        return RunningStats(count, self.shift + total / count, m2,
+                            self._table.min(first, last), self._table.max(first, last))
+
+    def query(self, start=None, end=None):
+        """统计时间区间 start <= 时间 < end 内的数据
+
+        Args:
+            start (str | datetime | datetime64, optional): 起始时间（包含），例如'2025-06-03 14:00:00'
+            end (str | datetime | datetime64, optional): 结束时间（不包含）
+
+        Returns:
+            dict: 与time_based_weight_statistics每个分组相同格式的统计结果
+                (count, mean, std_dev, min, max)，区间内没有数据时返回None
+        """
+        return self.running_stats(start, end).summary()
+
+    def to_dict(self, resolution=60):
+        """按固定时长汇总为可JSON序列化的字典，供网页中的区间查询使用
+
+        每个非空的时间段只输出一组汇总值，大小与时间段数有关而与记录数无关；网页中的查询按时间段
+        边界对齐，起止时间为resolution的整数倍时结果与query相同。
+
+        Args:
+            resolution (int): 时间段的秒数，默认为1分钟
+
+        Returns:
+            dict: resolution、shift（整体均值）以及按时间排序的各时间段的times（起始Unix时间戳，秒）、
+                counts（记录数）、sums（减去shift后的和）、squares（减去shift后的平方和）、mins、maxs
+        """
+        result = {'resolution': int(resolution), 'shift': self.shift}
+        if len(self.values) == 0:
+            result.update({key: [] for key in ('times', 'counts', 'sums', 'squares', 'mins', 'maxs')})
+            return result
+
+        # 时间已排序，同一时间段的记录连续，由前缀和直接得到每段的和与平方和
+        starts = self.times.astype(np.int64) // resolution * resolution
+        firsts = np.concatenate(([0], np.flatnonzero(np.diff(starts)) + 1))
+        lasts = np.append(firsts[1:], len(starts))
+        result.update({
+            'times': starts[firsts].tolist(),
+            'counts': (lasts - firsts).tolist(),
+            'sums': (self._sums[lasts] - self._sums[firsts]).tolist(),
+            'squares': (self._squares[lasts] - self._squares[firsts]).tolist(),
+            'mins': np.minimum.reduceat(self.values, firsts).tolist(),
+            'maxs': np.maximum.reduceat(self.values, firsts).tolist()
+        })
+        return result
@@ -0,0 +1,189 @@
+import datetime
+import numpy as np
+
+# 称重数据中出现过的时间格式
+TIME_FORMATS = [
+    '%Y-%m-%dT%H:%M:%S',  # ISO 8601格式: 2025-08-21T07:31:40
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d %H:%M',
+    '%Y-%m-%d',
+    '%Y/%m/%d'
+]
+
+# 格式指令对应的定长数字字段
+FIELD_WIDTHS = {'Y': 4, 'm': 2, 'd': 2, 'H': 2, 'M': 2, 'S': 2}
+
+
+def compile_format(fmt):
+    """把strptime格式编译为定长模板
+
+    Args:
+        fmt (str): strptime格式，只能包含%Y、%m、%d、%H、%M、%S和普通字符
+
+    Returns:
+        tuple: (模板长度, {字段: (起始位置, 宽度)}, {位置: 分隔字符})，格式不支持时返回None
+    """
+    fields = {}
+    literals = {}
+    position = 0
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == '%':
+            directive = fmt[i + 1:i + 2]
+            if directive not in FIELD_WIDTHS:
+                return None
+            fields[directive] = (position, FIELD_WIDTHS[directive])
+            position += FIELD_WIDTHS[directive]
+            i += 2
+        else:
+            literals[position] = fmt[i]
+            position += 1
+            i += 1
+    return position, fields, literals
+
+
+def parse_with_formats(text, formats=TIME_FORMATS):
+    """依次尝试各个格式解析单个时间字符串
+
+    Returns:
+        tuple: (datetime, 使用的格式)，全部失败时返回(None, None)
+    """
+    for fmt in formats:
+        try:
+            return datetime.datetime.strptime(text, fmt), fmt
+        except ValueError:
+            continue
+    return None, None
+
+
+class TimestampParser:
+    """按列推断时间格式并整列批量解析
+
+    先用一列开头的样本确定时间格式，之后对整列按该格式的定长模板做向量化解析；
+    只有不符合模板的行才逐行尝试所有格式。同一个解析器对象在多个数据块之间复用推断结果。
+    """
+
+    def __init__(self, formats=TIME_FORMATS, sample_size=200):
+        """
+        Args:
+            formats (list): 候选的strptime格式
+            sample_size (int): 推断格式时使用的非空样本数
+        """
+        self.formats = list(formats)
+        self.sample_size = sample_size
+        self.format = None
+        self.fallback_count = 0
+
+    def infer_format(self, strings):
+        """根据样本推断时间格式，选出能解析最多样本的格式
+
+        Args:
+            strings (list): 时间字符串列表
+
+        Returns:
+            str: 推断出的格式，所有样本都无法解析时返回None
+        """
+        sample = [text for text in strings[:self.sample_size * 10] if text][:self.sample_size]
+        counts = {}
+        for text in sample:
+            _, fmt = parse_with_formats(text, self.formats)
+            if fmt and compile_format(fmt):
+                counts[fmt] = counts.get(fmt, 0) + 1
+        return max(counts, key=counts.get) if counts else None
+
+    def parse(self, strings):
+        """把时间字符串列表解析为datetime64[s]数组
+
+        Args:
+            strings (list): 时间字符串列表
+
+        Returns:
+            tuple: (datetime64数组, 有效性掩码)
+        """
+        values, mask, _ = self.parse_exact(strings)
+        return values, mask
+
+    def parse_exact(self, strings):
+        """同parse，另外返回哪些行按推断格式的定长模板解析
+
+        按模板解析的行用推断格式strftime后与原文完全相同，其余有效行由其他格式逐行解析，原文写法无法还原。
+
+        Args:
+            strings (list): 时间字符串列表
+
+        Returns:
+            tuple: (datetime64数组, 有效性掩码, 按模板解析的掩码)
+        """
+        count = len(strings)
+        values = np.full(count, np.datetime64('NaT'), dtype='datetime64[s]')
+        mask = np.zeros(count, dtype=bool)
+        if count == 0:
+            return values, mask, mask.copy()
+
+        if self.format is None:
+            self.format = self.infer_format(strings)
+
+        texts = np.array(strings, dtype=str)
+        if self.format is not None:
+            fast_values, fast_mask = self._parse_template(texts, compile_format(self.format))
+            values[fast_mask] = fast_values[fast_mask]
+            mask |= fast_mask
+        # strftime的%Y不补零，四位以下的年份写法不同
+        exact = mask & (values >= np.datetime64('1000-01-01', 's'))
+
+        # 不符合推断格式的非空行逐行尝试所有格式
+        for i in np.flatnonzero(~mask & (np.char.str_len(texts) > 0)).tolist():
+            parsed, _ = parse_with_formats(strings[i], self.formats)
+            if parsed is not None:
+                values[i] = parsed
+                mask[i] = True
+            self.fallback_count += 1
+        return values, mask, exact
+
+    def _parse_template(self, texts, template):
+        """按定长模板整列解析：长度、分隔符、数字位和日期范围都符合才算有效"""
+        length, fields, literals = template
+        values = np.full(len(texts), np.datetime64('NaT'), dtype='datetime64[s]')
+        candidates = np.char.str_len(texts) == length
+        if not candidates.any():
+            return values, candidates
+
+        # 每个字符转为码点矩阵，一行对应一个时间字符串
+        codes = texts[candidates].astype(f'U{length}').view(np.uint32).reshape(-1, length)
+        ok = np.ones(len(codes), dtype=bool)
+        for position, char in literals.items():
+            ok &= codes[:, position] == ord(char)
+        digits = codes.astype(np.int64) - ord('0')
+
+        numbers = {}
+        for directive, (start, width) in fields.items():
+            part = digits[:, start:start + width]
+            ok &= ((part >= 0) & (part <= 9)).all(axis=1)
+            numbers[directive] = (part * (10 ** np.arange(width - 1, -1, -1))).sum(axis=1)
+
+        zeros = np.zeros(len(codes), dtype=np.int64)
+        year = numbers['Y']
+        month = numbers.get('m', zeros + 1)
+        day = numbers.get('d', zeros + 1)
+        hour = numbers.get('H', zeros)
+        minute = numbers.get('M', zeros)
+        second = numbers.get('S', zeros)
+        ok &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+        ok &= (hour <= 23) & (minute <= 59) & (second <= 59)
+
+        # 先只对合法的年月计算日期，再检查日期不超过当月天数
+        month_index = np.where(ok, (year - 1970) * 12 + month - 1, 0)
+        month_start = month_index.astype('datetime64[M]').astype('datetime64[D]')
+        month_days = ((month_index + 1).astype('datetime64[M]').astype('datetime64[D]') - month_start).astype(np.int64)
+        ok &= day <= month_days
+
+        seconds = (month_start + (day - 1)).astype('datetime64[s]') + (hour * 3600 + minute * 60 + second)
+        parsed = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[s]')
+        parsed[ok] = seconds[ok]
+
+        values[candidates] = parsed
+        valid = np.zeros(len(texts), dtype=bool)
+        valid[candidates] = ok
+        return values, valid
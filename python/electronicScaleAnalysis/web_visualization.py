@@ -4,6 +4,29 @@ import webbrowser
 from datetime import datetime
 import csv_processor
 
+# “自定义时间粒度”标签页提供的时间粒度（写法见time_buckets.parse_frequency）及其显示名称，
+# 各粒度的分组统计在生成报告时由bucketed_weight_statistics计算后嵌入网页
+BUCKET_FREQUENCIES = {
+    '15min': '15分钟',
+    '30min': '30分钟',
+    '1h': '1小时',
+    'shift:06:00,14:00,22:00': '三班倒',
+    'D': '每日',
+    'W': '每周(ISO)',
+    'M': '每月',
+    'Q': '每季度',
+    'fiscal_month:26': '财务月(26日开始)'
+}
+
+# 每个时间粒度嵌入网页的最大分组数，分组更多的粒度（例如长时间跨度的15分钟粒度）不加入报告，
+# 请直接调用bucketed_weight_statistics
+MAX_REPORT_BUCKETS = 5000
+
+# “自定义时间区间”查询嵌入的是按时间段汇总的时间索引（TimeIndex.to_dict），而不是每条记录；
+# 依次尝试下列时间段长度（秒），使用第一个时间段数不超过MAX_REPORT_TIME_SEGMENTS的长度作为查询精度
+REPORT_TIME_RESOLUTIONS = (60, 300, 900, 3600, 86400)
+MAX_REPORT_TIME_SEGMENTS = 50000
+
 class WebVisualizationGenerator:
     """生成称重数据可视化网页的工具类"""
     
@@ -15,8 +38,20 @@ class WebVisualizationGenerator:
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
     
-    def generate_html_page(self, statistics_data, anomaly_data=None, weight_time_anomaly_data=None):
-        """生成HTML页面"""
+    def generate_html_page(self, statistics_data, anomaly_data=None, weight_time_anomaly_data=None, time_index_data=None,
+                           bucket_data=None):
+        """生成HTML页面
+
+        Args:
+            statistics_data (dict): 按时间分组统计结果
+            anomaly_data (dict, optional): 失准异常分析结果
+            weight_time_anomaly_data (dict, optional): 重量和时间异常分析结果
+            time_index_data (dict, optional): TimeIndex.to_dict()按时间段汇总的结果，用于自定义时间区间查询
+            bucket_data (dict, optional): 时间粒度到bucketed_weight_statistics结果的映射，用于自定义时间粒度统计
+        """
+        bucket_data = bucket_data or {}
+        bucket_options = ''.join(
+            f'<option value="{freq}">{BUCKET_FREQUENCIES.get(freq, freq)}</option>' for freq in bucket_data)
         html_content = f"""
 <!DOCTYPE html>
 <html lang="zh-CN">
@@ -277,6 +312,21 @@ class WebVisualizationGenerator:
             box-shadow: 0 0 0 2px rgba(102, 126, 234, 0.2);
         }}
         
+        .range-query-form {{
+            display: flex;
+            align-items: center;
+            gap: 10px;
+            margin-bottom: 20px;
+            flex-wrap: wrap;
+        }}
+        
+        .range-query-form input {{
+            padding: 6px 8px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+            font-size: 0.9em;
+        }}
+        
         .table-wrapper {{
             overflow-x: auto;
             margin-bottom: 20px;
@@ -434,6 +484,8 @@ class WebVisualizationGenerator:
                     <button class="nav-tab" onclick="showTab('weeklyCompare')">⚖️ 周内 vs 周末</button>
                     <button class="nav-tab" onclick="showTab('anomaly')">🚨 失准异常分析</button>
                     <button class="nav-tab" onclick="showTab('weightTimeAnomaly')">⚠️ 行为异常分析</button>
+                    <button class="nav-tab" onclick="showTab('rangeQuery')">🔎 自定义时间区间</button>
+                    <button class="nav-tab" onclick="showTab('bucketStats')">⏱️ 自定义时间粒度</button>
                 </div>
                 
                 <div id="daily" class="tab-content active">
@@ -513,6 +565,27 @@ class WebVisualizationGenerator:
                         <div class="table-title">📋 Z-score异常数据详情列表</div>
                         <div id="anomaly-table"></div>
                     </div>
+                    
+                    <!-- 中位数/MAD（修正Z-score）检测结果 -->
+                    <div class="summary-stats" id="mad-anomaly-summary">
+                        <div class="summary-card">
+                            <h4>MAD异常率</h4>
+                            <div class="summary-value" id="mad-anomaly-rate">-</div>
+                        </div>
+                        <div class="summary-card">
+                            <h4>MAD轻度异常数</h4>
+                            <div class="summary-value" id="mad-mild-anomalies">-</div>
+                        </div>
+                        <div class="summary-card">
+                            <h4>MAD重度异常数</h4>
+                            <div class="summary-value" id="mad-severe-anomalies">-</div>
+                        </div>
+                    </div>
+                    
+                    <div class="data-table">
+                        <div class="table-title">📋 中位数/MAD（修正Z-score）异常数据详情列表</div>
+                        <div id="mad-anomaly-table"></div>
+                    </div>
 
                 </div>
                 
@@ -559,6 +632,49 @@ class WebVisualizationGenerator:
                         <div id="time-anomaly-table"></div>
                     </div>
                 </div>
+                
+                <div id="rangeQuery" class="tab-content">
+                    <div class="table-title">🔎 任意时间区间称重统计</div>
+                    <div class="range-query-form">
+                        <label>起始时间(包含):</label>
+                        <input type="datetime-local" id="range-start" step="60">
+                        <label>结束时间(不包含):</label>
+                        <input type="datetime-local" id="range-end" step="60">
+                        <button class="pagination-btn" onclick="renderRangeQuery()">查询</button>
+                        <span id="range-resolution"></span>
+                    </div>
+                    <div class="summary-stats" id="range-query-summary">
+                        <div class="summary-card">
+                            <h4>称重次数</h4>
+                            <div class="summary-value" id="range-count">-</div>
+                        </div>
+                        <div class="summary-card">
+                            <h4>重量均值</h4>
+                            <div class="summary-value" id="range-mean">-</div>
+                        </div>
+                        <div class="summary-card">
+                            <h4>重量标准差</h4>
+                            <div class="summary-value" id="range-std">-</div>
+                        </div>
+                        <div class="summary-card">
+                            <h4>最小 / 最大重量</h4>
+                            <div class="summary-value" id="range-min-max">-</div>
+                        </div>
+                    </div>
+                </div>
+                
+                <div id="bucketStats" class="tab-content">
+                    <div class="table-title">⏱️ 任意时间粒度称重统计</div>
+                    <div class="range-query-form">
+                        <label>时间粒度:</label>
+                        <select id="bucket-freq" onchange="paginationState.bucket.currentPage = 1; renderBucketStats()">{bucket_options}</select>
+                        <span id="bucket-message"></span>
+                    </div>
+                    <div class="chart-wrapper">
+                        <canvas id="bucketChart"></canvas>
+                    </div>
+                    <div id="bucket-table"></div>
+                </div>
             </div>
         </div>
     </div>
@@ -568,6 +684,8 @@ class WebVisualizationGenerator:
         let statisticsData = {json.dumps(statistics_data, ensure_ascii=False, default=str)};
         let anomalyData = {json.dumps(anomaly_data, ensure_ascii=False, default=str) if anomaly_data else 'null'};
         let weightTimeAnomalyData = {json.dumps(weight_time_anomaly_data, ensure_ascii=False, default=str) if weight_time_anomaly_data else 'null'};
+        let timeIndexData = {json.dumps(time_index_data) if time_index_data else 'null'};
+        let bucketStatistics = {json.dumps(bucket_data, ensure_ascii=False, default=str)};
         
         // 分页配置
         const paginationConfig = {{
@@ -582,7 +700,9 @@ class WebVisualizationGenerator:
             monthly: {{ currentPage: 1, totalPages: 1 }},
             weeklyCompare: {{ currentPage: 1, totalPages: 1 }},
             anomaly: {{ currentPage: 1, totalPages: 1 }},
+            madAnomaly: {{ currentPage: 1, totalPages: 1 }},
             weightTimeAnomaly: {{ currentPage: 1, totalPages: 1 }},
+            bucket: {{ currentPage: 1, totalPages: 1 }},
             weightAnomaly: {{ currentPage: 1, totalPages: 1 }},
             timeAnomaly: {{ currentPage: 1, totalPages: 1 }}
         }};
@@ -665,12 +785,18 @@ class WebVisualizationGenerator:
             }} else if (type === 'anomaly') {{
                 paginationState.anomaly.currentPage = Math.max(1, Math.min(page, paginationState.anomaly.totalPages));
                 renderAnomalyTableWithPagination(tableId, anomalyData ? anomalyData.z_score_anomalies : [], 'anomaly');
+            }} else if (type === 'mad-anomaly') {{
+                paginationState.madAnomaly.currentPage = Math.max(1, Math.min(page, paginationState.madAnomaly.totalPages));
+                renderAnomalyTableWithPagination(tableId, anomalyData ? anomalyData.mad_anomalies : [], 'mad-anomaly');
             }} else if (type === 'weight-anomaly') {{
                 paginationState.weightAnomaly.currentPage = Math.max(1, Math.min(page, paginationState.weightAnomaly.totalPages));
                 renderWeightTimeAnomalyTableWithPagination(tableId, weightTimeAnomalyData ? weightTimeAnomalyData.weight_anomalies : [], 'weight-anomaly');
             }} else if (type === 'time-anomaly') {{
                 paginationState.timeAnomaly.currentPage = Math.max(1, Math.min(page, paginationState.timeAnomaly.totalPages));
                 renderWeightTimeAnomalyTableWithPagination(tableId, weightTimeAnomalyData ? weightTimeAnomalyData.time_anomalies : [], 'time-anomaly');
+            }} else if (type === 'bucket') {{
+                paginationState.bucket.currentPage = Math.max(1, Math.min(page, paginationState.bucket.totalPages));
+                renderTableWithPagination(tableId, bucketData || {{}}, 'bucket');
             }} else {{
                 paginationState[type].currentPage = Math.max(1, Math.min(page, paginationState[type].totalPages));
                 renderTableWithPagination(tableId, statisticsData[type] || {{}}, type);
@@ -686,12 +812,18 @@ class WebVisualizationGenerator:
             }} else if (type === 'anomaly') {{
                 paginationState.anomaly.currentPage = 1;
                 renderAnomalyTableWithPagination(tableId, anomalyData ? anomalyData.z_score_anomalies : [], 'anomaly');
+            }} else if (type === 'mad-anomaly') {{
+                paginationState.madAnomaly.currentPage = 1;
+                renderAnomalyTableWithPagination(tableId, anomalyData ? anomalyData.mad_anomalies : [], 'mad-anomaly');
             }} else if (type === 'weight-anomaly') {{
                 paginationState.weightAnomaly.currentPage = 1;
                 renderWeightTimeAnomalyTableWithPagination(tableId, weightTimeAnomalyData ? weightTimeAnomalyData.weight_anomalies : [], 'weight-anomaly');
             }} else if (type === 'time-anomaly') {{
                 paginationState.timeAnomaly.currentPage = 1;
                 renderWeightTimeAnomalyTableWithPagination(tableId, weightTimeAnomalyData ? weightTimeAnomalyData.time_anomalies : [], 'time-anomaly');
+            }} else if (type === 'bucket') {{
+                paginationState.bucket.currentPage = 1;
+                renderTableWithPagination(tableId, bucketData || {{}}, 'bucket');
             }} else {{
                 paginationState[type].currentPage = 1;
                 renderTableWithPagination(tableId, statisticsData[type] || {{}}, type);
@@ -726,12 +858,17 @@ class WebVisualizationGenerator:
             }} else if (tabName === 'anomaly') {{
                 if (anomalyData) {{
                     renderAnomalyTableWithPagination('anomaly-table', anomalyData.z_score_anomalies || [], 'anomaly');
+                    renderAnomalyTableWithPagination('mad-anomaly-table', anomalyData.mad_anomalies || [], 'mad-anomaly');
                     renderAnomalyCharts();
                     renderAnomalySummary();
                 }} else {{
                     // 如果异常数据还未加载，显示加载提示
                     document.getElementById('anomaly-summary').innerHTML = '<div class="table-title">正在加载异常数据...</div>';
                 }}
+            }} else if (tabName === 'rangeQuery') {{
+                renderRangeQuery();
+            }} else if (tabName === 'bucketStats') {{
+                renderBucketStats();
             }} else if (tabName === 'weightTimeAnomaly') {{
                 if (weightTimeAnomalyData) {{
                     renderWeightTimeAnomalyTableWithPagination('weight-anomaly-table', weightTimeAnomalyData.weight_anomalies || [], 'weight-anomaly');
@@ -1214,6 +1351,8 @@ class WebVisualizationGenerator:
                     tableHTML += '<th>日期</th>';
                 }} else if (type === 'weekly') {{
                     tableHTML += '<th>周次</th>';
+                }} else if (type === 'bucket') {{
+                    tableHTML += '<th>时间分组</th>';
                 }} else {{
                     tableHTML += '<th>月份</th>';
                 }}
@@ -1247,7 +1386,7 @@ class WebVisualizationGenerator:
             tableContainer.innerHTML = tableHTML;
         }}
         
-        // 渲染异常数据表格（带分页）
+        // 渲染异常数据表格（带分页），type为'anomaly'（Z-score）或'mad-anomaly'（修正Z-score）
         function renderAnomalyTableWithPagination(tableId, anomalies, type) {{
             const tableContainer = document.getElementById(tableId);
             if (!anomalies || anomalies.length === 0) {{
@@ -1259,8 +1398,10 @@ class WebVisualizationGenerator:
             const totalPages = Math.ceil(totalItems / paginationConfig.pageSize);
             
             // 更新分页状态
-            paginationState.anomaly.totalPages = totalPages;
-            const currentPage = paginationState.anomaly.currentPage;
+            const isMad = type === 'mad-anomaly';
+            const state = isMad ? paginationState.madAnomaly : paginationState.anomaly;
+            state.totalPages = totalPages;
+            const currentPage = state.currentPage;
             
             // 计算当前页的数据范围
             const startIndex = (currentPage - 1) * paginationConfig.pageSize;
@@ -1273,7 +1414,7 @@ class WebVisualizationGenerator:
             // 生成表格HTML
             let tableHTML = paginationHTML + '<div class="table-wrapper">';
             tableHTML += '<table><thead><tr>' +
-                '<th>序号</th><th>Z-score值</th><th>异常程度</th><th>比值</th>' +
+                `<th>序号</th><th>${{isMad ? '修正Z-score值' : 'Z-score值'}}</th><th>异常程度</th><th>比值</th>` +
                 '<th>AD值</th><th>零点AD值</th><th>重量(kg)</th><th>商品名称</th>' +
                 '</tr></thead><tbody>';
 
@@ -1284,7 +1425,7 @@ class WebVisualizationGenerator:
                 
                 tableHTML += `<tr>
                     <td>${{globalIndex}}</td>
-                    <td>${{anomaly.z_score.toFixed(3)}}</td>
+                    <td>${{(isMad ? anomaly.modified_z : anomaly.z_score).toFixed(3)}}</td>
                     <td><span class="anomaly-severity ${{severityClass}}">${{anomaly.anomaly}}</span></td>
                     <td>${{anomaly.ratio.toFixed(4)}}</td>
                     <td>${{anomaly.ad_value || '-'}}</td>
@@ -1330,6 +1471,183 @@ class WebVisualizationGenerator:
             document.getElementById('total-days').textContent = validDays;
         }}
         
+        // 自定义时间区间查询：与time_index.TimeIndex相同，在按时间段汇总的数据上建立记录数、和与平方和的前缀和
+        // 以及按块的最小值/最大值稀疏表，每次查询为两次二分查找加O(1)的表查找，起止时间按时间段边界对齐
+        const RANGE_BLOCK_SIZE = 64;
+        let rangeIndex = null;
+        
+        function buildSparseLevels(values, reduce, identity) {{
+            const blockCount = Math.ceil(values.length / RANGE_BLOCK_SIZE);
+            const levels = [new Float64Array(blockCount).fill(identity)];
+            for (let i = 0; i < values.length; i++) {{
+                const block = Math.floor(i / RANGE_BLOCK_SIZE);
+                levels[0][block] = reduce(levels[0][block], values[i]);
+            }}
+            for (let width = 1; width * 2 <= blockCount; width *= 2) {{
+                const previous = levels[levels.length - 1];
+                const next = new Float64Array(previous.length - width);
+                for (let i = 0; i < next.length; i++) next[i] = reduce(previous[i], previous[i + width]);
+                levels.push(next);
+            }}
+            return levels;
+        }}
+        
+        function buildRangeIndex() {{
+            const data = timeIndexData;
+            const n = data.times.length;
+            const counts = new Float64Array(n + 1);
+            const sums = new Float64Array(n + 1);
+            const squares = new Float64Array(n + 1);
+            for (let i = 0; i < n; i++) {{
+                counts[i + 1] = counts[i] + data.counts[i];
+                sums[i + 1] = sums[i] + data.sums[i];
+                squares[i + 1] = squares[i] + data.squares[i];
+            }}
+            return {{
+                times: data.times, shift: data.shift, counts, sums, squares,
+                min: {{ values: data.mins, reduce: Math.min, identity: Infinity, levels: buildSparseLevels(data.mins, Math.min, Infinity) }},
+                max: {{ values: data.maxs, reduce: Math.max, identity: -Infinity, levels: buildSparseLevels(data.maxs, Math.max, -Infinity) }}
+            }};
+        }}
+        
+        // 第一个不小于target的位置
+        function lowerBound(array, target) {{
+            let low = 0, high = array.length;
+            while (low < high) {{
+                const mid = (low + high) >> 1;
+                if (array[mid] < target) low = mid + 1; else high = mid;
+            }}
+            return low;
+        }}
+        
+        function rangeExtreme(table, start, end) {{
+            const {{ values, reduce, levels }} = table;
+            const first = Math.ceil(start / RANGE_BLOCK_SIZE);
+            const last = Math.floor(end / RANGE_BLOCK_SIZE);
+            let result = table.identity;
+            if (first >= last) {{
+                for (let i = start; i < end; i++) result = reduce(result, values[i]);
+                return result;
+            }}
+            const level = Math.floor(Math.log2(last - first));
+            result = reduce(levels[level][first], levels[level][last - (1 << level)]);
+            for (let i = start; i < first * RANGE_BLOCK_SIZE; i++) result = reduce(result, values[i]);
+            for (let i = last * RANGE_BLOCK_SIZE; i < end; i++) result = reduce(result, values[i]);
+            return result;
+        }}
+        
+        // 统计起始时间满足 start <= 时间段起点 < end 的各时间段，时间为Unix时间戳（秒），区间内没有数据时返回null
+        function queryTimeRange(start, end) {{
+            if (!rangeIndex) rangeIndex = buildRangeIndex();
+            const first = lowerBound(rangeIndex.times, start);
+            const last = Math.max(first, lowerBound(rangeIndex.times, end));
+            const count = rangeIndex.counts[last] - rangeIndex.counts[first];
+            if (count === 0) return null;
+            const total = rangeIndex.sums[last] - rangeIndex.sums[first];
+            const squares = rangeIndex.squares[last] - rangeIndex.squares[first];
+            const m2 = Math.max(squares - total * total / count, 0);
+            return {{
+                count: count,
+                mean: rangeIndex.shift + total / count,
+                std_dev: count > 1 ? Math.sqrt(m2 / (count - 1)) : 0,
+                min: rangeExtreme(rangeIndex.min, first, last),
+                max: rangeExtreme(rangeIndex.max, first, last)
+            }};
+        }}
+        
+        // 时间戳与datetime-local输入框的值互相转换（数据中的时间没有时区，按UTC处理）
+        function formatRangeInput(seconds) {{
+            return new Date(seconds * 1000).toISOString().slice(0, 19);
+        }}
+        
+        function parseRangeInput(value) {{
+            return value ? Date.parse(value + 'Z') / 1000 : null;
+        }}
+        
+        function renderRangeQuery() {{
+            if (!timeIndexData || timeIndexData.times.length === 0) {{
+                document.getElementById('range-query-summary').innerHTML = '<div class="table-title">没有可查询的时间数据</div>';
+                return;
+            }}
+            const times = timeIndexData.times;
+            const resolution = timeIndexData.resolution;
+            const startInput = document.getElementById('range-start');
+            const endInput = document.getElementById('range-end');
+            startInput.step = endInput.step = resolution;
+            document.getElementById('range-resolution').textContent = `查询精度: ${{resolution >= 3600 ? resolution / 3600 + '小时' : resolution / 60 + '分钟'}}`;
+            if (!startInput.value) startInput.value = formatRangeInput(times[0]);
+            if (!endInput.value) endInput.value = formatRangeInput(times[times.length - 1] + resolution);
+            const start = parseRangeInput(startInput.value);
+            const end = parseRangeInput(endInput.value);
+            const stats = queryTimeRange(start, end);
+            document.getElementById('range-count').textContent = stats ? stats.count.toLocaleString() : '0';
+            document.getElementById('range-mean').textContent = stats ? stats.mean.toFixed(2) + ' kg' : '-';
+            document.getElementById('range-std').textContent = stats ? stats.std_dev.toFixed(2) + ' kg' : '-';
+            document.getElementById('range-min-max').textContent = stats ? `${{stats.min.toFixed(2)}} / ${{stats.max.toFixed(2)}}` : '-';
+        }}
+        
+        // 自定义时间粒度统计：各粒度的分组统计在生成报告时由bucketed_weight_statistics计算
+        let bucketData = null;
+        let bucketChart = null;
+        
+        function renderBucketStats() {{
+            const message = document.getElementById('bucket-message');
+            const freq = document.getElementById('bucket-freq').value;
+            if (!freq || !bucketStatistics[freq]) {{
+                message.textContent = '没有可统计的时间数据';
+                return;
+            }}
+            bucketData = bucketStatistics[freq];
+            const labels = Object.keys(bucketData).sort();
+            message.textContent = `共 ${{labels.length}} 个分组`;
+            
+            if (bucketChart) bucketChart.destroy();
+            bucketChart = new Chart(document.getElementById('bucketChart').getContext('2d'), {{
+                type: 'line',
+                data: {{
+                    labels: labels,
+                    datasets: [
+                        {{
+                            label: '称重次数',
+                            data: labels.map(label => bucketData[label].count),
+                            borderColor: '#667eea',
+                            backgroundColor: 'rgba(102, 126, 234, 0.1)',
+                            yAxisID: 'y',
+                            tension: 0.4
+                        }},
+                        {{
+                            label: '重量均值(kg)',
+                            data: labels.map(label => bucketData[label].mean),
+                            borderColor: '#f093fb',
+                            backgroundColor: 'rgba(240, 147, 251, 0.1)',
+                            yAxisID: 'y1',
+                            tension: 0.4
+                        }}
+                    ]
+                }},
+                options: {{
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    interaction: {{
+                        mode: 'index',
+                        intersect: false,
+                    }},
+                    scales: {{
+                        y: {{ type: 'linear', display: true, position: 'left', title: {{ display: true, text: '称重次数' }} }},
+                        y1: {{ type: 'linear', display: true, position: 'right', title: {{ display: true, text: '重量均值(kg)' }},
+                              grid: {{ drawOnChartArea: false }} }}
+                    }},
+                    plugins: {{
+                        title: {{
+                            display: true,
+                            text: '各时间分组称重次数与重量均值'
+                        }}
+                    }}
+                }}
+            }});
+            renderTableWithPagination('bucket-table', bucketData, 'bucket');
+        }}
+        
         // 异常分析相关函数（已简化，只保留Z-score）
         
 
@@ -1345,6 +1663,11 @@ class WebVisualizationGenerator:
             document.getElementById('z-anomaly-rate').textContent = summary.z_score_stats.anomaly_rate.toFixed(2) + '%';
             document.getElementById('mild-anomalies').textContent = summary.z_score_stats.mild_anomaly_count.toLocaleString();
             document.getElementById('severe-anomalies').textContent = summary.z_score_stats.severe_anomaly_count.toLocaleString();
+            if (summary.mad_stats) {{
+                document.getElementById('mad-anomaly-rate').textContent = summary.mad_stats.anomaly_rate.toFixed(2) + '%';
+                document.getElementById('mad-mild-anomalies').textContent = summary.mad_stats.mild_anomaly_count.toLocaleString();
+                document.getElementById('mad-severe-anomalies').textContent = summary.mad_stats.severe_anomaly_count.toLocaleString();
+            }}
         }}
         
         // 渲染异常分析图表
@@ -1542,13 +1865,27 @@ class WebVisualizationGenerator:
         
         return html_file_path
     
-    def generate_visualization(self):
-        """生成完整的可视化网页"""
+    def generate_visualization(self, data_file=None, bucket_frequencies=None):
+        """生成完整的可视化网页
+
+        Args:
+            data_file (str, optional): 称重CSV文件路径，可以是gzip或zstd压缩文件，
+                默认为csv_processor.DEFAULT_DATA_FILE
+            bucket_frequencies (list, optional): “自定义时间粒度”标签页提供的时间粒度，默认为BUCKET_FREQUENCIES；
+                无法识别或分组数超过MAX_REPORT_BUCKETS的粒度不加入报告
+        """
         print("正在生成称重数据可视化网页...")
         
         try:
+            # 数据文件只加载一次，三项分析共用同一个会话
+            data_file = data_file or csv_processor.DEFAULT_DATA_FILE
+            if not os.path.exists(data_file):
+                print(f"错误: 找不到数据文件 '{data_file}'")
+                return None
+            dataset = csv_processor.WeighingDataset(data_file)
+            
             # 调用csv_processor中的统计方法获取数据
-            statistics_data = csv_processor.time_based_weight_statistics()
+            statistics_data = csv_processor.time_based_weight_statistics(dataset)
             
             if not statistics_data:
                 print("错误: 无法获取统计数据")
@@ -1556,16 +1893,40 @@ class WebVisualizationGenerator:
             
             # 获取异常分析数据
             print("正在分析异常数据...")
-            anomaly_data = csv_processor.single_scale_example_usage()
+            anomaly_data = csv_processor.single_scale_example_usage(dataset)
             
             # 获取重量和时间异常数据
             print("正在分析重量和时间异常数据...")
-            weight_time_anomaly_data = csv_processor.detect_weight_and_time_anomalies()
+            weight_time_anomaly_data = csv_processor.detect_weight_and_time_anomalies(dataset)
+            
+            # 自定义时间区间查询使用按时间段汇总的时间索引，网页大小与记录数无关
+            time_index = dataset.time_index()
+            time_index_data = None
+            if time_index:
+                for resolution in REPORT_TIME_RESOLUTIONS:
+                    time_index_data = time_index.to_dict(resolution)
+                    if len(time_index_data['times']) <= MAX_REPORT_TIME_SEGMENTS:
+                        break
+            
+            # 自定义时间粒度的分组统计，与bucketed_weight_statistics的结果相同
+            bucket_data = {}
+            for freq in bucket_frequencies or BUCKET_FREQUENCIES:
+                try:
+                    buckets = csv_processor.bucketed_weight_statistics(dataset, freq)
+                except ValueError as e:
+                    print(f"警告: {e}")
+                    continue
+                if buckets and len(buckets) > MAX_REPORT_BUCKETS:
+                    print(f"警告: 时间粒度 {freq} 共 {len(buckets)} 个分组，超过 {MAX_REPORT_BUCKETS} 个，不加入报告")
+                    continue
+                bucket_data[freq] = buckets
             
             # 生成HTML页面
-            html_file_path = self.generate_html_page(statistics_data, anomaly_data, weight_time_anomaly_data)
+            html_file_path = self.generate_html_page(statistics_data, anomaly_data, weight_time_anomaly_data,
+                                                     time_index_data, bucket_data)
             
             print(f"可视化网页已生成: {html_file_path}")
+            csv_processor.column_cache.print_report()
             
             # 自动打开浏览器
             try:
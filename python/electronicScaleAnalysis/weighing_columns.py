@@ -0,0 +1,433 @@
+import csv
+import numpy as np
+from compressed_io import open_text
+from time_parsing import TimestampParser
+
+# 各字段的类型：数值列、时间列和文本列
+NUMERIC_ROLES = ('ad', 'zero_ad', 'weight')
+TIME_ROLES = ('time', 'order_time', 'create_time')
+TEXT_ROLES = ('product',)
+ALL_ROLES = NUMERIC_ROLES + TIME_ROLES + TEXT_ROLES
+
+
+def detect_columns(fieldnames, ad_column='称重AD值', zero_ad_column='零点AD值', weight_column='重量(kg)'):
+    """根据表头识别称重数据各字段对应的列名
+
+    Args:
+        fieldnames (list): CSV表头列名列表
+        ad_column (str): 称重AD值列名
+        zero_ad_column (str): 零点AD值列名
+        weight_column (str): 重量值列名，表头中没有该列时使用第一个包含"重量"的列
+
+    Returns:
+        dict: 字段名到列名的映射，找不到的字段值为None
+    """
+    def first(match):
+        for col in fieldnames:
+            if match(col):
+                return col
+        return None
+
+    return {
+        'ad': ad_column if ad_column in fieldnames else None,
+        'zero_ad': zero_ad_column if zero_ad_column in fieldnames else None,
+        'weight': weight_column if weight_column in fieldnames else first(lambda col: '重量' in col),
+        'time': first(lambda col: '时间' in col),
+        'order_time': first(lambda col: '订单时间' in col or '称重时间' in col),
+        'create_time': first(lambda col: '创建时间' in col),
+        'product': first(lambda col: ('商品' in col) or ('品名' in col) or ('产品' in col) or ('菜品' in col)),
+    }
+
+
+def parse_float_column(strings):
+    """把字符串列表解析为float64数组
+
+    Args:
+        strings (list): 字符串列表
+
+    Returns:
+        tuple: (数值数组, 有效性掩码)，无法解析的位置值为NaN、掩码为False
+    """
+    try:
+        values = np.array(strings, dtype=str).astype(np.float64)
+        return values, np.ones(len(values), dtype=bool)
+    except ValueError:
+        pass
+
+    # 整列批量转换失败时才逐个解析
+    values = np.full(len(strings), np.nan)
+    mask = np.zeros(len(strings), dtype=bool)
+    for i, text in enumerate(strings):
+        try:
+            values[i] = float(text)
+            mask[i] = True
+        except (ValueError, TypeError):
+            continue
+    return values, mask
+
+
+def format_numbers(values):
+    """把数值数组格式化为CSV中的写法，整数不带小数点
+
+    Args:
+        values (numpy.ndarray): float64数组
+
+    Returns:
+        numpy.ndarray: 字符串数组
+    """
+    values = np.asarray(values, dtype=np.float64)
+    integral = (values == np.floor(values)) & (np.abs(values) < 1e15)
+    return np.where(integral, np.where(integral, values, 0).astype(np.int64).astype(str), values.astype(str))
+
+
+class WeighingColumns:
+    """称重数据的列式存储
+
+    AD值、零点AD值和重量保存为float64数组，时间列保存为datetime64[s]数组，
+    商品名称按字典编码保存：values中为int32代码数组，categories中为代码对应的原始字符串，
+    每个不同的名称只保存一次。每一列都带有有效性掩码。
+    对象本身也可以像行字典列表一样按下标访问，行字典只在访问时才生成，值为CSV中的原始文本：
+    大多数单元格由解析后的值还原（与原文相同），只有无法还原的单元格（例如科学计数法的数值、
+    不符合推断格式的时间、无法解析的文本、短行中缺少的单元格）在raw中稀疏保存原文。
+    未解析的列（例如订单号、设备ID）不驻留内存，需要时用original_rows按行序号从源文件重新读取。
+    """
+
+    def __init__(self, fieldnames, column_map, values, masks, row_ids, time_formats=None, categories=None,
+                 raw=None, source=None):
+        """
+        Args:
+            fieldnames (list): 原始CSV表头
+            column_map (dict): 字段名到列名的映射
+            values (dict): 字段名到数据数组的映射
+            masks (dict): 字段名到有效性掩码的映射
+            row_ids (numpy.ndarray): 每行在原始文件中的序号（从0开始）
+            time_formats (dict, optional): 时间字段使用的时间格式，用于还原原始写法
+            categories (dict, optional): 文本字段到字典（代码对应的字符串数组）的映射
+            raw (dict, optional): 列名到 (行下标数组, 原始文本数组, 是否缺少该单元格) 的映射，
+                只包含由解析后的值无法还原原文的单元格，行下标升序
+            source (str, optional): 数据来源的CSV文件路径，用于重新读取完整的原始行
+        """
+        self.fieldnames = list(fieldnames)
+        self.column_map = dict(column_map)
+        self.values = values
+        self.masks = masks
+        self.row_ids = row_ids
+        self.time_formats = time_formats or {}
+        self.categories = categories or {}
+        self.raw = raw or {}
+        self.source = source
+
+    @classmethod
+    def from_rows(cls, rows, fieldnames, column_map, row_offset=0, time_parsers=None, row_ids=None,
+                  dictionaries=None):
+        """把一批CSV行（列表形式）解析为列式数据
+
+        Args:
+            rows (list): csv.reader产生的行列表
+            fieldnames (list): CSV表头
+            column_map (dict): 字段名到列名的映射
+            row_offset (int): 第一行在原始文件中的序号
+            time_parsers (dict, optional): 列名到TimestampParser的映射。
+                逐块解析同一文件时传入同一个字典，时间格式每列只推断一次
+            row_ids (numpy.ndarray, optional): 每行在原始文件中的序号，
+                行经过过滤不再连续时传入，此时忽略row_offset
+            dictionaries (dict, optional): 列名到 {字符串: 代码} 字典的映射。
+                逐块解析同一文件时传入同一个字典，各块的文本代码一致
+
+        Returns:
+            WeighingColumns: 解析后的列式数据
+        """
+        if time_parsers is None:
+            time_parsers = {}
+        if dictionaries is None:
+            dictionaries = {}
+        lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+
+        values = {}
+        masks = {}
+        time_formats = {}
+        categories = {}
+        raw = {}
+        parsed = {}
+        for role in ALL_ROLES:
+            column = column_map.get(role)
+            if column is None or column not in fieldnames:
+                continue
+            # 不同字段可能对应同一列（例如时间列和订单时间列），只解析一次
+            if column in parsed:
+                source = parsed[column]
+                values[role], masks[role] = values[source], masks[source]
+                if source in time_formats:
+                    time_formats[role] = time_formats[source]
+                if source in categories:
+                    categories[role] = categories[source]
+                continue
+            parsed[column] = role
+
+            index = fieldnames.index(column)
+            strings = [row[index] if index < len(row) else '' for row in rows]
+            missing = lengths <= index  # 与DictReader一致，缺少的单元格为None
+            lossy = missing.copy()
+            texts = np.array(strings, dtype=str)
+            if role in NUMERIC_ROLES:
+                values[role], masks[role] = parse_float_column(strings)
+                rendered = np.where(masks[role], format_numbers(values[role]), '')
+                lossy |= texts != rendered
+            elif role in TIME_ROLES:
+                parser = time_parsers.setdefault(column, TimestampParser())
+                values[role], masks[role], exact = parser.parse_exact(strings)
+                time_formats[role] = parser.format
+                lossy |= ~exact & (np.char.str_len(texts) > 0)
+            else:
+                # 每个字符串只查一次字典，相同的名称共用同一个代码
+                dictionary = dictionaries.setdefault(column, {})
+                values[role] = np.fromiter((dictionary.setdefault(text, len(dictionary)) for text in strings),
+                                           dtype=np.int32, count=len(strings))
+                categories[role] = np.array(list(dictionary), dtype=str)
+            if role in TEXT_ROLES:
+                filled = np.array([bool(text.strip()) for text in categories[role].tolist()], dtype=bool)
+                masks[role] = filled[values[role]]
+            positions = np.flatnonzero(lossy)
+            raw[column] = (positions, texts[positions], missing[positions])
+
+        if row_ids is None:
+            row_ids = np.arange(row_offset, row_offset + len(rows), dtype=np.int64)
+        return cls(fieldnames, column_map, values, masks, row_ids, time_formats, categories, raw)
+
+    @classmethod
+    def concat(cls, parts, fieldnames, column_map):
+        """按顺序拼接多个列式数据块
+
+        Args:
+            parts (list): WeighingColumns列表
+            fieldnames (list): CSV表头
+            column_map (dict): 字段名到列名的映射
+
+        Returns:
+            WeighingColumns: 拼接后的列式数据
+        """
+        if not parts:
+            return cls.from_rows([], fieldnames, column_map)
+        if len(parts) == 1:
+            return parts[0]
+
+        # 各块的字典可能不同（例如多进程分别解析），合并字典并把各块的代码映射到合并后的字典
+        categories = {}
+        codes = {}
+        for role in parts[0].categories:
+            merged = {}
+            codes[role] = []
+            for part in parts:
+                remap = np.array([merged.setdefault(name, len(merged)) for name in part.categories[role].tolist()],
+                                 dtype=np.int32)
+                codes[role].append(remap[part.values[role]] if len(remap) else part.values[role])
+            categories[role] = np.array(list(merged), dtype=str)
+
+        values, masks = parts[0]._map_arrays(
+            lambda role, attr: np.concatenate(codes[role] if attr == 'values' and role in codes
+                                              else [getattr(part, attr)[role] for part in parts]))
+        row_ids = np.concatenate([part.row_ids for part in parts])
+
+        # 各块分别推断的时间格式以第一块为准
+        time_formats = {}
+        for part in parts:
+            for role, fmt in part.time_formats.items():
+                if fmt and role not in time_formats:
+                    time_formats[role] = fmt
+
+        # 原文的行下标加上之前各块的行数；时间格式与第一块不同的块，其按模板解析的单元格也要保存原文
+        raw = {}
+        offsets = np.cumsum([0] + [len(part) for part in parts[:-1]])
+        for column in parts[0].raw:
+            pieces = [part._raw_for_format(column, time_formats) for part in parts]
+            raw[column] = (np.concatenate([positions + offset for (positions, _, _), offset in zip(pieces, offsets)]),
+                           np.concatenate([texts for _, texts, _ in pieces]),
+                           np.concatenate([missing for _, _, missing in pieces]))
+        return cls(fieldnames, column_map, values, masks, row_ids, time_formats, categories, raw, parts[0].source)
+
+    def _raw_for_format(self, column, time_formats):
+        """返回某列按time_formats还原时需要保存的原文（见concat）"""
+        positions, texts, missing = self.raw[column]
+        for role, fmt in self.time_formats.items():
+            if self.column_map.get(role) != column or not fmt or fmt == time_formats.get(role):
+                continue
+            extra = np.setdiff1d(np.flatnonzero(self.masks[role]), positions)
+            positions = np.concatenate([positions, extra])
+            texts = np.concatenate([texts, np.array(self.strings(role, extra), dtype=str)])
+            missing = np.concatenate([missing, np.zeros(len(extra), dtype=bool)])
+            order = np.argsort(positions, kind='stable')
+            return positions[order], texts[order], missing[order]
+        return positions, texts, missing
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def __getitem__(self, i):
+        """生成第i行已解析各列的行字典，键为原始列名，值为原始文本（行中缺少该列时为None）
+
+        未解析的列不在行字典中，完整的原始行见original_rows。
+        """
+        row = {}
+        roles = {}
+        for role, column in self.column_map.items():
+            if role in self.values:
+                roles.setdefault(column, role)
+        for column in self.fieldnames:
+            if column in roles:
+                row[column] = self.strings(roles[column], np.array([i]))[0]
+        return row
+
+    def strings(self, role, indices):
+        """把部分行的某个字段还原为原始文本，与行字典中的值相同，不生成整行的字典
+
+        Args:
+            role (str): 字段名
+            indices (numpy.ndarray): 行下标
+
+        Returns:
+            list: 字符串列表，行中缺少该列时为None
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        values = self.values[role][indices]
+        valid = self.masks[role][indices]
+        if role in self.categories:
+            texts = self.categories[role][values].astype(str).tolist()
+        elif role in TEXT_ROLES:
+            texts = [str(value) for value in values.tolist()]
+        elif role in NUMERIC_ROLES:
+            texts = np.where(valid, format_numbers(values), '').tolist()
+        else:
+            texts = [self.format_time(role, value) if ok else '' for value, ok in zip(values, valid.tolist())]
+
+        column = self.column_map.get(role)
+        if column in self.raw:
+            hit, slots = self._raw_slots(column, indices)
+            _, raw_texts, missing = self.raw[column]
+            for k, slot in zip(np.flatnonzero(hit).tolist(), slots[hit].tolist()):
+                texts[k] = None if missing[slot] else str(raw_texts[slot])
+        return texts
+
+    def _raw_slots(self, column, indices):
+        """查找indices中哪些行保存了原文
+
+        Returns:
+            tuple: (是否保存了原文的掩码, 对应的原文下标)
+        """
+        positions = self.raw[column][0]
+        if not len(positions):
+            return np.zeros(len(indices), dtype=bool), np.zeros(len(indices), dtype=np.int64)
+        slots = np.minimum(np.searchsorted(positions, indices), len(positions) - 1)
+        return positions[slots] == indices, slots
+
+    def original_rows(self, indices):
+        """从源文件重新读取部分行的完整原始行，只扫描一遍文件，与DictReader读出的行相同
+
+        Args:
+            indices (iterable): 行下标
+
+        Returns:
+            list: 行字典列表，顺序与indices相同。没有源文件时返回已解析各列的行字典（见__getitem__）
+        """
+        indices = np.asarray(list(indices) if not isinstance(indices, np.ndarray) else indices, dtype=np.int64)
+        if self.source is None or not len(indices):
+            return [self[i] for i in indices.tolist()]
+
+        wanted = set(self.row_ids[indices].tolist())
+        last = max(wanted)
+        found = {}
+        with open_text(self.source) as file:
+            reader = csv.DictReader(file)
+            for row_id, row in enumerate(reader):
+                if row_id in wanted:
+                    found[row_id] = row
+                if row_id >= last:
+                    break
+        return [found.get(row_id) for row_id in self.row_ids[indices].tolist()]
+
+    def has(self, role):
+        """判断是否包含某个字段"""
+        return role in self.values
+
+    def column(self, role):
+        """返回某个字段的列名"""
+        return self.column_map.get(role) if role in self.values else None
+
+    def category_codes(self, role='product'):
+        """去除首尾空白后重新编码的文本代码，用于按名称分组和计数
+
+        只对字典（不同名称）做去空白和排序，不对每行的字符串处理。代码按名称排序，
+        因此按代码比较的结果与按名称比较一致。
+
+        Args:
+            role (str): 文本字段，默认商品名称
+
+        Returns:
+            tuple: (代码数组, 名称列表)，空名称的代码为-1
+        """
+        categories = self.categories[role]
+        names, inverse = np.unique(np.char.strip(categories), return_inverse=True)
+        mapping = inverse.ravel().astype(np.int32)
+        if len(names) and names[0] == '':  # 空字符串排在最前
+            names = names[1:]
+            mapping -= 1
+        return mapping[self.values[role]], names.tolist()
+
+    def valid(self, *roles):
+        """返回多个字段同时有效的掩码，缺少的字段视为全部无效"""
+        mask = np.ones(len(self), dtype=bool)
+        for role in roles:
+            if role not in self.masks:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.masks[role]
+        return mask
+
+    def take(self, indices):
+        """按下标或布尔掩码取出部分行，保留原始行序号
+
+        Args:
+            indices (numpy.ndarray): 行下标数组或布尔掩码
+
+        Returns:
+            WeighingColumns: 只包含所选行的列式数据
+        """
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        values, masks = self._map_arrays(lambda role, attr: getattr(self, attr)[role][indices])
+        # 只保留所选行的原文，行下标改为在新数据中的下标
+        raw = {}
+        for column, (_, texts, missing) in self.raw.items():
+            hit, slots = self._raw_slots(column, indices)
+            raw[column] = (np.flatnonzero(hit), texts[slots[hit]], missing[slots[hit]])
+        return WeighingColumns(self.fieldnames, self.column_map, values, masks,
+                               self.row_ids[indices], self.time_formats, self.categories, raw, self.source)
+
+    def _map_arrays(self, func):
+        """对每个字段的数据数组和掩码数组应用func，对应同一列的字段共用结果
+
+        Args:
+            func (function): func(role, attr)返回新数组，attr为'values'或'masks'
+
+        Returns:
+            tuple: (新的数据字典, 新的掩码字典)
+        """
+        values = {}
+        masks = {}
+        done = {}
+        for role in self.values:
+            column = self.column_map.get(role)
+            if column in done:
+                values[role], masks[role] = values[done[column]], masks[done[column]]
+                continue
+            done[column] = role
+            values[role] = func(role, 'values')
+            masks[role] = func(role, 'masks')
+        return values, masks
+
+    def format_time(self, role, value):
+        """把datetime64时间按该字段原始的时间格式还原为字符串"""
+        if np.isnat(value):
+            return ''
+        moment = value.astype('datetime64[s]').item()
+        fmt = self.time_formats.get(role)
+        return moment.strftime(fmt) if fmt else moment.isoformat(sep=' ')